@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'core',
@@ -89,6 +90,56 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recipe-app',
+    }
+}
+
+# Cache alias and timeout (seconds) of the per-user API response cache
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Cache alias of the per-user data versions that invalidate cached
+# responses, typeahead results and recipe indexes. The default LocMemCache
+# is per process: with more than one server process (e.g. gunicorn
+# workers) point this at a backend they all share, such as memcached or
+# django.core.cache.backends.db.DatabaseCache, or the other processes keep
+# serving stale responses for up to RESPONSE_CACHE_TIMEOUT after a write.
+VERSION_CACHE_ALIAS = 'default'
+
+# In-process token -> user cache used by CachedTokenAuthentication
+TOKEN_AUTH_CACHE_SIZE = 10000
+TOKEN_AUTH_CACHE_TTL = 60
+
+# Tag/ingredient typeahead: default and maximum number of results, and the
+# in-process per-user prefix cache in front of it
+TYPEAHEAD_LIMIT = 10
+TYPEAHEAD_MAX_LIMIT = 50
+TYPEAHEAD_CACHE_SIZE = 10000
+TYPEAHEAD_CACHE_TTL = 300
+
+# Users whose recipe ingredient/tag index (core.index) is kept in process,
+# and the age in seconds after which an index is rebuilt. Changes made in
+# other processes are only seen sooner with a shared CACHES backend.
+RECIPE_INDEX_MAX_USERS = 1000
+RECIPE_INDEX_TTL = 300
+
+# Recipe stats: upper bounds of the price histogram buckets (the last bucket
+# is open ended) and how many top tags/ingredients are listed
+RECIPE_STATS_PRICE_BUCKETS = ('5', '10', '20', '50', '100')
+RECIPE_STATS_TOP = 10
+
+# Meal plans (core.mealplan): how many recipes the search is narrowed down
+# to and how long, in seconds, it may keep improving a plan
+MEAL_PLAN_POOL_SIZE = 500
+MEAL_PLAN_TIME_LIMIT = 0.25
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -131,4 +182,20 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Hand media transfers to a front proxy: None, 'x-accel-redirect' or
+# 'x-sendfile'. X-Accel-Redirect paths are MEDIA_OFFLOAD_PREFIX + file path.
+MEDIA_OFFLOAD = None
+MEDIA_OFFLOAD_PREFIX = '/protected-media/'
+
+# Uploads are stored once per distinct content, see core.storage
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+
+# Limits enforced while recipe images are being uploaded
+RECIPE_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+RECIPE_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+
+# How recipe image variants are rendered: 'thread' (background pool) or 'sync'
+IMAGE_PROCESSING_BACKEND = 'thread'
+IMAGE_PROCESSING_WORKERS = 2
+
 AUTH_USER_MODEL = "core.User"
@@ -15,11 +15,18 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.conf.urls.static import static
 from django.conf import settings
 
+from core.views import serve_media
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path(
+        f"{settings.MEDIA_URL.lstrip('/')}<path:path>",
+        serve_media,
+        {'document_root': settings.MEDIA_ROOT},
+        name='media',
+    ),
+]
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def get_version_cache():
+    """Cache holding the per-user versions, shared by every process."""
+    return caches[getattr(
+        settings, 'VERSION_CACHE_ALIAS',
+        getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default'),
+    )]
+
+
+def _version_key(user_id):
+    return f'user-data-version:{user_id}'
+
+
+def _relations_version_key(user_id):
+    return f'user-relations-version:{user_id}'
+
+
+def _get_version(key):
+    # Versions are seeded from the clock, so a version key evicted from the
+    # cache comes back newer than any value stored under the old one.
+    return get_version_cache().get_or_set(key, time.time_ns, None)
+
+
+def _bump_version(key):
+    cache = get_version_cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, None)
+        return version
+
+
+def get_user_version(user_id):
+    """Return the current version of everything a user owns."""
+    return _get_version(_version_key(user_id))
+
+
+def bump_user_version(user_id):
+    """Invalidate every cached response of a user in O(1)."""
+    return _bump_version(_version_key(user_id))
+
+
+def get_relations_version(user_id):
+    """Return the version of the tags and ingredients of a user's recipes."""
+    return _get_version(_relations_version_key(user_id))
+
+
+def bump_relations_version(user_id):
+    """Mark in-process recipe indexes of a user as stale in every process."""
+    return _bump_version(_relations_version_key(user_id))
+
+
+class LRUCache:
+    """Thread-safe, size-bounded in-process mapping with optional TTL.
+
+    Least recently used entries are dropped once ``maxsize`` is reached and
+    entries older than ``ttl`` seconds are treated as missing.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return default
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def discard_where(self, predicate):
+        """Drop every entry whose value matches ``predicate``."""
+        with self._lock:
+            stale = [
+                key for key, (_, value) in self._data.items()
+                if predicate(value)
+            ]
+            for key in stale:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
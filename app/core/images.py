@@ -0,0 +1,115 @@
+"""Background generation of resized and WebP variants of recipe images.
+
+Uploads only store the original; the variants are rendered by a worker pool
+once the upload is committed and recorded in ``Recipe.image_variants``.
+Set ``IMAGE_PROCESSING_BACKEND`` to ``'sync'`` to render them inline.
+"""
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+from core.cache import bump_user_version
+from core.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (320, 320)
+
+# variant -> (file name suffix, extension, Pillow format, max size or None)
+VARIANTS = {
+    'thumbnail': ('_thumb', 'jpg', 'JPEG', THUMBNAIL_SIZE),
+    'thumbnail_webp': ('_thumb', 'webp', 'WEBP', THUMBNAIL_SIZE),
+    'webp': ('', 'webp', 'WEBP', None),
+}
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_PROCESSING_WORKERS', 2),
+            thread_name_prefix='recipe-images',
+        )
+    return _executor
+
+
+def variant_name(name, variant):
+    suffix, extension, _, _ = VARIANTS[variant]
+    root, _ = os.path.splitext(name)
+    return f'{root}{suffix}.{extension}'
+
+
+def _render(image, image_format, size):
+    image = image.copy()
+    if size is not None:
+        image.thumbnail(size, Image.LANCZOS)
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    output = io.BytesIO()
+    image.save(output, format=image_format, quality=85)
+    return output.getvalue()
+
+
+def generate_variants(recipe_id, name, user_id):
+    """Render every variant of ``name`` and record them on the recipe.
+
+    The recipe is only updated if it still points at ``name``, so a newer
+    upload is never overwritten by the variants of an older one. The
+    owner's cached responses are refreshed when it is.
+    """
+    Image.init()
+    with default_storage.open(name) as source:
+        image = Image.open(source)
+        image.load()
+
+    variants = {}
+    for variant, (_, _, image_format, size) in VARIANTS.items():
+        if image_format not in Image.SAVE:
+            continue
+        variants[variant] = default_storage.save(
+            variant_name(name, variant),
+            ContentFile(_render(image, image_format, size))
+        )
+
+    if Recipe.objects.filter(pk=recipe_id, image=name).update(
+            image_variants=variants):
+        bump_user_version(user_id)
+    return variants
+
+
+def _work(recipe_id, name, user_id):
+    try:
+        generate_variants(recipe_id, name, user_id)
+    except Exception:
+        logger.exception("Could not generate variants of %s", name)
+    finally:
+        # Worker threads open their own connection, don't leave it behind.
+        connection.close()
+
+
+def schedule_variants(recipe):
+    """Queue variant generation for the recipe's current image."""
+    recipe_id, name, user_id = recipe.pk, recipe.image.name, recipe.user_id
+    # Content-addressed images are shared, reuse variants already rendered.
+    rendered = Recipe.objects.filter(image=name).exclude(
+        image_variants={}
+    ).values_list('image_variants', flat=True).first()
+    if rendered:
+        Recipe.objects.filter(pk=recipe_id).update(image_variants=rendered)
+        recipe.image_variants = rendered
+    elif getattr(settings, 'IMAGE_PROCESSING_BACKEND', 'thread') == 'sync':
+        recipe.image_variants = generate_variants(recipe_id, name, user_id)
+    else:
+        transaction.on_commit(
+            lambda: _get_executor().submit(_work, recipe_id, name, user_id)
+        )
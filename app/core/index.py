@@ -0,0 +1,395 @@
+"""In-process indexes of the ingredients and tags of each user's recipes.
+
+A ``RecipeIndex`` is the sparse recipe × ingredient (and recipe × tag)
+matrix of one user, stored by row as sets of related ids and by column as
+bitsets (Python ints) over recipe positions. Overlap counts against every
+recipe at once are then a handful of big integer operations instead of a
+pairwise join in SQL.
+
+Indexes are built on first use and then maintained incrementally: the
+``recipe_relations_changed`` receivers record the changed recipes, and the
+next read reloads only those rows. Every change also bumps the user's
+relations version in the cache. Other processes only see that bump when
+the cache is shared between them (memcached, Redis, database); with the
+default per-process ``LocMemCache`` they don't, so indexes are also
+rebuilt once they are ``RECIPE_INDEX_TTL`` seconds old, which bounds how
+long another process can serve a stale copy.
+"""
+import heapq
+import math
+import re
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+from core.cache import LRUCache, bump_relations_version, get_relations_version
+from core.models import Recipe
+
+# How much each relation counts towards the similarity of two recipes,
+# heaviest first.
+SIMILARITY_WEIGHTS = {
+    'ingredients': 0.75,
+    'tags': 0.25,
+}
+RELATIONS = tuple(SIMILARITY_WEIGHTS)
+
+# metric -> (score of ``shared`` related ids between sets of ``size`` and
+# ``other_size``, highest score possible with ``shared`` out of ``size``)
+SIMILARITY_METRICS = {
+    'jaccard': (
+        lambda shared, size, other_size: shared / (size + other_size - shared),
+        lambda shared, size: shared / size,
+    ),
+    'cosine': (
+        lambda shared, size, other_size: shared / math.sqrt(size * other_size),
+        lambda shared, size: math.sqrt(shared / size),
+    ),
+}
+
+_ONE = re.compile('1')
+
+
+def bit_positions(bits):
+    """Positions of the set bits of ``bits``, highest first."""
+    binary = bin(bits)
+    top = len(binary) - 1
+    return [top - match.start() for match in _ONE.finditer(binary, 2)]
+
+
+def to_bits(positions):
+    """Bitset with ``positions`` set, built in one pass over a byte array."""
+    buffer = bytearray((max(positions) >> 3) + 1)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def overlap_levels(bitsets, size):
+    """Split positions by how many of ``bitsets`` they are in.
+
+    Returns a list whose item ``count`` is the bitset of positions set in
+    exactly ``count`` of the ``size`` bitsets. Item 0, the positions in
+    none, is a negative int (every other bit set) meant to be and-ed with
+    another bitset. Counts are added bit-sliced, one big integer per binary
+    digit, so the cost is a few operations per bitset whatever the number
+    of positions.
+    """
+    digits = []
+    for bits in bitsets:
+        carry = bits
+        for digit, value in enumerate(digits):
+            digits[digit], carry = value ^ carry, value & carry
+            if not carry:
+                break
+        if carry:
+            digits.append(carry)
+
+    levels = []
+    for count in range(size + 1):
+        if count >= 1 << len(digits):
+            levels.append(0)
+            continue
+        level = -1
+        for digit, value in enumerate(digits):
+            level &= value if count >> digit & 1 else ~value
+        levels.append(level)
+    return levels
+
+
+class RecipeIndex:
+    """Related ids of one user's recipes, by recipe and by related row.
+
+    ``features[field][recipe_id]`` is the set of ingredient (or tag) ids of
+    a recipe, ``postings[field][related_id]`` the bitset of positions of the
+    recipes linked to that ingredient (or tag) and ``sizes[field][count]``
+    the bitset of the recipes with ``count`` of them. ``positions`` maps
+    recipe ids to bit positions, freed positions are reused so bitsets stay
+    as short as the number of recipes. Recipes without any link aren't
+    indexed.
+    """
+
+    def __init__(self, user_id, version):
+        self.user_id = user_id
+        self.version = version
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.features = {field_name: {} for field_name in RELATIONS}
+        self.postings = {field_name: {} for field_name in RELATIONS}
+        self.sizes = {field_name: {} for field_name in RELATIONS}
+        self.positions = {}
+        self.recipe_ids = []
+        self.free = []
+
+    @classmethod
+    def build(cls, user_id, version):
+        index = cls(user_id, version)
+        index._load()
+        return index
+
+    def _rows(self, field_name, recipe_ids=None):
+        field = Recipe._meta.get_field(field_name)
+        rows = field.remote_field.through.objects.filter(
+            recipe__user_id=self.user_id
+        )
+        if recipe_ids is not None:
+            rows = rows.filter(recipe_id__in=recipe_ids)
+        return rows.values_list('recipe_id', field.m2m_reverse_name())
+
+    def _position(self, recipe_id):
+        position = self.positions.get(recipe_id)
+        if position is None:
+            if self.free:
+                position = self.free.pop()
+                self.recipe_ids[position] = recipe_id
+            else:
+                position = len(self.recipe_ids)
+                self.recipe_ids.append(recipe_id)
+            self.positions[recipe_id] = position
+        return position
+
+    @staticmethod
+    def _clear_bit(bitsets, key, bit):
+        bitsets[key] &= ~bit
+        if not bitsets[key]:
+            del bitsets[key]
+
+    def _remove(self, recipe_id):
+        position = self.positions.pop(recipe_id, None)
+        if position is None:
+            return
+        bit = 1 << position
+        for field_name in RELATIONS:
+            related_ids = self.features[field_name].pop(recipe_id, ())
+            if related_ids:
+                self._clear_bit(self.sizes[field_name], len(related_ids), bit)
+            for related_id in related_ids:
+                self._clear_bit(self.postings[field_name], related_id, bit)
+        self.recipe_ids[position] = None
+        self.free.append(position)
+
+    def _load(self, recipe_ids=None):
+        """Read the links of ``recipe_ids`` (all recipes if None).
+
+        One query per relation.
+        """
+        for recipe_id in recipe_ids or ():
+            self._remove(recipe_id)
+        for field_name in RELATIONS:
+            features = self.features[field_name]
+            loaded = {}
+            for recipe_id, related_id in self._rows(field_name, recipe_ids):
+                loaded.setdefault(recipe_id, set()).add(related_id)
+            features.update(loaded)
+
+            added, sized = {}, {}
+            for recipe_id, related_ids in loaded.items():
+                position = self._position(recipe_id)
+                sized.setdefault(len(related_ids), []).append(position)
+                for related_id in related_ids:
+                    added.setdefault(related_id, []).append(position)
+            for bitsets, positions_by_key in (
+                    (self.postings[field_name], added),
+                    (self.sizes[field_name], sized)):
+                for key, positions in positions_by_key.items():
+                    bitsets[key] = bitsets.get(key, 0) | to_bits(positions)
+
+    def refresh(self):
+        """Reload the recipes changed since the last read."""
+        with self.lock:
+            if self.pending:
+                self._load(self.pending)
+                self.pending = set()
+
+    def bits(self, field_name, related_ids):
+        """Bitsets of the recipes linked to each of ``related_ids``."""
+        postings = self.postings[field_name]
+        return [postings.get(related_id, 0) for related_id in related_ids]
+
+    def similar(self, recipe_id, limit, metric='jaccard'):
+        """Return up to ``limit`` ``(recipe_id, score)`` closest to
+        ``recipe_id``.
+
+        Each relation scores the overlap of related ids with ``metric``, and
+        the scores are combined with ``SIMILARITY_WEIGHTS`` over the
+        relations the recipe has.
+
+        Recipes are grouped with bitsets by how many ingredients they share
+        and have, and by how many tags they share, which bounds the score of
+        every recipe of a group. Groups are visited best bound first, and
+        the search stops once the current top ``limit`` beats the next
+        bound, so only a few recipes are ever scored one by one.
+        """
+        score, best_score = SIMILARITY_METRICS[metric]
+        with self.lock:
+            own = {
+                field_name: self.features[field_name].get(recipe_id, set())
+                for field_name in RELATIONS
+            }
+            present = [
+                field_name for field_name in RELATIONS if own[field_name]
+            ]
+            if not present:
+                return []
+            total_weight = sum(
+                SIMILARITY_WEIGHTS[field_name] for field_name in present
+            )
+            weights = {
+                field_name: SIMILARITY_WEIGHTS[field_name] / total_weight
+                for field_name in present
+            }
+            levels = {
+                field_name: overlap_levels(
+                    self.bits(field_name, own[field_name]),
+                    len(own[field_name])
+                )
+                for field_name in present
+            }
+
+            # (highest score, primary shared, primary size bits,
+            #  secondary shared)
+            primary, secondary = present[0], (present[1:] or [None])[0]
+            size = len(own[primary])
+            primary_groups = [(0, 0, -1)] if secondary else []
+            primary_groups += [
+                (
+                    weights[primary] * score(shared, size, other_size),
+                    shared, bits,
+                )
+                for other_size, bits in self.sizes[primary].items()
+                for shared in range(1, min(size, other_size) + 1)
+            ]
+            secondary_groups = [(0, 0)]
+            if secondary:
+                secondary_size = len(own[secondary])
+                secondary_weight = weights[secondary]
+                secondary_groups += [
+                    (secondary_weight * best_score(shared, secondary_size),
+                     shared)
+                    for shared in range(1, secondary_size + 1)
+                ]
+            groups = sorted(
+                (
+                    (primary_bound + secondary_bound, shared, size_bits,
+                     secondary_shared)
+                    for primary_bound, shared, size_bits in primary_groups
+                    for secondary_bound, secondary_shared in secondary_groups
+                    if shared or secondary_shared
+                ),
+                key=lambda group: group[0],
+                reverse=True,
+            )
+
+            top = []
+            itself = ~(1 << self.positions[recipe_id])
+            for bound, shared, size_bits, secondary_shared in groups:
+                if len(top) == limit and top[0][0] > bound:
+                    break
+                candidates = levels[primary][shared] & size_bits & itself
+                if secondary:
+                    candidates &= levels[secondary][secondary_shared]
+                for position in bit_positions(candidates):
+                    other_id = self.recipe_ids[position]
+                    value = 0
+                    for field_name in present:
+                        other = self.features[field_name].get(other_id)
+                        common = len(own[field_name] & other) if other else 0
+                        if common:
+                            value += weights[field_name] * score(
+                                common, len(own[field_name]), len(other)
+                            )
+                    item = (value, other_id)
+                    if len(top) < limit:
+                        heapq.heappush(top, item)
+                    elif item > top[0]:
+                        heapq.heapreplace(top, item)
+
+        return [
+            (other_id, value) for value, other_id in sorted(top, reverse=True)
+        ]
+
+    def pantry(self, ingredient_ids, limit, max_missing=None):
+        """Return up to ``limit`` ``(recipe_id, covered, missing)`` cookable
+        from a pantry.
+
+        Recipes are ranked by how many of their ingredients are among
+        ``ingredient_ids``, then by how few are missing, newest first.
+        Recipes missing more than ``max_missing`` ingredients, or without any
+        of them, are left out. Each rank is the intersection of a coverage
+        level with the bitset of recipes of one size, so no recipe is looked
+        at before it's returned.
+        """
+        ingredient_ids = set(ingredient_ids)
+        ranked = []
+        with self.lock:
+            levels = overlap_levels(
+                self.bits('ingredients', ingredient_ids), len(ingredient_ids)
+            )
+            sizes = sorted(self.sizes['ingredients'].items())
+            for covered in range(len(ingredient_ids), 0, -1):
+                if not levels[covered]:
+                    continue
+                for size, size_bits in sizes:
+                    missing = size - covered
+                    if missing < 0:
+                        continue
+                    if max_missing is not None and missing > max_missing:
+                        break
+                    positions = bit_positions(levels[covered] & size_bits)
+                    recipe_ids = sorted(
+                        (self.recipe_ids[position] for position in positions),
+                        reverse=True,
+                    )
+                    ranked.extend(
+                        (recipe_id, covered, missing)
+                        for recipe_id in recipe_ids[:limit - len(ranked)]
+                    )
+                    if len(ranked) == limit:
+                        return ranked
+        return ranked
+
+
+_indexes = LRUCache(
+    maxsize=getattr(settings, 'RECIPE_INDEX_MAX_USERS', 1000),
+    ttl=getattr(settings, 'RECIPE_INDEX_TTL', 300),
+)
+
+
+def get_recipe_index(user_id):
+    """Return the up to date index of a user's recipes."""
+    version = get_relations_version(user_id)
+    index = _indexes.get(user_id)
+    if index is None or index.version != version:
+        index = RecipeIndex.build(user_id, version)
+        _indexes.set(user_id, index)
+    else:
+        index.refresh()
+    return index
+
+
+def relations_changed(user_id, recipe_ids):
+    """Record that the links of ``recipe_ids``, owned by ``user_id``, changed.
+
+    Applied once the transaction commits: a read in between would reload
+    the old rows and forget they are pending.
+    """
+    recipe_ids = list(recipe_ids)
+    transaction.on_commit(lambda: _relations_changed(user_id, recipe_ids))
+
+
+def _relations_changed(user_id, recipe_ids):
+    version = bump_relations_version(user_id)
+    index = _indexes.get(user_id)
+    if index is None:
+        return
+    with index.lock:
+        if index.version == version - 1:
+            index.pending.update(recipe_ids)
+            index.version = version
+            return
+    # Changed in another process too, rebuild on next use.
+    _indexes.pop(user_id)
+
+
+def clear_indexes():
+    _indexes.clear()
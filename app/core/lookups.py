@@ -0,0 +1,22 @@
+from django.db.models import CharField
+from django.db.models.lookups import IStartsWith
+
+
+@CharField.register_lookup
+class TrigramIStartsWith(IStartsWith):
+    """``istartswith`` that a trigram (``gin_trgm_ops``) index can answer.
+
+    On PostgreSQL the builtin lookup compares ``UPPER(column)``, which an
+    index on the bare column doesn't cover, while ``ILIKE 'prefix%'`` does.
+    Other backends behave exactly like ``istartswith``.
+    """
+    lookup_name = 'trigram_istartswith'
+
+    def get_rhs_op(self, connection, rhs):
+        return connection.operators[IStartsWith.lookup_name] % rhs
+
+    def as_postgresql(self, compiler, connection):
+        lhs_sql, params = self.process_lhs(compiler, connection)
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        params.extend(rhs_params)
+        return f'{lhs_sql} ILIKE {rhs_sql}', params
@@ -0,0 +1,109 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Tag, Ingredient, Recipe
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the EXISTS and JOIN ... DISTINCT query shapes used to list "
+        "assigned tags and ingredients on a throwaway seeded dataset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=20000)
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument('--ingredients', type=int, default=500)
+        parser.add_argument(
+            '--links', type=int, default=5,
+            help="Tags and ingredients attached to each recipe."
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                user = self.seed(options)
+                for model in (Tag, Ingredient):
+                    self.compare(model, user, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        self.stdout.write(
+            f"Seeding {options['recipes']} recipes, {options['tags']} tags, "
+            f"{options['ingredients']} ingredients..."
+        )
+        user = get_user_model().objects.create_user(
+            'benchmark@assigned.local', None
+        )
+
+        Tag.objects.bulk_create(
+            Tag(user=user, name=f'Tag {i}', normalized_name=f'tag {i}')
+            for i in range(options['tags'])
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(user=user, name=f'Ingredient {i}',
+                       normalized_name=f'ingredient {i}')
+            for i in range(options['ingredients'])
+        )
+        Recipe.objects.bulk_create(
+            Recipe(user=user, name=f'Recipe {i}', time_minutes=10, price=1)
+            for i in range(options['recipes'])
+        )
+
+        recipe_ids = list(
+            Recipe.objects.filter(user=user).values_list('id', flat=True)
+        )
+        # Leave a tenth of the tags and ingredients unassigned so both query
+        # shapes have something to filter out.
+        for model, field in ((Tag, 'tags'), (Ingredient, 'ingredients')):
+            ids = list(
+                model.objects.filter(user=user).values_list('id', flat=True)
+            )
+            assignable = ids[:max(1, len(ids) * 9 // 10)]
+            through = getattr(Recipe, field).through
+            target = f'{model._meta.model_name}_id'
+            through.objects.bulk_create(
+                (
+                    through(recipe_id=recipe_id, **{target: target_id})
+                    for recipe_id in recipe_ids
+                    for target_id in rng.sample(
+                        assignable, min(options['links'], len(assignable))
+                    )
+                ),
+                batch_size=5000,
+            )
+        return user
+
+    def compare(self, model, user, repeat):
+        shapes = (
+            ('EXISTS', model.objects.filter(user=user).assigned()),
+            ('JOIN ... DISTINCT',
+             model.objects.filter(user=user, recipe__isnull=False).distinct()),
+        )
+        self.stdout.write(f"\n{model.__name__}:")
+        for label, queryset in shapes:
+            queryset = queryset.order_by('-name').values_list('id', flat=True)
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                count = len(list(queryset.all()))
+                timings.append((time.perf_counter() - start) * 1000)
+            median = statistics.median(timings)
+            self.stdout.write(
+                f"  {label:<18} rows={count:<6} "
+                f"min={min(timings):.2f}ms median={median:.2f}ms"
+            )
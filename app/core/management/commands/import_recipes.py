@@ -0,0 +1,259 @@
+import csv
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.cache import bump_user_version
+from core.models import Tag, Ingredient, Recipe
+from core.names import normalize_name
+
+RELATED_MODELS = {
+    'ingredients': Ingredient,
+    'tags': Tag,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Import recipes for a user from a CSV or NDJSON file. NDJSON lines "
+        "use the format of the recipe export endpoint; CSV files need a "
+        "header with name, time_minutes, price and optionally link, servings, "
+        "ingredients, quantities, units and tags, the last four holding ';' "
+        "separated values; quantities and units go in the order of the "
+        "ingredients. Units are only set on the ingredients created."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True,
+                            help="Email of the owner.")
+        parser.add_argument('--format', choices=('csv', 'ndjson'),
+                            help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist")
+
+        path = options['path']
+        extension = os.path.splitext(path)[1].lstrip('.').lower()
+        file_format = options['format'] or extension
+        if file_format not in ('csv', 'ndjson', 'jsonl'):
+            raise CommandError("Can't guess the format, use --format")
+
+        # normalized name -> id of everything the user already owns, extended
+        # as batches create the missing ones.
+        self.ids_by_name = {
+            field_name: dict(
+                model.objects.filter(user=user)
+                .values_list('normalized_name', 'id')
+            )
+            for field_name, model in RELATED_MODELS.items()
+        }
+
+        imported = skipped = 0
+        start = time.perf_counter()
+        try:
+            with open(path, newline='', encoding='utf-8') as source:
+                if file_format == 'csv':
+                    rows = self.read_csv(source)
+                else:
+                    rows = self.read_ndjson(source)
+                while True:
+                    batch = list(islice(rows, options['batch_size']))
+                    if not batch:
+                        break
+                    recipes = [row for row in batch if row is not None]
+                    skipped += len(batch) - len(recipes)
+                    with transaction.atomic():
+                        self.import_batch(user, recipes)
+                    imported += len(recipes)
+                    elapsed = time.perf_counter() - start
+                    self.stdout.write(
+                        f"{imported} recipes imported, {skipped} skipped "
+                        f"({imported / elapsed:.0f} recipes/s)"
+                    )
+        except OSError as error:
+            raise CommandError(error)
+        finally:
+            if imported:
+                bump_user_version(user.pk)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} recipes in {elapsed:.1f}s"
+        ))
+
+    def read_csv(self, source):
+        for line, row in enumerate(csv.DictReader(source), start=2):
+            for field_name in RELATED_MODELS:
+                row[field_name] = (row.get(field_name) or '').split(';')
+            for key in ('quantities', 'units'):
+                values = (row.get(key) or '').split(';')
+                row[key] = {
+                    name: value
+                    for name, value in zip(row['ingredients'], values)
+                    if value.strip()
+                }
+            yield self.clean(line, row)
+
+    def read_ndjson(self, source):
+        for line, raw in enumerate(source, start=1):
+            if not raw.strip():
+                continue
+            try:
+                row = json.loads(raw)
+            except ValueError as error:
+                yield self.invalid(line, error)
+                continue
+            yield self.clean(line, row)
+
+    def invalid(self, line, reason):
+        self.stderr.write(f"Line {line} skipped: {reason}")
+
+    def clean(self, line, row):
+        if not isinstance(row, dict):
+            return self.invalid(line, "expected an object")
+        name = (row.get('name') or '').strip()
+        if not name or len(name) > 255:
+            return self.invalid(
+                line, "name must have between 1 and 255 characters"
+            )
+        try:
+            time_minutes = int(row.get('time_minutes'))
+            price = Decimal(str(row.get('price'))).quantize(Decimal('0.01'))
+            servings = int(row.get('servings') or 1)
+        except (TypeError, ValueError, InvalidOperation):
+            return self.invalid(
+                line, "time_minutes, price and servings must be numbers"
+            )
+        # NaN survives quantize() and can't be read back from the database.
+        if not price.is_finite() or price.adjusted() >= 5:
+            return self.invalid(line, "price must be lower than 100000")
+        if not 1 <= servings <= 32767:
+            return self.invalid(line, "servings must be between 1 and 32767")
+
+        cleaned = {
+            'name': name,
+            'time_minutes': time_minutes,
+            'price': price,
+            'link': (row.get('link') or '')[:255],
+            'servings': servings,
+        }
+        for field_name in RELATED_MODELS:
+            names = row.get(field_name) or []
+            if not isinstance(names, list) or not all(
+                    isinstance(related, str) for related in names):
+                return self.invalid(
+                    line, f"{field_name} must be a list of names"
+                )
+            # normalized name -> name as first written in the row
+            unique = {}
+            for related in names:
+                if related.strip():
+                    related = related.strip()[:255]
+                    unique.setdefault(normalize_name(related), related)
+            cleaned[field_name] = unique
+
+        quantities = row.get('quantities') or {}
+        if not isinstance(quantities, dict):
+            return self.invalid(
+                line, "quantities must map ingredient names to numbers"
+            )
+        cleaned['quantities'] = {}
+        for related, quantity in quantities.items():
+            normalized = normalize_name(related.strip()[:255])
+            if normalized not in cleaned['ingredients']:
+                return self.invalid(
+                    line, f"{related} is not one of the ingredients"
+                )
+            try:
+                quantity = Decimal(str(quantity)).quantize(Decimal('0.001'))
+                in_range = (
+                    quantity.is_finite()
+                    and quantity >= 0 and quantity.adjusted() < 7
+                )
+            except InvalidOperation:
+                return self.invalid(line, "quantities must be numbers")
+            if not in_range:
+                return self.invalid(
+                    line, "quantities must be between 0 and 10000000"
+                )
+            cleaned['quantities'][normalized] = quantity
+
+        units = row.get('units') or {}
+        if not isinstance(units, dict):
+            return self.invalid(
+                line, "units must map ingredient names to units"
+            )
+        cleaned['units'] = {
+            normalize_name(related.strip()[:255]): unit.strip()[:20]
+            for related, unit in units.items()
+            if isinstance(unit, str)
+        }
+        return cleaned
+
+    def import_batch(self, user, rows):
+        for field_name, model in RELATED_MODELS.items():
+            ids_by_name = self.ids_by_name[field_name]
+            missing = {}
+            for row in rows:
+                units = row['units'] if field_name == 'ingredients' else {}
+                for normalized, name in row[field_name].items():
+                    if normalized not in ids_by_name:
+                        values = missing.setdefault(normalized, {'name': name})
+                        if normalized in units:
+                            values.setdefault('unit', units[normalized])
+            if missing:
+                # Rows created concurrently since the start are just reused.
+                model.objects.bulk_create(
+                    (
+                        model(user=user, normalized_name=normalized, **values)
+                        for normalized, values in missing.items()
+                    ),
+                    ignore_conflicts=True,
+                )
+                # bulk_create only returns ids on some backends, read them.
+                ids_by_name.update(
+                    model.objects.filter(
+                        user=user, normalized_name__in=missing
+                    ).values_list('normalized_name', 'id')
+                )
+
+        recipes = [
+            Recipe(
+                user=user,
+                name=row['name'],
+                time_minutes=row['time_minutes'],
+                price=row['price'],
+                link=row['link'],
+                servings=row['servings'],
+            )
+            for row in rows
+        ]
+        Recipe.objects.bulk_create_with_relations(recipes, {
+            field_name: [self.related_values(field_name, row) for row in rows]
+            for field_name in RELATED_MODELS
+        })
+
+    def related_values(self, field_name, row):
+        ids_by_name = self.ids_by_name[field_name]
+        if field_name != 'ingredients':
+            return [ids_by_name[normalized] for normalized in row[field_name]]
+        # Ingredients without a quantity get the default one.
+        quantities = row['quantities']
+        return {
+            ids_by_name[normalized]: (
+                {'quantity': quantities[normalized]}
+                if normalized in quantities else {}
+            )
+            for normalized in row[field_name]
+        }
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.cache import bump_user_version
+from core.models import Tag, Ingredient, Recipe
+from core.names import merge_duplicates
+from core.signals import recipe_relations_changed
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge tags and ingredients whose names only differ in case or "
+        "whitespace into the oldest one, moving their recipe links. Also "
+        "recomputes normalized names, run it after changing normalize_name."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        recipe_ids, user_ids = set(), set()
+        for model in (Tag, Ingredient):
+            with transaction.atomic():
+                merged, recipes, users = merge_duplicates(
+                    model, options['batch_size']
+                )
+                # The kept rows gained the links of the merged ones.
+                model.objects.filter(user_id__in=users).refresh_recipe_counts(
+                    batch_size=options['batch_size']
+                )
+            recipe_ids.update(recipes)
+            user_ids.update(users)
+            self.stdout.write(
+                f"Merged {merged} duplicate {model._meta.verbose_name_plural}"
+            )
+
+        if recipe_ids:
+            recipe_relations_changed.send(
+                sender=Recipe, recipe_ids=sorted(recipe_ids), user_ids=user_ids
+            )
+        for user_id in user_ids:
+            bump_user_version(user_id)
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {time.perf_counter() - start:.1f}s"
+        ))
@@ -0,0 +1,33 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import RecipeStats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user recipe stats rollups from their recipes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help="Only rebuild the stats of this email."
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.all()
+        if options['user']:
+            users = users.filter(email=options['user'])
+            if not users.exists():
+                raise CommandError(f"No user {options['user']}")
+
+        start = time.perf_counter()
+        user_ids = users.order_by('id').values_list('id', flat=True).iterator()
+        rebuilt = RecipeStats.objects.refresh(
+            user_ids, batch_size=options['batch_size']
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt the stats of {rebuilt} users in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cache import bump_user_version
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the denormalized ingredient count, tag count and tag "
+        "names of recipes in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help="Only rebuild the recipes of this email."
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.all()
+        if options['user']:
+            recipes = recipes.filter(user__email=options['user'])
+            if not recipes.exists():
+                raise CommandError(f"No recipes for {options['user']}")
+
+        start = time.perf_counter()
+        ids = recipes.order_by('id').values_list('id', flat=True).iterator()
+        rebuilt = Recipe.objects.refresh_summaries(
+            self.progress(ids, options['batch_size']),
+            batch_size=options['batch_size']
+        )
+        # Cached responses still show the old summaries and totals.
+        user_ids = recipes.order_by().values_list('user_id', flat=True)
+        for user_id in user_ids.distinct():
+            bump_user_version(user_id)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {rebuilt} recipe summaries in {elapsed:.1f}s"
+        ))
+
+    def progress(self, ids, batch_size):
+        for count, recipe_id in enumerate(ids, start=1):
+            yield recipe_id
+            if count % batch_size == 0:
+                self.stdout.write(f"{count} recipes...")
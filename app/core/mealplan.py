@@ -0,0 +1,290 @@
+"""Meal plans picked from a user's recipes.
+
+``plan_meals`` fills ``days`` × ``meals_per_day`` slots with distinct
+recipes. No day may take longer than ``max_time_per_day`` minutes, and
+the plan may cost at most ``budget``. Every recipe must have all the
+required tags and none of the excluded ones. Within those limits, as few
+distinct ingredients as possible should be left to buy.
+
+Each recipe is a feature row. Time and price come from one narrow query,
+which also applies the limits and tags (as EXISTS subqueries) and reads at
+most ``CANDIDATES_PER_SLOT`` × ``MEAL_PLAN_POOL_SIZE`` rows, the cheapest
+and quickest first. Ingredient ids come from the in-process
+``core.index``, so there is no join.
+
+Those rows are then pruned to ``MEAL_PLAN_POOL_SIZE`` recipes. Most
+of them are recipes made of the library's most used ingredients. The rest
+are the cheapest and quickest recipes, so tight limits can still be met.
+
+A greedy pass then fills the slots one at a time. Each gets the recipe
+that adds the fewest new ingredients, leaving room for the cheapest and
+quickest recipes in the slots still empty. Finally a local search swaps
+recipes in and out while that shortens the shopping list. It stops when
+no swap helps or after ``MEAL_PLAN_TIME_LIMIT`` seconds.
+"""
+import time
+from array import array
+from collections import Counter, namedtuple
+from itertools import accumulate
+
+from django.conf import settings
+from django.db import models
+
+from core.index import get_recipe_index
+from core.models import Recipe
+from core.units import convert, scale_recipes
+
+# price in cents, ingredients a frozenset of ids
+MealCandidate = namedtuple(
+    'MealCandidate', 'id time_minutes price ingredients'
+)
+
+# Rows read for each recipe kept in the pool.
+CANDIDATES_PER_SLOT = 20
+
+
+def _cents(amount):
+    return int(amount * 100)
+
+
+def _candidates(user_id, max_time_per_day=None, budget=None, tags=(),
+                exclude_tags=(), limit=None):
+    """Feature rows of the user's recipes that fit in a plan on their own.
+
+    With a ``limit`` only that many rows are read, cheapest and quickest.
+    """
+    recipes = Recipe.objects.filter(user_id=user_id)
+    if max_time_per_day is not None:
+        recipes = recipes.filter(time_minutes__lte=max_time_per_day)
+    if budget is not None:
+        recipes = recipes.filter(price__lte=budget)
+    tagged = Recipe.tags.through.objects.filter(
+        recipe=models.OuterRef('pk')
+    )
+    for tag in set(tags):
+        recipes = recipes.filter(models.Exists(tagged.filter(tag_id=tag)))
+    if exclude_tags:
+        recipes = recipes.exclude(models.Exists(
+            tagged.filter(tag_id__in=set(exclude_tags))
+        ))
+    rows = recipes.order_by('price', 'time_minutes', '-id').values_list(
+        'id', 'time_minutes', 'price'
+    )
+    if limit is not None:
+        rows = rows[:limit]
+    rows = list(rows)
+
+    index = get_recipe_index(user_id)
+    with index.lock:
+        ingredients = index.features['ingredients']
+        return [
+            MealCandidate(
+                recipe_id, time_minutes, _cents(price),
+                frozenset(ingredients.get(recipe_id, ())),
+            )
+            for recipe_id, time_minutes, price in rows
+        ]
+
+
+def _pool(candidates, size):
+    """Keep the ``size`` candidates most likely to be part of a good plan."""
+    if len(candidates) <= size:
+        return candidates
+    usage = Counter(
+        ingredient
+        for candidate in candidates
+        for ingredient in candidate.ingredients
+    )
+
+    def reuse(candidate):
+        # How many recipes use each of its ingredients, on average.
+        if not candidate.ingredients:
+            return float('inf')
+        total = sum(usage[ingredient] for ingredient in candidate.ingredients)
+        return total / len(candidate.ingredients)
+
+    def cheapest(candidate):
+        return candidate.price, -candidate.id
+
+    def quickest(candidate):
+        return candidate.time_minutes, -candidate.id
+
+    def most_reused(candidate):
+        return -reuse(candidate), candidate.price, -candidate.id
+
+    extra = size // 5
+    ranked = (
+        sorted(candidates, key=cheapest)[:extra]
+        + sorted(candidates, key=quickest)[:extra]
+        + sorted(candidates, key=most_reused)
+    )
+    unique = {candidate.id: candidate for candidate in ranked}
+    return list(unique.values())[:size]
+
+
+def _greedy(pool, days, meals_per_day, max_time_per_day, budget):
+    """Fill the slots in order with the recipe adding fewest ingredients."""
+    # Least that k more recipes can cost, or take, whichever they are.
+    cheapest = [0] + list(accumulate(
+        sorted(candidate.price for candidate in pool)
+    ))
+    quickest = [0] + list(accumulate(
+        sorted(candidate.time_minutes for candidate in pool)
+    ))
+    slots_left = days * meals_per_day
+
+    plan, used, counts, spent = [], set(), Counter(), 0
+    for _ in range(days):
+        meals, day_time = [], 0
+        for meal in range(meals_per_day):
+            slots_left -= 1
+            reserved_price = cheapest[min(slots_left, len(pool))]
+            meals_left = meals_per_day - meal - 1
+            reserved_time = quickest[min(meals_left, len(pool))]
+            best, best_key = None, None
+            for candidate in pool:
+                if candidate.id in used:
+                    continue
+                price = spent + candidate.price + reserved_price
+                if budget is not None and price > budget:
+                    continue
+                minutes = day_time + candidate.time_minutes + reserved_time
+                if max_time_per_day is not None and minutes > max_time_per_day:
+                    continue
+                added = sum(
+                    1 for ingredient in candidate.ingredients
+                    if not counts[ingredient]
+                )
+                key = (added, candidate.price, -candidate.id)
+                if best_key is None or key < best_key:
+                    best, best_key = candidate, key
+            meals.append(best)
+            if best is not None:
+                used.add(best.id)
+                counts.update(best.ingredients)
+                spent += best.price
+                day_time += best.time_minutes
+        plan.append(meals)
+    return plan
+
+
+def _improve(plan, pool, max_time_per_day, budget, deadline):
+    """Swap in recipes that fill slots, need fewer ingredients or cost less."""
+    used = {meal.id for meals in plan for meal in meals if meal}
+    counts = Counter(
+        ingredient
+        for meals in plan for meal in meals if meal
+        for ingredient in meal.ingredients
+    )
+    spent = sum(meal.price for meals in plan for meal in meals if meal)
+
+    improved = True
+    while improved:
+        improved = False
+        for meals in plan:
+            day_time = sum(meal.time_minutes for meal in meals if meal)
+            for slot, current in enumerate(meals):
+                if time.monotonic() > deadline:
+                    return plan
+                if current is None:
+                    # Filling a slot beats any shorter shopping list.
+                    filled, removed, current_price, current_time = -1, 0, 0, 0
+                    current_ingredients = frozenset()
+                else:
+                    current_ingredients = current.ingredients
+                    removed = sum(
+                        1 for ingredient in current_ingredients
+                        if counts[ingredient] == 1
+                    )
+                    filled = 0
+                    current_price = current.price
+                    current_time = current.time_minutes
+
+                best, best_key = None, (0, 0, 0)
+                for candidate in pool:
+                    if candidate.id in used:
+                        continue
+                    price = spent - current_price + candidate.price
+                    if budget is not None and price > budget:
+                        continue
+                    minutes = day_time - current_time + candidate.time_minutes
+                    if (max_time_per_day is not None
+                            and minutes > max_time_per_day):
+                        continue
+                    added = sum(
+                        1 for ingredient in candidate.ingredients
+                        if counts[ingredient] == (
+                            1 if ingredient in current_ingredients else 0
+                        )
+                    )
+                    key = (
+                        filled, added - removed,
+                        candidate.price - current_price,
+                    )
+                    if key < best_key or (best is not None and key == best_key
+                                          and candidate.id > best.id):
+                        best, best_key = candidate, key
+                if best is None:
+                    continue
+
+                if current is not None:
+                    used.discard(current.id)
+                    counts.subtract(current_ingredients)
+                used.add(best.id)
+                counts.update(best.ingredients)
+                spent += best.price - current_price
+                day_time += best.time_minutes - current_time
+                meals[slot] = best
+                improved = True
+    return plan
+
+
+def plan_meals(user_id, days=7, meals_per_day=1, max_time_per_day=None,
+               budget=None, tags=(), exclude_tags=()):
+    """Return ``days`` lists of ``meals_per_day`` recipe ids.
+
+    Slots where nothing fits are None.
+
+    ``budget`` is a Decimal and ``tags``/``exclude_tags`` tag ids.
+    """
+    deadline = time.monotonic() + settings.MEAL_PLAN_TIME_LIMIT
+    size = settings.MEAL_PLAN_POOL_SIZE
+    candidates = _candidates(
+        user_id, max_time_per_day, budget, tags, exclude_tags,
+        limit=size * CANDIDATES_PER_SLOT,
+    )
+    pool = _pool(candidates, size)
+    budget = None if budget is None else _cents(budget)
+    plan = _greedy(pool, days, meals_per_day, max_time_per_day, budget)
+    plan = _improve(plan, pool, max_time_per_day, budget, deadline)
+    return [[meal.id if meal else None for meal in meals] for meals in plan]
+
+
+def shopping_list(recipes, servings=None, system=None):
+    """Return ``[(ingredient, quantity, unit, recipe count), ...]``.
+
+    Items are sorted by ingredient name. ``recipes`` must have their
+    ``recipe_ingredients`` prefetched with the ingredient. Quantities are
+    scaled to ``servings``, summed per ingredient and then shown in
+    ``system``.
+    """
+    totals = {}
+    for rows in scale_recipes(recipes, servings).values():
+        for ingredient, quantity, _ in rows:
+            total = totals.setdefault(ingredient.pk, [ingredient, 0.0, 0])
+            total[1] += quantity
+            total[2] += 1
+
+    totals = sorted(
+        totals.values(), key=lambda total: (total[0].name, total[0].pk)
+    )
+    quantities, units = convert(
+        array('d', (quantity for _, quantity, _ in totals)),
+        [ingredient.unit for ingredient, _, _ in totals],
+        system=system,
+    )
+    return [
+        (ingredient, quantity, unit, count)
+        for (ingredient, _, count), quantity, unit
+        in zip(totals, quantities, units)
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.1.14 on 2026-10-16 23:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_user_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'time_minutes'], name='core_recipe_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'price'], name='core_recipe_user_price_idx'),
+        ),
+        # The auto-created through tables can't declare Meta.indexes, so the
+        # reverse (target, recipe) indexes used by the tag/ingredient filters
+        # are created directly.
+        migrations.RunSQL(
+            'CREATE INDEX core_recipe_tags_tag_recipe_idx '
+            'ON core_recipe_tags (tag_id, recipe_id);',
+            reverse_sql='DROP INDEX core_recipe_tags_tag_recipe_idx;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX core_recipe_ingr_ingr_recipe_idx '
+            'ON core_recipe_ingredients (ingredient_id, recipe_id);',
+            reverse_sql='DROP INDEX core_recipe_ingr_ingr_recipe_idx;',
+        ),
+    ]
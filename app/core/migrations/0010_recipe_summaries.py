@@ -0,0 +1,28 @@
+# Generated by Django 3.1.14 on 2026-10-16 23:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recipe_image_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_names',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,139 @@
+# Generated by Django 3.1.14 on 2026-10-16 23:38
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# core_recipe.search_vector holds the recipe name (weight A), ingredient
+# names (B) and tag names (C). Triggers keep it current for every write path,
+# the ORM, bulk statements and raw SQL alike:
+#
+# - recipe insert, or rename: recomputed for the row, before it's written;
+# - through rows inserted or deleted: recomputed once per statement for the
+#   recipes in the transition table, so a bulk insert is a single UPDATE;
+# - tag or ingredient rename: recomputed for the recipes that use it.
+FORWARD_SQL = """
+CREATE FUNCTION core_recipe_search_vector(recipe_name text, recipe integer)
+RETURNS tsvector LANGUAGE sql STABLE AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(recipe_name, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce((
+            SELECT string_agg(i.name, ' ')
+            FROM core_recipe_ingredients ri
+            JOIN core_ingredient i ON i.id = ri.ingredient_id
+            WHERE ri.recipe_id = recipe
+        ), '')), 'B')
+        || setweight(to_tsvector('simple', coalesce((
+            SELECT string_agg(t.name, ' ')
+            FROM core_recipe_tags rt
+            JOIN core_tag t ON t.id = rt.tag_id
+            WHERE rt.recipe_id = recipe
+        ), '')), 'C')
+$$;
+
+CREATE FUNCTION core_recipe_search_row() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := core_recipe_search_vector(NEW.name, NEW.id);
+    RETURN NEW;
+END
+$$;
+
+CREATE TRIGGER core_recipe_search_row
+BEFORE INSERT OR UPDATE OF name ON core_recipe
+FOR EACH ROW EXECUTE PROCEDURE core_recipe_search_row();
+
+CREATE FUNCTION core_recipe_search_relations() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE core_recipe r
+    SET search_vector = core_recipe_search_vector(r.name, r.id)
+    WHERE r.id IN (SELECT recipe_id FROM changed);
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER core_recipe_tags_search_insert
+AFTER INSERT ON core_recipe_tags REFERENCING NEW TABLE AS changed
+FOR EACH STATEMENT EXECUTE PROCEDURE core_recipe_search_relations();
+CREATE TRIGGER core_recipe_tags_search_delete
+AFTER DELETE ON core_recipe_tags REFERENCING OLD TABLE AS changed
+FOR EACH STATEMENT EXECUTE PROCEDURE core_recipe_search_relations();
+CREATE TRIGGER core_recipe_ingredients_search_insert
+AFTER INSERT ON core_recipe_ingredients REFERENCING NEW TABLE AS changed
+FOR EACH STATEMENT EXECUTE PROCEDURE core_recipe_search_relations();
+CREATE TRIGGER core_recipe_ingredients_search_delete
+AFTER DELETE ON core_recipe_ingredients REFERENCING OLD TABLE AS changed
+FOR EACH STATEMENT EXECUTE PROCEDURE core_recipe_search_relations();
+
+CREATE FUNCTION core_tag_search_rename() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE core_recipe r
+    SET search_vector = core_recipe_search_vector(r.name, r.id)
+    WHERE r.id IN (SELECT recipe_id FROM core_recipe_tags WHERE tag_id = NEW.id);
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER core_tag_search_rename
+AFTER UPDATE OF name ON core_tag
+FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE PROCEDURE core_tag_search_rename();
+
+CREATE FUNCTION core_ingredient_search_rename() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE core_recipe r
+    SET search_vector = core_recipe_search_vector(r.name, r.id)
+    WHERE r.id IN (
+        SELECT recipe_id FROM core_recipe_ingredients WHERE ingredient_id = NEW.id
+    );
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER core_ingredient_search_rename
+AFTER UPDATE OF name ON core_ingredient
+FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE PROCEDURE core_ingredient_search_rename();
+
+UPDATE core_recipe SET search_vector = core_recipe_search_vector(name, id);
+
+CREATE INDEX core_recipe_search_idx ON core_recipe USING gin (search_vector);
+"""
+
+REVERSE_SQL = """
+DROP INDEX IF EXISTS core_recipe_search_idx;
+DROP TRIGGER IF EXISTS core_ingredient_search_rename ON core_ingredient;
+DROP TRIGGER IF EXISTS core_tag_search_rename ON core_tag;
+DROP TRIGGER IF EXISTS core_recipe_ingredients_search_delete ON core_recipe_ingredients;
+DROP TRIGGER IF EXISTS core_recipe_ingredients_search_insert ON core_recipe_ingredients;
+DROP TRIGGER IF EXISTS core_recipe_tags_search_delete ON core_recipe_tags;
+DROP TRIGGER IF EXISTS core_recipe_tags_search_insert ON core_recipe_tags;
+DROP TRIGGER IF EXISTS core_recipe_search_row ON core_recipe;
+DROP FUNCTION IF EXISTS core_ingredient_search_rename();
+DROP FUNCTION IF EXISTS core_tag_search_rename();
+DROP FUNCTION IF EXISTS core_recipe_search_relations();
+DROP FUNCTION IF EXISTS core_recipe_search_row();
+DROP FUNCTION IF EXISTS core_recipe_search_vector(text, integer);
+"""
+
+
+def run_on_postgresql(sql):
+    def run(apps, schema_editor):
+        # Other backends (SQLite in local tests) search with a substring
+        # fallback, see RecipeQuerySet.search.
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recipe_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(run_on_postgresql(FORWARD_SQL), run_on_postgresql(REVERSE_SQL)),
+    ]
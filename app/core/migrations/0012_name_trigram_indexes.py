@@ -0,0 +1,37 @@
+# Generated by Django 3.1.14 on 2026-10-16 23:52
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Trigram GIN indexes answer both the ILIKE 'prefix%' and the fuzzy '%'
+# matches of the tag/ingredient typeahead. Gin indexes can't be declared on
+# the models without breaking SQLite test databases, so they're created here.
+FORWARD_SQL = """
+CREATE INDEX core_tag_name_trgm_idx ON core_tag USING gin (name gin_trgm_ops);
+CREATE INDEX core_ingr_name_trgm_idx ON core_ingredient USING gin (name gin_trgm_ops);
+"""
+
+REVERSE_SQL = """
+DROP INDEX IF EXISTS core_ingr_name_trgm_idx;
+DROP INDEX IF EXISTS core_tag_name_trgm_idx;
+"""
+
+
+def run_on_postgresql(sql):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_recipe_search'),
+    ]
+
+    operations = [
+        # A no-op on backends other than PostgreSQL.
+        TrigramExtension(),
+        migrations.RunPython(run_on_postgresql(FORWARD_SQL), run_on_postgresql(REVERSE_SQL)),
+    ]
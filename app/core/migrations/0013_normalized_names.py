@@ -0,0 +1,90 @@
+# Generated by Django 3.1.14 on 2026-10-16 23:44
+
+from django.db import migrations, models
+
+
+# Frozen copies of core.names as of this migration, so it keeps doing the
+# same thing whatever the app code becomes.
+
+def normalize_name(name):
+    return ' '.join(name.split()).casefold()[:255]
+
+
+def merge_duplicates(model, batch_size=1000):
+    """Keep the oldest row of each (user, normalized name), moving links to it."""
+    column = f'{model._meta.model_name}_id'
+    through = model.recipe_set.through
+    duplicates, renamed = {}, []
+
+    def flush():
+        wanted = {
+            (recipe_id, duplicates[related_id])
+            for recipe_id, related_id in through.objects.filter(
+                **{f'{column}__in': duplicates}
+            ).values_list('recipe_id', column)
+        }
+        existing = set(
+            through.objects.filter(**{
+                'recipe_id__in': {recipe_id for recipe_id, _ in wanted},
+                f'{column}__in': set(duplicates.values()),
+            }).values_list('recipe_id', column)
+        ) if wanted else set()
+        through.objects.bulk_create(
+            [through(**{'recipe_id': recipe_id, column: related_id})
+             for recipe_id, related_id in wanted - existing],
+            batch_size=batch_size,
+        )
+        through.objects.filter(**{f'{column}__in': duplicates}).delete()
+        model.objects.filter(id__in=duplicates).delete()
+        duplicates.clear()
+
+    rows = model.objects.order_by('user_id', 'id').values_list(
+        'id', 'user_id', 'name', 'normalized_name'
+    )
+    current_user, kept = None, {}
+    for row_id, user_id, name, normalized_name in rows.iterator(chunk_size=batch_size):
+        if user_id != current_user:
+            current_user, kept = user_id, {}
+        normalized = normalize_name(name)
+        if normalized in kept:
+            duplicates[row_id] = kept[normalized]
+            if len(duplicates) >= batch_size:
+                flush()
+        else:
+            kept[normalized] = row_id
+            if normalized != normalized_name:
+                renamed.append(model(id=row_id, normalized_name=normalized))
+    if duplicates:
+        flush()
+
+    model.objects.bulk_update(renamed, ['normalized_name'], batch_size=batch_size)
+
+
+def merge_duplicate_names(apps, schema_editor):
+    # Fills normalized_name and merges the rows it makes duplicates, so the
+    # unique constraints of the next migration can be created.
+    for model_name in ('Tag', 'Ingredient'):
+        merge_duplicates(apps.get_model('core', model_name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_name_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.1.14 on 2026-10-16 23:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from 0013: PostgreSQL refuses to alter a table with deferred
+    # foreign key checks still pending from the merge, in the same transaction.
+
+    dependencies = [
+        ('core', '0013_normalized_names'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'normalized_name'), name='core_ingr_user_norm_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'normalized_name'), name='core_tag_user_norm_name_uniq'),
+        ),
+    ]
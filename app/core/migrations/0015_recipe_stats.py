@@ -0,0 +1,57 @@
+# Generated by Django 3.1.14 on 2026-10-17 00:00
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def count_recipes(apps, schema_editor):
+    # One UPDATE per model with a correlated count. The stats rollups
+    # themselves are built on first read.
+    for model_name in ('Tag', 'Ingredient'):
+        model = apps.get_model('core', model_name)
+        column = f'{model._meta.model_name}_id'
+        counts = model.recipe_set.through.objects.filter(
+            **{column: models.OuterRef('pk')}
+        ).order_by().values(column).annotate(count=models.Count('id')).values('count')
+        model.objects.update(recipe_count=Coalesce(models.Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_normalized_name_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='core.user')),
+                ('recipe_count', models.PositiveIntegerField(default=0)),
+                ('total_time_minutes', models.BigIntegerField(default=0)),
+                ('total_price', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('price_buckets', models.JSONField(default=list)),
+                ('price_histogram', models.JSONField(default=list)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-recipe_count'], name='core_ingr_user_usage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-recipe_count'], name='core_tag_user_usage_idx'),
+        ),
+        migrations.RunPython(count_recipes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 3.1.14 on 2026-10-17 00:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Recipe.ingredients moves from its auto-created through model to
+# RecipeIngredient on the same table, core_recipe_ingredients. The switch
+# happens in the migration state only: the table, its (recipe_id,
+# ingredient_id) unique constraint and its indexes already are what the new
+# model declares, so the existing rows, triggers and indexes are kept and
+# only the quantity column is added.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_recipe_stats'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='RecipeIngredient',
+                    fields=[
+                        ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_ingredients', to='core.recipe')),
+                        ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.ingredient')),
+                    ],
+                    options={
+                        'db_table': 'core_recipe_ingredients',
+                        'unique_together': {('recipe', 'ingredient')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='recipe',
+                    name='ingredients',
+                    field=models.ManyToManyField(through='core.RecipeIngredient', to='core.Ingredient'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='quantity',
+            field=models.DecimalField(decimal_places=3, default=1, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='calories',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='carbohydrates',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='fat',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='protein',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='unit',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='unit_cost',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='total_calories',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='total_carbohydrates',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='total_cost',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='total_fat',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='total_protein',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'total_cost'], name='core_recipe_user_cost_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'total_calories'], name='core_recipe_user_kcal_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.1.14 on 2026-10-17 00:13
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_recipe_ingredient_quantities'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='servings',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
@@ -1,10 +1,24 @@
 import uuid
 import os
-from django.db import models
+import threading
+from bisect import bisect_right
+from decimal import Decimal
+from itertools import islice
+from django.db import connections, models, router, transaction
+from django.db.models.functions import Cast, Greatest, Lower
 from django.contrib.auth.models import AbstractBaseUser
 from django.contrib.auth.models import BaseUserManager, PermissionsMixin
 
 from django.conf import settings
+from django.core.validators import MinValueValidator
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVectorField, TrigramSimilarity,
+)
+
+from core import lookups  # noqa: F401 registers name__trigram_istartswith
+from core.names import normalize_name
+
+from core.signals import recipe_relations_changed, recipes_deleted
 
 class UserManager(BaseUserManager):
 
@@ -34,27 +48,550 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = "email"
 
 
+class RecipeRelatedQuerySet(models.QuerySet):
+
+    def assigned(self):
+        """Rows attached to at least one recipe.
+
+        Uses an EXISTS subquery against the recipe through table, which stops
+        at the first matching link instead of joining every one and
+        de-duplicating them afterwards.
+        """
+        through = self.model.recipe_set.through
+        return self.filter(models.Exists(through.objects.filter(
+            **{self.model._meta.model_name: models.OuterRef('pk')}
+        )))
+
+    def typeahead(self, text, limit):
+        """Up to ``limit`` rows whose name starts with ``text``, then close
+        matches.
+
+        On PostgreSQL the prefix (``ILIKE``) and fuzzy (pg_trgm ``%``)
+        matches are both answered by the trigram GIN index on ``name``, and
+        fuzzy matches are ordered by similarity. Other backends only match
+        prefixes.
+        """
+        prefix = models.Q(name__trigram_istartswith=text)
+        if connections[self.db].vendor != 'postgresql':
+            return self.filter(prefix).order_by(Lower('name'))[:limit]
+        similar = models.Q(name__trigram_similar=text)
+        return self.filter(prefix | similar).annotate(
+            prefix_match=models.Case(
+                models.When(prefix, then=1),
+                default=0,
+                output_field=models.IntegerField(),
+            ),
+            similarity=TrigramSimilarity('name', text),
+        ).order_by('-prefix_match', '-similarity', Lower('name'))[:limit]
+
+    def refresh_recipe_counts(self, ids=None, batch_size=1000):
+        """Recompute ``recipe_count`` of rows.
+
+        Works on ``ids`` if given, else on every row of the queryset,
+        ``batch_size`` rows at a time with two queries per batch: a grouped
+        count over the through table index and one bulk UPDATE.
+        """
+        if ids is None:
+            ids = self.order_by('id').values_list('id', flat=True).iterator()
+        ids = iter(ids)
+        column = f'{self.model._meta.model_name}_id'
+        through = self.model.recipe_set.through.objects.using(self.db)
+
+        refreshed = 0
+        while True:
+            batch = list(islice(ids, batch_size))
+            if not batch:
+                return refreshed
+            counts = dict(
+                through.filter(**{f'{column}__in': batch}).values(column)
+                .annotate(count=models.Count('id'))
+                .values_list(column, 'count')
+            )
+            self.model.objects.using(self.db).bulk_update([
+                self.model(id=row_id, recipe_count=counts.get(row_id, 0))
+                for row_id in batch
+            ], ['recipe_count'])
+            refreshed += len(batch)
+
+
 class Tag(models.Model):
     name = models.CharField(max_length=255)
+    # normalize_name(name), unique per user so "Salt" and "salt " are one row
+    normalized_name = models.CharField(max_length=255, editable=False)
+    # Recipes linked to it, kept in sync by core.receivers for recipe stats
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
 
+    objects = RecipeRelatedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'name'],
+                         name='core_tag_user_name_idx'),
+            models.Index(fields=['user', '-recipe_count'],
+                         name='core_tag_user_usage_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'normalized_name'],
+                name='core_tag_user_norm_name_uniq'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_name(self.name)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
 class Ingredient(models.Model):
     name = models.CharField(max_length=255)
+    # normalize_name(name), unique per user so "Salt" and "salt " are one row
+    normalized_name = models.CharField(max_length=255, editable=False)
+    # Recipes linked to it, kept in sync by core.receivers for recipe stats
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+    # Recipe quantities are given in ``unit``, cost and nutrition are per
+    # one of it.
+    unit = models.CharField(max_length=20, blank=True)
+    unit_cost = models.DecimalField(
+        max_digits=10, decimal_places=4, default=0
+    )
+    calories = models.DecimalField(max_digits=10, decimal_places=4, default=0)
+    protein = models.DecimalField(max_digits=10, decimal_places=4, default=0)
+    carbohydrates = models.DecimalField(
+        max_digits=10, decimal_places=4, default=0
+    )
+    fat = models.DecimalField(max_digits=10, decimal_places=4, default=0)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
 
+    objects = RecipeRelatedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'name'],
+                         name='core_ingr_user_name_idx'),
+            models.Index(fields=['user', '-recipe_count'],
+                         name='core_ingr_user_usage_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'normalized_name'],
+                name='core_ingr_user_norm_name_uniq'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_name(self.name)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        ingredient = super().from_db(db, field_names, values)
+        # What the totals of its recipes were computed with.
+        if set(INGREDIENT_TOTALS.values()).issubset(field_names):
+            ingredient._totals_values = ingredient.totals_values()
+        return ingredient
+
+    def totals_values(self):
+        return tuple(
+            getattr(self, column) for column in INGREDIENT_TOTALS.values()
+        )
+
+    def totals_changed(self):
+        """Whether cost or nutrition changed since it was loaded."""
+        return self.__dict__.get('_totals_values') != self.totals_values()
+
     def __str__(self):
         return self.name
 
 
+# Recipe.total_<name> is the sum over its ingredients of quantity times the
+# Ingredient column.
+INGREDIENT_TOTALS = {
+    'cost': 'unit_cost',
+    'calories': 'calories',
+    'protein': 'protein',
+    'carbohydrates': 'carbohydrates',
+    'fat': 'fat',
+}
+
+
+# Text search configuration of Recipe.search_vector. Recipes are written in
+# more than one language, so words are indexed as they are, without stemming.
+SEARCH_CONFIG = 'simple'
+
+
+def _related_values(related_ids):
+    """Map related ids to their extra through row values, if they have any."""
+    if isinstance(related_ids, dict):
+        return {
+            related_id: values or {}
+            for related_id, values in related_ids.items()
+        }
+    return dict.fromkeys(related_ids, {})
+
+
+# Ids of the recipes RecipeQuerySet.delete() is deleting in this thread.
+_batch_delete = threading.local()
+
+
+def in_batch_delete(recipe):
+    """Whether ``recipe`` goes in a ``RecipeQuerySet.delete()``, which does
+    the bookkeeping of the per-recipe delete receivers for the whole batch.
+    """
+    return recipe.pk in getattr(_batch_delete, 'ids', ())
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def search(self, text):
+        """Keep recipes matching every word of ``text``, annotated with
+        ``search_rank``.
+
+        On PostgreSQL this is a match against the trigger-maintained
+        ``search_vector`` (GIN indexed), ranked with ``ts_rank``. Other
+        backends fall back to a case-insensitive substring match of each
+        word on the recipe, tag and ingredient names, ranked by the number
+        of words found in the recipe name.
+        """
+        if connections[self.db].vendor == 'postgresql':
+            query = SearchQuery(text, config=SEARCH_CONFIG)
+            # A fixed-scale rank compares exactly in the pagination cursor.
+            return self.filter(search_vector=query).annotate(
+                search_rank=Cast(
+                    SearchRank(models.F('search_vector'), query),
+                    models.DecimalField(max_digits=12, decimal_places=6),
+                )
+            )
+
+        words = text.split()
+        queryset = self
+        tags = self.model.tags.through.objects
+        ingredients = self.model.ingredients.through.objects
+        for word in words:
+            queryset = queryset.filter(
+                models.Q(name__icontains=word)
+                | models.Q(id__in=tags.filter(
+                    tag__name__icontains=word).values('recipe_id'))
+                | models.Q(id__in=ingredients.filter(
+                    ingredient__name__icontains=word).values('recipe_id'))
+            )
+        ranks = [
+            models.Case(
+                models.When(name__icontains=word, then=1),
+                default=0,
+                output_field=models.IntegerField(),
+            )
+            for word in words
+        ]
+        return queryset.annotate(search_rank=sum(ranks[1:], ranks[0]))
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        RecipeStats.objects.using(self.db).recipes_saved(objs, created=True)
+        return objs
+
+    def delete(self):
+        """Delete the recipes, with their bookkeeping done for the batch.
+
+        The recipes are locked and read once. Their tags and ingredients
+        get one grouped ``recipe_count`` decrement per model and their
+        users' rollups one ``RecipeStats`` update, then ``recipes_deleted``
+        is sent once. The per-recipe ``pre_delete``/``post_delete``
+        receivers skip them, see ``in_batch_delete``.
+        """
+        with transaction.atomic(using=self.db, savepoint=False):
+            rows = list(self.select_for_update().order_by('pk').values_list(
+                'pk', 'user_id', 'time_minutes', 'price', 'image',
+                'image_variants',
+            ))
+            if not rows:
+                return super().delete()
+            ids = [row[0] for row in rows]
+            for field_name in ('tags', 'ingredients'):
+                self._uncount_links(field_name, ids)
+
+            previous = getattr(_batch_delete, 'ids', ())
+            _batch_delete.ids = set(ids)
+            try:
+                deleted = super().delete()
+            finally:
+                _batch_delete.ids = previous
+
+            RecipeStats.objects.using(self.db).record(removed=[
+                (user_id, time_minutes, price)
+                for _, user_id, time_minutes, price, _, _ in rows
+            ])
+            recipes_deleted.send(
+                sender=self.model,
+                recipe_ids=ids,
+                user_ids={row[1] for row in rows},
+                images={
+                    image: list(variants.values())
+                    for _, _, _, _, image, variants in rows if image
+                },
+            )
+        return deleted
+
+    def _uncount_links(self, field_name, ids):
+        """Take the recipes ``ids`` out of their related rows' counts."""
+        field = self.model._meta.get_field(field_name)
+        target = field.m2m_reverse_name()
+        links = field.remote_field.through.objects.using(self.db).filter(
+            recipe_id__in=ids
+        )
+        per_row = links.filter(**{target: models.OuterRef('pk')}).order_by()
+        per_row = per_row.values(target).annotate(
+            count=models.Count('id')
+        ).values('count')
+        field.related_model.objects.using(self.db).filter(
+            pk__in=links.values(target)
+        ).update(recipe_count=Greatest(
+            models.F('recipe_count') - models.Subquery(per_row), 0,
+            output_field=models.PositiveIntegerField(),
+        ))
+
+    def locked_stats_rows(self, ids):
+        """Lock the recipes ``ids``, return their stored ``{id: stats_row}``.
+
+        Held until the transaction ends, so concurrent saves of a recipe
+        take its old values for RecipeStats deltas one after the other.
+        """
+        rows = self.select_for_update().filter(pk__in=ids).order_by('pk')
+        return {
+            pk: (user_id, time_minutes, price)
+            for pk, user_id, time_minutes, price in rows.values_list(
+                'pk', 'user_id', 'time_minutes', 'price'
+            )
+        }
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        objs = list(objs)
+        if not set(fields) & RecipeStats.COUNTED_FIELDS:
+            return super().bulk_update(objs, fields, batch_size=batch_size)
+        with transaction.atomic(using=self.db, savepoint=False):
+            stored = self.locked_stats_rows([obj.pk for obj in objs])
+            for obj in objs:
+                obj._stats_row = stored.get(obj.pk)
+            super().bulk_update(objs, fields, batch_size=batch_size)
+            RecipeStats.objects.using(self.db).recipes_saved(objs)
+
+    def bulk_create_with_relations(self, recipes, relations, batch_size=None):
+        """Insert recipes and their many to many rows in bulk.
+
+        ``relations`` maps a many to many field name to a list parallel to
+        ``recipes`` holding the related ids of each recipe, or a mapping of
+        related ids to extra through row values. Backends that
+        can't return primary keys from a bulk insert save recipes one by one
+        so the through rows can still be written in bulk.
+        """
+        if connections[self.db].features.can_return_rows_from_bulk_insert:
+            self.bulk_create(recipes, batch_size=batch_size)
+        else:
+            for recipe in recipes:
+                recipe.save(using=self.db)
+
+        for field_name, ids_per_recipe in relations.items():
+            self.bulk_add_relations(
+                field_name,
+                (
+                    (recipe.pk, related_id, values)
+                    for recipe, related_ids in zip(recipes, ids_per_recipe)
+                    for related_id, values
+                    in _related_values(related_ids).items()
+                ),
+                batch_size=batch_size,
+            )
+        if relations:
+            recipe_relations_changed.send(
+                sender=self.model,
+                recipe_ids=[recipe.pk for recipe in recipes],
+                user_ids={recipe.user_id for recipe in recipes},
+                related_ids={
+                    field_name: {
+                        related_id
+                        for related_ids in ids_per_recipe
+                        for related_id in related_ids
+                    }
+                    for field_name, ids_per_recipe in relations.items()
+                },
+            )
+        return recipes
+
+    def bulk_set_relations(self, field_name, related_ids_by_recipe,
+                           batch_size=None, user_ids=None):
+        """Make the related ids of many recipes match, writing only the
+        difference.
+
+        ``related_ids_by_recipe`` maps recipe ids to their new related ids,
+        or to a mapping of related ids to extra through row values such as
+        ``{'quantity': 2}``, ``user_ids`` optionally lists the owners of
+        those recipes. The current through rows are read once, then the
+        links that go are removed with one DELETE, the new ones written with
+        one INSERT and kept ones with new values with one bulk UPDATE.
+        Nothing is written or signalled when nothing changes. Returns the
+        ids of the recipes whose links changed.
+        """
+        field = self.model._meta.get_field(field_name)
+        through_model = field.remote_field.through
+        through = through_model.objects.using(self.db)
+        target = field.m2m_reverse_name()
+        wanted = {
+            recipe_id: _related_values(related_ids)
+            for recipe_id, related_ids in related_ids_by_recipe.items()
+        }
+        value_fields = sorted({
+            name
+            for related in wanted.values()
+            for values in related.values()
+            for name in values
+        })
+
+        removed, kept, updated = [], set(), []
+        rows = through.filter(recipe_id__in=wanted).values_list(
+            'id', 'recipe_id', target, *value_fields
+        )
+        for row_id, recipe_id, related_id, *current in rows:
+            values = wanted[recipe_id].get(related_id)
+            if values is None:
+                removed.append((row_id, recipe_id, related_id))
+                continue
+            kept.add((recipe_id, related_id))
+            if any(values.get(name, value) != value
+                   for name, value in zip(value_fields, current)):
+                updated.append((row_id, recipe_id, values))
+        added = [
+            (recipe_id, related_id, values)
+            for recipe_id, related in wanted.items()
+            for related_id, values in related.items()
+            if (recipe_id, related_id) not in kept
+        ]
+        if not removed and not added and not updated:
+            return set()
+
+        if removed:
+            through.filter(
+                id__in=[row_id for row_id, _, _ in removed]
+            ).delete()
+        if added:
+            self.bulk_add_relations(field_name, added, batch_size=batch_size)
+        if updated:
+            through.bulk_update(
+                [
+                    through_model(id=row_id, **values)
+                    for row_id, _, values in updated
+                ],
+                value_fields,
+                batch_size=batch_size,
+            )
+        changed = [
+            (recipe_id, related_id) for _, recipe_id, related_id in removed
+        ]
+        changed += [
+            (recipe_id, related_id) for recipe_id, related_id, _ in added
+        ]
+        recipe_ids = {recipe_id for recipe_id, _ in changed}
+        recipe_ids.update(recipe_id for _, recipe_id, _ in updated)
+        recipe_relations_changed.send(
+            sender=self.model,
+            recipe_ids=sorted(recipe_ids),
+            user_ids=user_ids,
+            related_ids={
+                field_name: {related_id for _, related_id in changed}
+            },
+        )
+        return recipe_ids
+
+    def bulk_add_relations(self, field_name, rows, batch_size=None):
+        """Insert ``(recipe_id, related_id)`` rows into a through table.
+
+        Rows may carry a third item, a dict of extra through row values.
+        """
+        field = self.model._meta.get_field(field_name)
+        through = field.remote_field.through
+        source, target = field.m2m_column_name(), field.m2m_reverse_name()
+        through.objects.using(self.db).bulk_create(
+            (
+                through(**{source: recipe_id, target: related_id},
+                        **(values[0] if values else {}))
+                for recipe_id, related_id, *values in rows
+            ),
+            batch_size=batch_size,
+        )
+
+    def refresh_summaries(self, recipe_ids=None, batch_size=1000):
+        """Recompute the denormalized relation summaries of recipes.
+
+        Works on ``recipe_ids`` if given, else on every recipe of the
+        queryset, ``batch_size`` recipes at a time with three queries per
+        batch: ingredient counts and totals (``INGREDIENT_TOTALS``, summed
+        by the database for the whole batch), tag names and one bulk UPDATE.
+        """
+        if recipe_ids is None:
+            recipe_ids = (
+                self.order_by('id').values_list('id', flat=True).iterator()
+            )
+        recipe_ids = iter(recipe_ids)
+        ingredients = self.model.ingredients.through.objects.using(self.db)
+        tags = self.model.tags.through.objects.using(self.db)
+        totals = {
+            f'total_{name}': models.Sum(models.ExpressionWrapper(
+                models.F('quantity') * models.F(f'ingredient__{column}'),
+                output_field=models.DecimalField(
+                    max_digits=24, decimal_places=7
+                ),
+            ))
+            for name, column in INGREDIENT_TOTALS.items()
+        }
+        no_ingredients = dict.fromkeys(totals, 0)
+        no_ingredients['count'] = 0
+        cent = Decimal('0.01')
+
+        refreshed = 0
+        while True:
+            batch = list(islice(recipe_ids, batch_size))
+            if not batch:
+                return refreshed
+            ingredient_rows = {
+                row['recipe_id']: row
+                for row in ingredients.filter(recipe_id__in=batch)
+                .values('recipe_id')
+                .annotate(count=models.Count('id'), **totals)
+            }
+            tag_names = {}
+            tag_rows = tags.filter(recipe_id__in=batch).values_list(
+                'recipe_id', 'tag__name'
+            ).order_by('tag__name')
+            for recipe_id, name in tag_rows:
+                tag_names.setdefault(recipe_id, []).append(name)
+
+            updates = []
+            for recipe_id in batch:
+                row = ingredient_rows.get(recipe_id, no_ingredients)
+                updates.append(self.model(
+                    id=recipe_id,
+                    ingredient_count=row['count'],
+                    tag_count=len(tag_names.get(recipe_id, ())),
+                    tag_names=tag_names.get(recipe_id, []),
+                    **{
+                        name: Decimal(row[name] or 0).quantize(cent)
+                        for name in totals
+                    }
+                ))
+            self.model.objects.using(self.db).bulk_update(
+                updates,
+                ['ingredient_count', 'tag_count', 'tag_names', *totals]
+            )
+            refreshed += len(batch)
+
+
 def recipe_image_file_path(instance, filename):
     ext = filename.split('.')[-1]
     filename = f'{uuid.uuid4()}.{ext}'
@@ -70,9 +607,305 @@ class Recipe(models.Model):
     time_minutes = models.IntegerField()
     price = models.DecimalField(max_digits=7, decimal_places=2)
     link = models.CharField(max_length=255, blank=True)
-    ingredients = models.ManyToManyField('Ingredient')
+    # What the ingredient quantities (and totals) make, see core.units.
+    servings = models.PositiveSmallIntegerField(
+        default=1, validators=[MinValueValidator(1)]
+    )
+    ingredients = models.ManyToManyField(
+        'Ingredient', through='RecipeIngredient'
+    )
     tags = models.ManyToManyField('Tag')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # Indexed so content-addressed images can be reference counted.
+    image = models.ImageField(
+        null=True, upload_to=recipe_image_file_path, db_index=True
+    )
+    # variant name -> storage name, filled in by core.images once rendered
+    image_variants = models.JSONField(default=dict, blank=True)
+    # Denormalized from ingredients and tags for recipe cards, kept in sync
+    # by core.receivers and rebuilt by the rebuild_recipe_summaries command.
+    ingredient_count = models.PositiveIntegerField(default=0)
+    tag_count = models.PositiveIntegerField(default=0)
+    tag_names = models.JSONField(default=list, blank=True)
+    # Sums over the ingredients of quantity times unit cost and nutrition,
+    # see INGREDIENT_TOTALS, kept in sync with the summaries above.
+    total_cost = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0
+    )
+    total_calories = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0
+    )
+    total_protein = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0
+    )
+    total_carbohydrates = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0
+    )
+    total_fat = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0
+    )
+    # Name (A), ingredient (B) and tag (C) words. Written by database
+    # triggers and GIN indexed on PostgreSQL (migration 0011), unused
+    # elsewhere.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'],
+                         name='core_recipe_user_id_idx'),
+            models.Index(fields=['user', 'time_minutes'],
+                         name='core_recipe_user_time_idx'),
+            models.Index(fields=['user', 'price'],
+                         name='core_recipe_user_price_idx'),
+            models.Index(fields=['user', 'total_cost'],
+                         name='core_recipe_user_cost_idx'),
+            models.Index(fields=['user', 'total_calories'],
+                         name='core_recipe_user_kcal_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        recipe = super().from_db(db, field_names, values)
+        # What RecipeStats counted for this recipe, so saves apply deltas.
+        if {'user_id', 'time_minutes', 'price'}.issubset(field_names):
+            recipe._stats_row = (
+                recipe.user_id, recipe.time_minutes, recipe.price
+            )
+        return recipe
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if self._state.adding or self.pk is None or (
+                update_fields is not None
+                and not RecipeStats.COUNTED_FIELDS & set(update_fields)):
+            return super().save(*args, **kwargs)
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self
+        )
+        with transaction.atomic(using=using, savepoint=False):
+            # The loaded values may be stale by now, see locked_stats_rows.
+            stored = Recipe.objects.using(using).locked_stats_rows([self.pk])
+            self._stats_row = stored.get(self.pk)
+            super().save(*args, **kwargs)
+
+    def stats_row(self):
+        """``(user_id, time_minutes, price)``, what RecipeStats counts."""
+        return (
+            self.user_id,
+            int(self.time_minutes),
+            self._meta.get_field('price').to_python(self.price),
+        )
 
     def __str__(self):
         return self.name
+
+
+class RecipeIngredient(models.Model):
+    """An ingredient of a recipe and how much of it, in its unit."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='recipe_ingredients',
+    )
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
+    quantity = models.DecimalField(max_digits=10, decimal_places=3, default=1)
+
+    class Meta:
+        # The table of the auto-created through model it replaced.
+        db_table = 'core_recipe_ingredients'
+        # The (ingredient, recipe) index is created by migration 0007, its
+        # name is too long to be declared here.
+        unique_together = [('recipe', 'ingredient')]
+
+
+def price_buckets():
+    """Upper bounds of the recipe price histogram buckets."""
+    return [Decimal(bound) for bound in settings.RECIPE_STATS_PRICE_BUCKETS]
+
+
+class RecipeStatsQuerySet(models.QuerySet):
+
+    def get_current(self, user_id):
+        """Return the rollup of a user, built first if missing or outdated."""
+        stats = self.filter(user_id=user_id).first()
+        if stats is None or stats.buckets() != price_buckets():
+            self.refresh([user_id])
+            stats = self.get(user_id=user_id)
+        return stats
+
+    def refresh(self, user_ids, batch_size=1000):
+        """Rebuild the rollups of ``user_ids`` from their recipes.
+
+        Missing rollups of a batch of users are inserted, concurrent
+        rebuilds skipping the rows the other one wrote, and all of them
+        locked. The counts, totals and every histogram bucket then come
+        from a single pass over their recipes, one grouped aggregate query,
+        and are written with one bulk UPDATE.
+        """
+        bounds = price_buckets()
+        histogram = {}
+        ranges = zip([None] + bounds, bounds + [None])
+        for index, (low, high) in enumerate(ranges):
+            in_bucket = models.Q()
+            if low is not None:
+                in_bucket &= models.Q(price__gte=low)
+            if high is not None:
+                in_bucket &= models.Q(price__lt=high)
+            histogram[f'bucket_{index}'] = models.Count('id', filter=in_bucket)
+        user_ids = iter(user_ids)
+        rollups = self.model.objects.using(self.db)
+
+        refreshed = 0
+        while True:
+            batch = list(islice(user_ids, batch_size))
+            if not batch:
+                return refreshed
+            recipes = Recipe.objects.using(self.db).filter(user_id__in=batch)
+            with transaction.atomic(using=self.db):
+                rollups.bulk_create(
+                    [self.model(user_id=user_id) for user_id in batch],
+                    ignore_conflicts=True,
+                )
+                # Deltas recorded meanwhile wait for the rebuilt values.
+                stats = list(
+                    rollups.select_for_update().filter(user_id__in=batch)
+                )
+                totals = {
+                    row['user_id']: row
+                    for row in recipes.order_by().values('user_id').annotate(
+                        recipe_count=models.Count('id'),
+                        total_time_minutes=models.Sum('time_minutes'),
+                        total_price=models.Sum('price'),
+                        **histogram
+                    )
+                }
+                for user_stats in stats:
+                    row = totals.get(user_stats.user_id)
+                    user_stats.price_buckets = [str(bound) for bound in bounds]
+                    if row is None:
+                        user_stats.recipe_count = 0
+                        user_stats.total_time_minutes = 0
+                        user_stats.total_price = 0
+                        user_stats.price_histogram = [0] * len(histogram)
+                    else:
+                        user_stats.recipe_count = row['recipe_count']
+                        user_stats.total_time_minutes = (
+                            row['total_time_minutes']
+                        )
+                        user_stats.total_price = row['total_price']
+                        user_stats.price_histogram = [
+                            row[name] for name in histogram
+                        ]
+                rollups.bulk_update(stats, [
+                    'recipe_count', 'total_time_minutes', 'total_price',
+                    'price_buckets', 'price_histogram',
+                ])
+            refreshed += len(batch)
+
+    def record(self, removed=(), added=()):
+        """Take ``removed`` recipe rows out of their users' rollups and add
+        ``added``.
+
+        Rows are ``Recipe.stats_row()`` tuples. Users without a rollup are
+        skipped, theirs is built in full when first read.
+        """
+        changes = {}
+        for sign, rows in ((-1, removed), (1, added)):
+            for user_id, time_minutes, price in rows:
+                changes.setdefault(user_id, []).append(
+                    (sign, time_minutes, price)
+                )
+        if not changes:
+            return
+        rollups = self.model.objects.using(self.db)
+        with transaction.atomic(using=self.db):
+            stats = list(
+                rollups.select_for_update().filter(user_id__in=changes)
+            )
+            for user_stats in stats:
+                user_stats.apply(changes[user_stats.user_id])
+            if stats:
+                rollups.bulk_update(stats, [
+                    'recipe_count', 'total_time_minutes', 'total_price',
+                    'price_histogram',
+                ])
+
+    def recipes_saved(self, recipes, created=False):
+        """Count new or changed ``recipes`` in the rollups of their users.
+
+        Changes are applied as deltas from the values the recipes were
+        loaded with. A user with a recipe saved without them loaded gets
+        their rollup rebuilt instead.
+        """
+        removed, added, unknown = [], [], set()
+        for recipe in recipes:
+            previous = None if created else recipe.__dict__.get('_stats_row')
+            current = recipe.stats_row()
+            if not created and previous is None:
+                unknown.add(recipe.user_id)
+            elif previous != current:
+                if previous is not None:
+                    removed.append(previous)
+                added.append(current)
+            recipe._stats_row = current
+        self.record(removed, added)
+        if unknown:
+            self.refresh(
+                self.filter(user_id__in=unknown)
+                .values_list('user_id', flat=True)
+            )
+
+    def recipes_deleted(self, recipes):
+        removed = []
+        for recipe in recipes:
+            if '_stats_row' not in recipe.__dict__:
+                removed.append(recipe.stats_row())
+            elif recipe._stats_row is not None:
+                # None: deleted by someone else first, already uncounted.
+                removed.append(recipe._stats_row)
+        self.record(removed=removed)
+
+
+class RecipeStats(models.Model):
+    """Rollup of the aggregates of a user's recipes, for the stats endpoint.
+
+    Built in full on first read and then kept current with deltas by
+    ``Recipe`` saves, deletes, bulk inserts and bulk updates. Updates that
+    skip those, ``QuerySet.update()`` of time or price, need a
+    ``RecipeStats.objects.refresh()`` of the users.
+    """
+    # Recipe fields the rollup depends on.
+    COUNTED_FIELDS = {'user', 'user_id', 'time_minutes', 'price'}
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    recipe_count = models.PositiveIntegerField(default=0)
+    total_time_minutes = models.BigIntegerField(default=0)
+    total_price = models.DecimalField(
+        max_digits=15, decimal_places=2, default=0
+    )
+    # Upper bounds of the histogram buckets when it was built and the number
+    # of recipes per bucket, the last one open ended.
+    price_buckets = models.JSONField(default=list)
+    price_histogram = models.JSONField(default=list)
+
+    objects = RecipeStatsQuerySet.as_manager()
+
+    def buckets(self):
+        return [Decimal(bound) for bound in self.price_buckets]
+
+    def apply(self, changes):
+        """Apply ``(sign, time_minutes, price)`` changes.
+
+        A sign of +1 adds a recipe and -1 removes it.
+        """
+        bounds = self.buckets()
+        for sign, time_minutes, price in changes:
+            self.recipe_count += sign
+            self.total_time_minutes += sign * time_minutes
+            self.total_price += sign * price
+            self.price_histogram[bisect_right(bounds, price)] += sign
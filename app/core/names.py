@@ -0,0 +1,85 @@
+"""Normalized tag and ingredient names and merging of duplicates.
+
+Nothing here imports ``core.models``, the functions take the model to work
+on. Migrations keep their own frozen copies (see 0013) rather than calling
+these, which change along with the models.
+"""
+
+
+def normalize_name(name):
+    """Case and whitespace insensitive form of a tag or ingredient name."""
+    return ' '.join(name.split()).casefold()[:255]
+
+
+def merge_duplicates(model, batch_size=1000):
+    """Collapse rows of ``model`` sharing a user and a normalized name.
+
+    The oldest row of each group is kept: the recipes linked to the others
+    are moved to it, skipping links it already has, and the others are
+    deleted, ``batch_size`` duplicates at a time. ``normalized_name`` is
+    recomputed along the way, so this also applies a change of
+    ``normalize_name`` to existing rows.
+
+    Returns the number of rows merged, the ids of the recipes whose links
+    changed and the ids of the users involved.
+    """
+    column = f'{model._meta.model_name}_id'
+    through = model.recipe_set.through
+    merged, recipe_ids, user_ids = 0, set(), set()
+    duplicates, renamed = {}, []
+
+    def flush():
+        # Links are moved with their other through columns (quantities).
+        wanted = {}
+        links = through.objects.filter(**{f'{column}__in': duplicates})
+        for link in links.values():
+            del link['id']
+            link[column] = duplicates[link[column]]
+            wanted.setdefault((link['recipe_id'], link[column]), link)
+        existing = set(
+            through.objects.filter(**{
+                'recipe_id__in': {recipe_id for recipe_id, _ in wanted},
+                f'{column}__in': set(duplicates.values()),
+            }).values_list('recipe_id', column)
+        ) if wanted else set()
+        through.objects.bulk_create(
+            [
+                through(**link)
+                for key, link in wanted.items() if key not in existing
+            ],
+            batch_size=batch_size,
+        )
+        through.objects.filter(**{f'{column}__in': duplicates}).delete()
+        # The links are gone already, a plain DELETE skips the collector and
+        # the per-row delete signals.
+        duplicate_rows = model.objects.filter(id__in=duplicates)
+        duplicate_rows._raw_delete(duplicate_rows.db)
+        recipe_ids.update(recipe_id for recipe_id, _ in wanted)
+        duplicates.clear()
+
+    rows = model.objects.order_by('user_id', 'id').values_list(
+        'id', 'user_id', 'name', 'normalized_name'
+    )
+    current_user, kept = None, {}
+    rows = rows.iterator(chunk_size=batch_size)
+    for row_id, user_id, name, normalized_name in rows:
+        if user_id != current_user:
+            current_user, kept = user_id, {}
+        normalized = normalize_name(name)
+        if normalized in kept:
+            duplicates[row_id] = kept[normalized]
+            merged += 1
+            user_ids.add(user_id)
+            if len(duplicates) >= batch_size:
+                flush()
+        else:
+            kept[normalized] = row_id
+            if normalized != normalized_name:
+                renamed.append(model(id=row_id, normalized_name=normalized))
+    if duplicates:
+        flush()
+
+    model.objects.bulk_update(
+        renamed, ['normalized_name'], batch_size=batch_size
+    )
+    return merged, recipe_ids, user_ids
@@ -0,0 +1,163 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete
+)
+from django.dispatch import receiver
+
+from core import index
+from core.models import (
+    Tag, Ingredient, Recipe, RecipeStats, in_batch_delete
+)
+from core.signals import recipe_relations_changed, recipes_deleted
+from core.storage import release_image
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(sender, instance, **kwargs):
+    if in_batch_delete(instance):
+        return
+    # Only once the delete is committed: a rollback keeps the recipe.
+    name = instance.image.name
+    variants = list(instance.image_variants.values())
+    transaction.on_commit(lambda: release_image(name, variants))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    if in_batch_delete(instance):
+        return
+    # Its through rows are cascaded without m2m_changed.
+    index.relations_changed(instance.user_id, [instance.pk])
+    RecipeStats.objects.recipes_deleted([instance])
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_pre_delete(sender, instance, using, **kwargs):
+    if in_batch_delete(instance):
+        return
+    # Uncount what is stored, not what was loaded: another save may have
+    # changed it since. Deletes already run in a transaction.
+    stored = Recipe.objects.using(using).locked_stats_rows([instance.pk])
+    instance._stats_row = stored.get(instance.pk)
+    # The through rows go next, without m2m_changed: uncount them while
+    # they're still there to join on.
+    for model in (Tag, Ingredient):
+        model.objects.filter(recipe=instance, recipe_count__gt=0).update(
+            recipe_count=F('recipe_count') - 1
+        )
+
+
+@receiver(recipes_deleted, sender=Recipe)
+def recipes_batch_deleted(sender, recipe_ids, user_ids, images, **kwargs):
+    for user_id in user_ids:
+        index.relations_changed(user_id, recipe_ids)
+    for name, variants in images.items():
+        # Bind the loop values, the callbacks run after the loop.
+        transaction.on_commit(
+            lambda name=name, variants=variants: release_image(name, variants)
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, update_fields=None, **kwargs):
+    counted = RecipeStats.COUNTED_FIELDS
+    if update_fields is None or counted & set(update_fields):
+        RecipeStats.objects.recipes_saved([instance], created=created)
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_relation_m2m_changed(sender, instance, action, reverse, pk_set,
+                                **kwargs):
+    """Turn ``m2m_changed`` into ``recipe_relations_changed``.
+
+    Changes made from either side of the relation are handled.
+    """
+    field_name = 'tags' if sender is Recipe.tags.through else 'ingredients'
+    if action == 'pre_clear':
+        # What is cleared is only known before the rows are gone.
+        if reverse:
+            related = instance.recipe_set
+        else:
+            related = getattr(instance, field_name)
+        instance._cleared_ids = list(related.values_list('id', flat=True))
+        return
+    elif action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_ids', [])
+
+    if reverse:
+        recipe_ids, related_ids = pk_set, [instance.pk]
+    else:
+        recipe_ids, related_ids = [instance.pk], pk_set
+
+    if action in ('post_add', 'post_remove', 'post_clear') and pk_set:
+        recipe_relations_changed.send(
+            sender=Recipe,
+            recipe_ids=list(recipe_ids),
+            user_ids=[instance.user_id],
+            related_ids={field_name: list(related_ids)},
+        )
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, **kwargs):
+    if not created:
+        recipe_relations_changed.send(
+            sender=Recipe,
+            recipe_ids=list(instance.recipe_set.values_list('id', flat=True)),
+            user_ids=[instance.user_id],
+        )
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    # Only the recipes using it have totals to recompute.
+    if not created and instance.totals_changed():
+        Recipe.objects.refresh_summaries(
+            list(instance.recipe_set.values_list('id', flat=True))
+        )
+    instance._totals_values = instance.totals_values()
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def related_pre_delete(sender, instance, **kwargs):
+    # The through rows are cascaded without m2m_changed, remember the recipes.
+    instance._deleted_recipe_ids = list(
+        instance.recipe_set.values_list('id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def related_post_delete(sender, instance, **kwargs):
+    recipe_ids = instance.__dict__.pop('_deleted_recipe_ids', [])
+    if recipe_ids:
+        recipe_relations_changed.send(
+            sender=Recipe, recipe_ids=recipe_ids, user_ids=[instance.user_id]
+        )
+
+
+@receiver(recipe_relations_changed, sender=Recipe)
+def refresh_recipe_summaries(sender, recipe_ids, **kwargs):
+    Recipe.objects.refresh_summaries(recipe_ids)
+
+
+@receiver(recipe_relations_changed, sender=Recipe)
+def refresh_recipe_counts(sender, recipe_ids, related_ids=None, **kwargs):
+    for field_name, ids in (related_ids or {}).items():
+        if ids:
+            model = Recipe._meta.get_field(field_name).related_model
+            model.objects.refresh_recipe_counts(ids)
+
+
+@receiver(recipe_relations_changed, sender=Recipe)
+def update_recipe_indexes(sender, recipe_ids, user_ids=None, **kwargs):
+    if user_ids is None:
+        user_ids = set(
+            Recipe.objects.filter(id__in=recipe_ids)
+            .values_list('user_id', flat=True)
+        )
+    for user_id in user_ids:
+        index.relations_changed(user_id, recipe_ids)
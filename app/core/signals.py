@@ -0,0 +1,14 @@
+from django.dispatch import Signal
+
+# Sent with ``recipe_ids`` whenever the tags or ingredients of recipes change:
+# by core.receivers for ``m2m_changed`` and renames or deletions of the related
+# rows, and by bulk writes to the through tables. ``user_ids``, the owners of
+# the recipes, is optional and looked up when missing. ``related_ids`` maps
+# ``'tags'``/``'ingredients'`` to the ids whose links may have changed, so
+# their recipe counts are refreshed.
+recipe_relations_changed = Signal()
+
+# Sent once by ``RecipeQuerySet.delete()`` with the deleted ``recipe_ids``,
+# their owners' ``user_ids`` and ``images``, mapping the image of each to its
+# variants. Recipes deleted one by one go through ``post_delete`` instead.
+recipes_deleted = Signal()
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils.deconstruct import deconstructible
+
+from core.models import Recipe
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that keeps each distinct file once.
+
+    Files are named after the SHA-256 of their bytes, in the directory and
+    with the extension of the requested name (``uploads/recipe/ab/abcd….png``).
+    Saving bytes that are already stored just returns the existing name, and
+    since a name always maps to the same content, URLs are immutable.
+
+    Names that already sit under a digest (like ``abcd…_thumb.jpg``, the
+    variants rendered from ``abcd….png``) are derived from content too and
+    are stored as given.
+    """
+
+    def _is_addressed(self, name):
+        directory, filename = os.path.split(name)
+        prefix = filename[:64]
+        return (
+            len(prefix) == 64
+            and all(char in '0123456789abcdef' for char in prefix)
+            and os.path.basename(directory) == prefix[:2]
+        )
+
+    def _digest(self, content):
+        # Upload handlers may have hashed the bytes while they streamed in.
+        digest = getattr(content, 'sha256', None)
+        if digest:
+            return digest
+        sha256 = hashlib.sha256()
+        for chunk in content.chunks():
+            sha256.update(chunk)
+        content.seek(0)
+        return sha256.hexdigest()
+
+    def _save(self, name, content):
+        if not self._is_addressed(name):
+            digest = self._digest(content)
+            directory, filename = os.path.split(name)
+            extension = os.path.splitext(filename)[1].lower()
+            name = os.path.join(directory, digest[:2], f'{digest}{extension}')
+        if self.exists(name):
+            return name
+        # Write under a unique name and move it into place, so concurrent
+        # saves of the same bytes just replace each other.
+        temporary = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
+
+    def release(self, name, referenced):
+        """Delete ``name`` unless ``referenced()`` once it's moved aside.
+
+        An upload of the same bytes that lands while the file is aside
+        either shows up in ``referenced()`` and gets the file back, or
+        finds the file missing and stores it again.
+        """
+        path = self.path(name)
+        aside = f'{path}.{uuid.uuid4().hex}.released'
+        try:
+            os.replace(path, aside)
+        except FileNotFoundError:
+            return False
+        if referenced():
+            os.replace(aside, path)
+            return False
+        os.remove(aside)
+        return True
+
+    def get_available_name(self, name, max_length=None):
+        if self._is_addressed(name):
+            return name
+        return super().get_available_name(name, max_length)
+
+
+def release_image(name, variants=(), storage=default_storage):
+    """Delete an image and its variants once no recipe references it.
+
+    References are checked again right before each file goes, see
+    ``ContentAddressedStorage.release``.
+    """
+    if not name:
+        return False
+    referenced = Recipe.objects.filter(image=name).exists
+    if referenced():
+        return False
+    release = getattr(storage, 'release', None)
+    if release is None:
+        for variant in (name, *variants):
+            storage.delete(variant)
+        return True
+    released = release(name, referenced)
+    for variant in variants:
+        release(variant, referenced)
+    return released
+
+
+def ensure_image(name, content, storage=default_storage):
+    """Store ``content`` again under ``name`` if a release removed it."""
+    if name and not storage.exists(name):
+        content.seek(0)
+        storage.save(name, content)
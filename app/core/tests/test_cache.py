@@ -0,0 +1,40 @@
+from unittest.mock import patch
+from django.test import SimpleTestCase
+
+from core.cache import LRUCache
+
+
+class LRUCacheTests(SimpleTestCase):
+
+    def test_least_recently_used_evicted(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    @patch('time.monotonic')
+    def test_entries_expire(self, monotonic):
+        cache = LRUCache(maxsize=2, ttl=10)
+        monotonic.return_value = 100
+        cache.set('a', 1)
+
+        monotonic.return_value = 109
+        self.assertEqual(cache.get('a'), 1)
+        monotonic.return_value = 111
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_discard_where(self):
+        cache = LRUCache(maxsize=5)
+        cache.set('a', 1)
+        cache.set('b', 2)
+
+        cache.discard_where(lambda value: value == 2)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
@@ -1,8 +1,17 @@
+import json
+import os
+import tempfile
+from io import StringIO
 from unittest.mock import patch
-from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.management import call_command, CommandError
 from django.db.utils import OperationalError
 from django.test import TestCase
 
+from core.cache import get_user_version
+from core.models import Recipe, RecipeStats, Tag, Ingredient
+from recipe import export
+
 class CommandTests(TestCase):
     def test_wait_for_db_ready(self):
         with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
@@ -17,3 +26,303 @@ class CommandTests(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 6)
+
+    def test_benchmark_assigned_rolls_back_seed(self):
+        out = StringIO()
+        call_command(
+            'benchmark_assigned',
+            recipes=20, tags=5, ingredients=5, links=2, repeat=1,
+            stdout=out
+        )
+
+        self.assertIn('EXISTS', out.getvalue())
+        self.assertIn('JOIN ... DISTINCT', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+
+
+class ImportRecipesCommandTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@site.com',
+            '1234'
+        )
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(content)
+        return path
+
+    def test_import_csv(self):
+        existing = Tag.objects.create(user=self.user, name='Vegan')
+        path = self.write('recipes.csv', (
+            'name,time_minutes,price,link,ingredients,tags\n'
+            'Curry,30,12.50,,Tofu;Arroz,Vegan\n'
+            'Arroz frito,15,4,,Arroz,Vegan;Rapido\n'
+        ))
+        out = StringIO()
+
+        call_command('import_recipes', path, user=self.user.email, stdout=out)
+
+        self.assertIn('Imported 2 recipes', out.getvalue())
+        curry = Recipe.objects.get(user=self.user, name='Curry')
+        self.assertEqual(str(curry.price), '12.50')
+        self.assertEqual(
+            sorted(curry.ingredients.values_list('name', flat=True)),
+            ['Arroz', 'Tofu']
+        )
+        self.assertEqual(list(curry.tags.all()), [existing])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 2)
+
+    def test_import_ndjson_in_batches(self):
+        lines = [
+            json.dumps({
+                'name': f'Recipe {i}',
+                'time_minutes': i,
+                'price': '1.00',
+                'ingredients': ['Sal'],
+                'tags': [],
+            })
+            for i in range(5)
+        ]
+        path = self.write('recipes.ndjson', '\n'.join(lines + ['not json']))
+        out, err = StringIO(), StringIO()
+
+        call_command(
+            'import_recipes', path, user=self.user.email, batch_size=2,
+            stdout=out, stderr=err
+        )
+
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 1)
+        self.assertIn('Line 6 skipped', err.getvalue())
+        self.assertIn('5 recipes imported, 1 skipped', out.getvalue())
+
+    def test_import_skips_invalid_ndjson_values(self):
+        valid = {'name': 'Curry', 'time_minutes': 30, 'price': '5.00'}
+        lines = [
+            dict(valid, price=float('nan')),
+            dict(valid, ingredients=['Sal'], quantities={'Sal': float('nan')}),
+            dict(valid, ingredients='Sal'),
+            dict(valid, tags=['Vegan', 1]),
+            valid,
+        ]
+        path = self.write('recipes.ndjson', '\n'.join(
+            json.dumps(line) for line in lines
+        ))
+        err = StringIO()
+
+        call_command(
+            'import_recipes', path, user=self.user.email,
+            stdout=StringIO(), stderr=err
+        )
+
+        for line in range(1, 5):
+            self.assertIn(f'Line {line} skipped', err.getvalue())
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+        self.assertFalse(Ingredient.objects.filter(user=self.user).exists())
+        self.assertFalse(Tag.objects.filter(user=self.user).exists())
+
+    def test_import_matches_normalized_names(self):
+        Ingredient.objects.create(user=self.user, name='Tofu')
+        path = self.write('recipes.csv', (
+            'name,time_minutes,price,ingredients\n'
+            'Curry,30,12.50,tofu;TOFU;Arroz\n'
+            'Arroz frito,15,4,arroz \n'
+        ))
+
+        call_command(
+            'import_recipes', path, user=self.user.email, stdout=StringIO()
+        )
+
+        ingredients = Ingredient.objects.filter(user=self.user)
+        self.assertEqual(
+            sorted(ingredients.values_list('name', flat=True)),
+            ['Arroz', 'Tofu']
+        )
+        curry = Recipe.objects.get(name='Curry')
+        self.assertEqual(curry.ingredients.count(), 2)
+
+    def test_import_csv_quantities_and_units(self):
+        path = self.write('recipes.csv', (
+            'name,time_minutes,price,servings,ingredients,quantities,units\n'
+            'Curry,30,12.50,4,Tofu;Arroz;Sal,200;;0.5,g;;tsp\n'
+            'Sopa,30,3,,Agua,-1,\n'
+        ))
+        err = StringIO()
+
+        call_command(
+            'import_recipes', path, user=self.user.email,
+            stdout=StringIO(), stderr=err
+        )
+
+        curry = Recipe.objects.get(user=self.user, name='Curry')
+        rows = curry.recipe_ingredients.select_related('ingredient')
+        self.assertEqual(
+            {row.ingredient.name: str(row.quantity) for row in rows},
+            {'Tofu': '200.000', 'Arroz': '1.000', 'Sal': '0.500'},
+        )
+        self.assertEqual(curry.servings, 4)
+        ingredients = Ingredient.objects.filter(user=self.user)
+        self.assertEqual(
+            dict(ingredients.values_list('name', 'unit')),
+            {'Tofu': 'g', 'Arroz': '', 'Sal': 'tsp'},
+        )
+        self.assertIn('Line 3 skipped', err.getvalue())
+
+    def test_export_import_round_trip(self):
+        flour = Ingredient.objects.create(
+            user=self.user, name='Harina', unit='g', unit_cost='0.002'
+        )
+        milk = Ingredient.objects.create(
+            user=self.user, name='Leche', unit='cup'
+        )
+        crepes = Recipe.objects.create(
+            user=self.user, name='Crepes', time_minutes=20, price=3, servings=4
+        )
+        Recipe.objects.bulk_set_relations('ingredients', {
+            crepes.id: {
+                flour.id: {'quantity': '250'},
+                milk.id: {'quantity': '0.5'},
+            },
+        })
+        crepes.tags.add(Tag.objects.create(user=self.user, name='Dulce'))
+        path = self.write('recipes.ndjson', ''.join(
+            export.iter_ndjson(Recipe.objects.filter(user=self.user))
+        ))
+        other = get_user_model().objects.create_user('other@site.com', '1234')
+        Ingredient.objects.create(
+            user=other, name='Harina', unit='kg', unit_cost='0.002'
+        )
+
+        call_command(
+            'import_recipes', path, user=other.email, stdout=StringIO()
+        )
+
+        def quantities(recipe):
+            rows = recipe.recipe_ingredients.order_by('id')
+            return [(row.ingredient.name, row.quantity) for row in rows]
+
+        imported = Recipe.objects.get(user=other)
+        self.assertEqual(quantities(imported), quantities(crepes))
+        self.assertEqual(imported.servings, 4)
+        self.assertEqual(
+            list(imported.tags.values_list('name', flat=True)), ['Dulce']
+        )
+        # Units are only given to the ingredients the import creates.
+        ingredients = Ingredient.objects.filter(user=other)
+        self.assertEqual(
+            dict(ingredients.values_list('name', 'unit')),
+            {'Harina': 'kg', 'Leche': 'cup'},
+        )
+        crepes.refresh_from_db()
+        self.assertEqual(imported.total_cost, crepes.total_cost)
+
+    def test_import_unknown_user(self):
+        path = self.write('recipes.csv', 'name,time_minutes,price\n')
+
+        with self.assertRaises(CommandError):
+            call_command('import_recipes', path, user='missing@site.com')
+
+
+class RebuildRecipeSummariesCommandTests(TestCase):
+
+    def test_rebuild_summaries(self):
+        user = get_user_model().objects.create_user('test@site.com', '1234')
+        tag = Tag.objects.create(user=user, name='Vegan')
+        recipes = [
+            Recipe.objects.create(
+                user=user, name=f'Recipe {i}', time_minutes=i, price=1
+            )
+            for i in range(3)
+        ]
+        for recipe in recipes:
+            recipe.tags.add(tag)
+        Recipe.objects.update(tag_count=0, tag_names=[])
+        version = get_user_version(user.pk)
+        out = StringIO()
+
+        call_command(
+            'rebuild_recipe_summaries',
+            user=user.email, batch_size=2, stdout=out
+        )
+
+        self.assertIn('Rebuilt 3 recipe summaries', out.getvalue())
+        self.assertEqual(
+            list(Recipe.objects.values_list('tag_count', 'tag_names')),
+            [(1, ['Vegan'])] * 3
+        )
+        self.assertGreater(get_user_version(user.pk), version)
+
+    def test_rebuild_unknown_user(self):
+        with self.assertRaises(CommandError):
+            call_command('rebuild_recipe_summaries', user='missing@site.com')
+
+
+class RebuildRecipeStatsCommandTests(TestCase):
+
+    def test_rebuild_stats(self):
+        user = get_user_model().objects.create_user('test@site.com', '1234')
+        for price in (3, 8):
+            Recipe.objects.create(
+                user=user, name='Curry', time_minutes=10, price=price
+            )
+        RecipeStats.objects.get_current(user.pk)
+        RecipeStats.objects.filter(user=user).update(
+            recipe_count=7, total_price=1
+        )
+        out = StringIO()
+
+        call_command('rebuild_recipe_stats', user=user.email, stdout=out)
+
+        self.assertIn('Rebuilt the stats of 1 users', out.getvalue())
+        stats = RecipeStats.objects.get(user=user)
+        self.assertEqual((stats.recipe_count, stats.total_price), (2, 11))
+
+    def test_rebuild_stats_unknown_user(self):
+        with self.assertRaises(CommandError):
+            call_command('rebuild_recipe_stats', user='missing@site.com')
+
+
+class MergeDuplicateNamesCommandTests(TestCase):
+
+    def test_merge_duplicates(self):
+        user = get_user_model().objects.create_user('test@site.com', '1234')
+        # Rows normalized under older rules, which the command reapplies.
+        Ingredient.objects.bulk_create([
+            Ingredient(user=user, name='Salt', normalized_name='salt'),
+            Ingredient(user=user, name='SALT ', normalized_name='SALT '),
+            Ingredient(user=user, name='Pepper', normalized_name='Pepper'),
+        ])
+        salt, legacy, other = Ingredient.objects.order_by('id')
+        both = Recipe.objects.create(
+            user=user, name='Both', time_minutes=1, price=1
+        )
+        both.ingredients.add(salt, legacy)
+        only_legacy = Recipe.objects.create(
+            user=user, name='Legacy', time_minutes=1, price=1
+        )
+        only_legacy.ingredients.add(legacy, other)
+        out = StringIO()
+
+        call_command('merge_duplicate_names', stdout=out)
+
+        self.assertIn('Merged 1 duplicate ingredients', out.getvalue())
+        self.assertEqual(
+            list(Ingredient.objects.order_by('id').values_list(
+                'id', 'normalized_name'
+            )),
+            [(salt.id, 'salt'), (other.id, 'pepper')]
+        )
+        self.assertEqual(list(both.ingredients.all()), [salt])
+        self.assertEqual(
+            list(only_legacy.ingredients.order_by('id')), [salt, other]
+        )
+        only_legacy.refresh_from_db()
+        self.assertEqual(only_legacy.ingredient_count, 2)
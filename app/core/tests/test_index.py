@@ -0,0 +1,167 @@
+import time
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from core import index
+from core.cache import bump_relations_version
+from core.models import Recipe, Tag, Ingredient
+
+
+class RecipeIndexTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        index.clear_indexes()
+        self.user = get_user_model().objects.create_user(
+            'test@site.com',
+            '1234'
+        )
+        self.ingredients = {
+            name: Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Arroz', 'Tofu', 'Curry', 'Leche')
+        }
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+
+    def recipe(self, name, ingredients, tags=()):
+        recipe = Recipe.objects.create(
+            user=self.user, name=name, time_minutes=10, price=5
+        )
+        recipe.ingredients.add(
+            *(self.ingredients[name] for name in ingredients)
+        )
+        recipe.tags.add(*tags)
+        return recipe
+
+    def similar_ids(self, recipe_id):
+        similar = index.get_recipe_index(self.user.pk).similar(recipe_id, 10)
+        return [similar_id for similar_id, _ in similar]
+
+    def test_similar_ranked_by_overlap(self):
+        curry = self.recipe('Curry', ['Arroz', 'Tofu', 'Curry'], [self.vegan])
+        close = self.recipe('Arroz con tofu', ['Arroz', 'Tofu'], [self.vegan])
+        far = self.recipe('Arroz con leche', ['Arroz', 'Leche'])
+        self.recipe('Leche', ['Leche'])
+
+        ranked = index.get_recipe_index(self.user.pk).similar(curry.id, 10)
+
+        self.assertEqual(
+            [recipe_id for recipe_id, _ in ranked],
+            [close.id, far.id]
+        )
+        # 0.75 * 2/3 (ingredients) + 0.25 * 1/1 (tags)
+        self.assertAlmostEqual(ranked[0][1], 0.75)
+        self.assertAlmostEqual(ranked[1][1], 0.75 * 1 / 4)
+
+    def test_cosine(self):
+        curry = self.recipe('Curry', ['Arroz', 'Tofu', 'Curry'])
+        close = self.recipe('Arroz con tofu', ['Arroz', 'Tofu'])
+
+        recipe_index = index.get_recipe_index(self.user.pk)
+        ranked = recipe_index.similar(curry.id, 10, 'cosine')
+
+        self.assertEqual(ranked[0][0], close.id)
+        self.assertAlmostEqual(ranked[0][1], 2 / 6 ** 0.5)
+
+    def test_rebuilt_when_changed_elsewhere(self):
+        curry = self.recipe('Curry', ['Arroz'])
+        recipe_index = index.get_recipe_index(self.user.pk)
+
+        # Another process changed the user's recipes.
+        bump_relations_version(self.user.pk)
+        other = self.recipe('Arroz frito', ['Arroz'])
+
+        rebuilt = index.get_recipe_index(self.user.pk)
+        self.assertIsNot(rebuilt, recipe_index)
+        self.assertEqual(self.similar_ids(curry.id), [other.id])
+
+    def test_rebuilt_when_too_old(self):
+        # Bumps from processes that don't share the cache are never seen.
+        curry = self.recipe('Curry', ['Arroz'])
+        recipe_index = index.get_recipe_index(self.user.pk)
+
+        later = time.monotonic() + settings.RECIPE_INDEX_TTL + 1
+        with patch('core.cache.time.monotonic', return_value=later):
+            rebuilt = index.get_recipe_index(self.user.pk)
+
+        self.assertIsNot(rebuilt, recipe_index)
+        self.assertIn(curry.id, rebuilt.features['ingredients'])
+
+    def test_pantry_ranked_by_coverage(self):
+        curry = self.recipe('Curry', ['Arroz', 'Tofu', 'Curry'])
+        fried = self.recipe('Arroz con tofu', ['Arroz', 'Tofu'])
+        milk = self.recipe('Arroz con leche', ['Arroz', 'Leche'])
+        self.recipe('Leche', ['Leche'])
+        pantry = [
+            self.ingredients[name].id for name in ('Arroz', 'Tofu', 'Curry')
+        ]
+
+        recipe_index = index.get_recipe_index(self.user.pk)
+
+        self.assertEqual(recipe_index.pantry(pantry, 10), [
+            (curry.id, 3, 0), (fried.id, 2, 0), (milk.id, 1, 1),
+        ])
+        self.assertEqual(recipe_index.pantry(pantry, 10, max_missing=0), [
+            (curry.id, 3, 0), (fried.id, 2, 0),
+        ])
+        self.assertEqual(recipe_index.pantry(pantry, 1), [(curry.id, 3, 0)])
+
+
+class RecipeIndexCommitTests(TransactionTestCase):
+    """Changes reach the index on commit, so no test transaction here."""
+
+    setUp = RecipeIndexTests.setUp
+    recipe = RecipeIndexTests.recipe
+    similar_ids = RecipeIndexTests.similar_ids
+
+    def test_incremental_update(self):
+        curry = self.recipe('Curry', ['Arroz', 'Tofu'])
+        other = self.recipe('Sopa', ['Leche'])
+        recipe_index = index.get_recipe_index(self.user.pk)
+        self.assertEqual(recipe_index.similar(curry.id, 10), [])
+
+        other.ingredients.add(self.ingredients['Tofu'])
+        # Only the changed recipe is reloaded, one query per relation.
+        with self.assertNumQueries(2):
+            self.assertIs(index.get_recipe_index(self.user.pk), recipe_index)
+        self.assertEqual(
+            [recipe_id for recipe_id, _ in recipe_index.similar(curry.id, 10)],
+            [other.id]
+        )
+
+        other.delete()
+        self.assertEqual(self.similar_ids(curry.id), [])
+        self.assertNotIn(other.id, recipe_index.features['ingredients'])
+
+    def test_queryset_delete(self):
+        curry = self.recipe('Curry', ['Arroz', 'Tofu'])
+        others = [self.recipe(f'Sopa {i}', ['Tofu']) for i in range(3)]
+        recipe_index = index.get_recipe_index(self.user.pk)
+
+        Recipe.objects.filter(id__in=[other.id for other in others]).delete()
+
+        self.assertEqual(self.similar_ids(curry.id), [])
+        self.assertIs(index.get_recipe_index(self.user.pk), recipe_index)
+        self.assertEqual(
+            list(recipe_index.features['ingredients']), [curry.id]
+        )
+
+    def test_uncommitted_changes_stay_pending(self):
+        curry = self.recipe('Curry', ['Arroz', 'Tofu'])
+        other = self.recipe('Sopa', ['Leche'])
+        recipe_index = index.get_recipe_index(self.user.pk)
+
+        with transaction.atomic():
+            other.ingredients.add(self.ingredients['Tofu'])
+            # Another request reads the index before the commit.
+            self.assertEqual(self.similar_ids(curry.id), [])
+
+        self.assertIs(index.get_recipe_index(self.user.pk), recipe_index)
+        self.assertEqual(
+            [recipe_id for recipe_id, _ in recipe_index.similar(curry.id, 10)],
+            [other.id]
+        )
@@ -0,0 +1,145 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from core import index, mealplan
+from core.models import Ingredient, Recipe, Tag
+
+
+class MealPlanTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        index.clear_indexes()
+        self.user = get_user_model().objects.create_user(
+            'test@site.com',
+            '1234'
+        )
+        self.ingredients = {
+            name: Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Arroz', 'Tofu', 'Curry', 'Leche', 'Huevo', 'Harina')
+        }
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+
+    def recipe(self, name, ingredients, time_minutes=30, price=5, tags=()):
+        recipe = Recipe.objects.create(
+            user=self.user, name=name, time_minutes=time_minutes, price=price
+        )
+        recipe.ingredients.add(
+            *(self.ingredients[name] for name in ingredients)
+        )
+        recipe.tags.add(*tags)
+        return recipe
+
+    def plan_ids(self, plan):
+        return [recipe_id for (recipe_id,) in plan]
+
+    def test_plan_reuses_ingredients(self):
+        curry = self.recipe('Curry', ['Arroz', 'Tofu', 'Curry'])
+        fried_rice = self.recipe('Arroz frito', ['Arroz', 'Tofu'])
+        self.recipe('Crepes', ['Leche', 'Huevo', 'Harina'])
+
+        plan = mealplan.plan_meals(self.user.pk, days=2)
+
+        self.assertEqual(
+            sorted(self.plan_ids(plan)),
+            sorted([curry.id, fried_rice.id])
+        )
+
+    def test_plan_respects_time_budget_and_tags(self):
+        vegan = [self.vegan]
+        quick = self.recipe('Arroz frito', ['Arroz', 'Tofu'],
+                            time_minutes=20, price=4, tags=vegan)
+        slow = self.recipe('Curry', ['Arroz', 'Tofu', 'Curry'],
+                           time_minutes=90, price=6, tags=vegan)
+        dear = self.recipe('Tofu salteado', ['Tofu'],
+                           time_minutes=15, price=30, tags=vegan)
+        untagged = self.recipe('Arroz blanco', ['Arroz'],
+                               time_minutes=20, price=2)
+        plain = self.recipe('Arroz con leche', ['Arroz', 'Leche'],
+                            time_minutes=40, price=3, tags=vegan)
+
+        plan = mealplan.plan_meals(
+            self.user.pk, days=1, meals_per_day=2, max_time_per_day=60,
+            budget=Decimal('10'), tags=[self.vegan.pk],
+        )
+
+        self.assertEqual(sorted(plan[0]), sorted([quick.id, plain.id]))
+        self.assertNotIn(slow.id, plan[0])
+        self.assertNotIn(dear.id, plan[0])
+        self.assertNotIn(untagged.id, plan[0])
+
+        plan = mealplan.plan_meals(
+            self.user.pk, days=1, exclude_tags=[self.vegan.pk]
+        )
+        self.assertEqual(plan, [[untagged.id]])
+
+    def test_slots_left_empty_when_nothing_fits(self):
+        only = self.recipe('Curry', ['Arroz', 'Tofu', 'Curry'],
+                           time_minutes=30)
+
+        plan = mealplan.plan_meals(self.user.pk, days=3, max_time_per_day=45)
+
+        self.assertEqual(sorted(plan, key=str), [[only.id], [None], [None]])
+
+    @override_settings(MEAL_PLAN_POOL_SIZE=5)
+    def test_pool_keeps_reusable_and_cheap_recipes(self):
+        shared = [
+            self.recipe(f'Arroz {i}', ['Arroz', 'Tofu'], price=8)
+            for i in range(6)
+        ]
+        cheap = self.recipe('Crepes', ['Leche', 'Huevo', 'Harina'], price=1)
+
+        plan = mealplan.plan_meals(self.user.pk, days=2, budget=Decimal('9'))
+
+        # Only the cheap recipe leaves room for a second one under budget.
+        planned = set(self.plan_ids(plan))
+        self.assertIn(cheap.id, planned)
+        self.assertTrue(planned & {recipe.id for recipe in shared})
+
+    def test_candidates_filtered_and_capped_in_sql(self):
+        vegan = [self.vegan]
+        self.recipe('Curry', ['Arroz', 'Tofu', 'Curry'], price=6, tags=vegan)
+        cheap = self.recipe('Arroz frito', ['Arroz', 'Tofu'],
+                            price=4, tags=vegan)
+        cheapest = self.recipe('Arroz blanco', ['Arroz'], price=2, tags=vegan)
+        self.recipe('Crepes', ['Leche', 'Huevo', 'Harina'], price=1)
+        index.get_recipe_index(self.user.pk)
+
+        with self.assertNumQueries(1):
+            candidates = mealplan._candidates(
+                self.user.pk, tags=[self.vegan.pk], limit=2
+            )
+
+        self.assertEqual(
+            [candidate.id for candidate in candidates],
+            [cheapest.id, cheap.id]
+        )
+        self.assertEqual(
+            candidates[1].ingredients,
+            frozenset([self.ingredients['Arroz'].id,
+                       self.ingredients['Tofu'].id]),
+        )
+
+    def test_shopping_list_sums_quantities(self):
+        rice, tofu = self.ingredients['Arroz'], self.ingredients['Tofu']
+        curry = self.recipe('Curry', ['Arroz', 'Tofu'])
+        fried_rice = self.recipe('Arroz frito', ['Arroz'])
+        Ingredient.objects.filter(name='Arroz').update(unit='g')
+        Recipe.objects.bulk_set_relations('ingredients', {
+            curry.id: {rice.id: {'quantity': 600}, tofu.id: {}},
+            fried_rice.id: {rice.id: {'quantity': 500}},
+        })
+        recipes = Recipe.objects.filter(user=self.user).prefetch_related(
+            'recipe_ingredients__ingredient'
+        )
+
+        items = mealplan.shopping_list(recipes, system='metric')
+
+        self.assertEqual(
+            [(ingredient.name, round(quantity, 3), unit, count)
+             for ingredient, quantity, unit, count in items],
+            [('Arroz', 1.1, 'kg', 2), ('Tofu', 1.0, '', 1)],
+        )
@@ -1,4 +1,7 @@
+from decimal import Decimal
+from unittest import skipUnless
 from unittest.mock import patch
+from django.db import IntegrityError, connection
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from core import models
@@ -49,6 +52,14 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(ingredient), ingredient.name)
 
+    def test_tag_name_normalized(self):
+        user = sample_user()
+        tag = models.Tag.objects.create(user=user, name='  Sin   TACC ')
+
+        self.assertEqual(tag.normalized_name, 'sin tacc')
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name='sin tacc')
+
     def test_recipe_str(self):
         recipe = models.Recipe.objects.create(
             user=sample_user(),
@@ -67,3 +78,311 @@ class ModelTests(TestCase):
 
         expected_path = f'uploads/recipe/{uuid}.png'
         self.assertEqual(file_path, expected_path)
+
+
+class RecipeSummaryTests(TestCase):
+
+    def setUp(self):
+        self.user = sample_user()
+        self.recipe = models.Recipe.objects.create(
+            user=self.user, name='Curry', time_minutes=30, price=10
+        )
+        self.vegan = models.Tag.objects.create(user=self.user, name='Vegan')
+        self.quick = models.Tag.objects.create(user=self.user, name='Rapido')
+        self.tofu = models.Ingredient.objects.create(
+            user=self.user, name='Tofu'
+        )
+
+    def assertSummary(self, ingredient_count, tag_names):
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.ingredient_count, ingredient_count)
+        self.assertEqual(self.recipe.tag_count, len(tag_names))
+        self.assertEqual(self.recipe.tag_names, tag_names)
+
+    def test_summary_follows_add_and_remove(self):
+        self.recipe.tags.add(self.vegan, self.quick)
+        self.recipe.ingredients.add(self.tofu)
+        self.assertSummary(1, ['Rapido', 'Vegan'])
+
+        self.recipe.tags.remove(self.quick)
+        self.recipe.ingredients.clear()
+        self.assertSummary(0, ['Vegan'])
+
+    def test_summary_follows_reverse_changes(self):
+        self.vegan.recipe_set.add(self.recipe)
+        self.assertSummary(0, ['Vegan'])
+
+        self.vegan.recipe_set.clear()
+        self.assertSummary(0, [])
+
+    def test_summary_follows_tag_rename_and_delete(self):
+        self.recipe.tags.add(self.vegan, self.quick)
+
+        self.vegan.name = 'Vegetal'
+        self.vegan.save()
+        self.assertSummary(0, ['Rapido', 'Vegetal'])
+
+        self.quick.delete()
+        self.assertSummary(0, ['Vegetal'])
+
+    def test_refresh_summaries_fixes_stale_rows(self):
+        self.recipe.tags.add(self.vegan)
+        models.Recipe.objects.filter(pk=self.recipe.pk).update(
+            tag_count=0, tag_names=[]
+        )
+
+        self.assertEqual(models.Recipe.objects.refresh_summaries(), 1)
+        self.assertSummary(0, ['Vegan'])
+
+
+class RecipeStatsTests(TestCase):
+
+    def setUp(self):
+        self.user = sample_user()
+        self.tofu = models.Ingredient.objects.create(
+            user=self.user, name='Tofu'
+        )
+        self.rice = models.Ingredient.objects.create(
+            user=self.user, name='Arroz'
+        )
+        self.vegan = models.Tag.objects.create(user=self.user, name='Vegan')
+
+    def recipe(self, time_minutes, price, **params):
+        return models.Recipe.objects.create(
+            user=self.user, name='Curry', time_minutes=time_minutes,
+            price=price, **params
+        )
+
+    def assertStatsCurrent(self):
+        """The incrementally kept rollup matches one rebuilt from scratch."""
+        stats = models.RecipeStats.objects.get(user=self.user)
+        models.RecipeStats.objects.refresh([self.user.pk])
+        rebuilt = models.RecipeStats.objects.get(user=self.user)
+        fields = ('recipe_count', 'total_time_minutes', 'total_price',
+                  'price_histogram')
+        for field in fields:
+            self.assertEqual(
+                getattr(stats, field), getattr(rebuilt, field), field
+            )
+        return rebuilt
+
+    def test_built_in_one_pass(self):
+        self.recipe(10, 4)
+        self.recipe(20, 5)
+        self.recipe(30, 150)
+        other_user = get_user_model().objects.create_user(
+            'other@site.com',
+            '1234'
+        )
+        user_ids = [self.user.pk, other_user.pk]
+
+        with self.settings(RECIPE_STATS_PRICE_BUCKETS=('5', '100')):
+            # insert missing, lock, aggregate, update and the savepoint
+            with self.assertNumQueries(4 + 2):
+                models.RecipeStats.objects.refresh(user_ids)
+
+        stats = models.RecipeStats.objects.get(user=self.user)
+        self.assertEqual(stats.recipe_count, 3)
+        self.assertEqual(stats.total_time_minutes, 60)
+        self.assertEqual(stats.total_price, 159)
+        self.assertEqual(stats.price_buckets, ['5', '100'])
+        self.assertEqual(stats.price_histogram, [1, 1, 1])
+        other_stats = models.RecipeStats.objects.get(user=other_user)
+        self.assertEqual(other_stats.recipe_count, 0)
+
+    def test_kept_current_on_writes(self):
+        models.RecipeStats.objects.get_current(self.user.pk)
+
+        recipe = self.recipe(10, 4.5)
+        self.recipe(20, 12)
+        self.assertEqual(self.assertStatsCurrent().recipe_count, 2)
+
+        recipe = models.Recipe.objects.get(pk=recipe.pk)
+        recipe.price = 60
+        recipe.save()
+        self.assertEqual(self.assertStatsCurrent().total_price, 72)
+
+        recipe.delete()
+        self.assertEqual(self.assertStatsCurrent().recipe_count, 1)
+
+    def test_stale_copies_do_not_drift(self):
+        models.RecipeStats.objects.get_current(self.user.pk)
+        recipe = self.recipe(10, 4)
+        first = models.Recipe.objects.get(pk=recipe.pk)
+        second = models.Recipe.objects.get(pk=recipe.pk)
+
+        # Both copies were loaded with price 4; each save uncounts what
+        # is stored at the time instead.
+        first.price = 10
+        first.save()
+        second.price = 20
+        second.save()
+        self.assertEqual(self.assertStatsCurrent().total_price, 20)
+
+        first.delete()
+        self.assertEqual(self.assertStatsCurrent().recipe_count, 0)
+        second.delete()
+        self.assertEqual(self.assertStatsCurrent().total_price, 0)
+
+    def test_kept_current_on_bulk_writes(self):
+        models.RecipeStats.objects.get_current(self.user.pk)
+        recipes = models.Recipe.objects.bulk_create([
+            models.Recipe(
+                user=self.user, name='Curry', time_minutes=10, price=3
+            ),
+            models.Recipe(
+                user=self.user, name='Sopa', time_minutes=5, price=8
+            ),
+        ])
+        self.assertStatsCurrent()
+
+        recipes = list(models.Recipe.objects.filter(user=self.user))
+        for recipe in recipes:
+            recipe.time_minutes += 5
+        models.Recipe.objects.bulk_update(recipes, ['time_minutes'])
+        self.assertEqual(self.assertStatsCurrent().total_time_minutes, 25)
+
+    def test_rebuilt_when_buckets_change(self):
+        self.recipe(10, 4)
+        models.RecipeStats.objects.get_current(self.user.pk)
+
+        with self.settings(RECIPE_STATS_PRICE_BUCKETS=('3',)):
+            stats = models.RecipeStats.objects.get_current(self.user.pk)
+
+        self.assertEqual(stats.price_histogram, [0, 1])
+
+    def test_recipe_counts_follow_links(self):
+        curry = self.recipe(10, 4)
+        soup = self.recipe(10, 4)
+
+        curry.ingredients.add(self.tofu, self.rice)
+        self.tofu.recipe_set.add(soup)
+        soup.tags.add(self.vegan)
+        ingredients = models.Ingredient.objects.order_by('name')
+        self.assertEqual(
+            [ingredient.recipe_count for ingredient in ingredients], [1, 2]
+        )
+
+        curry.ingredients.remove(self.rice)
+        self.vegan.recipe_set.clear()
+        self.rice.refresh_from_db()
+        self.vegan.refresh_from_db()
+        self.assertEqual(
+            (self.rice.recipe_count, self.vegan.recipe_count), (0, 0)
+        )
+
+        soup.delete()
+        self.tofu.refresh_from_db()
+        self.assertEqual(self.tofu.recipe_count, 1)
+
+    def test_refresh_recipe_counts_fixes_stale_rows(self):
+        self.recipe(10, 4).ingredients.add(self.tofu)
+        models.Ingredient.objects.update(recipe_count=7)
+
+        self.assertEqual(models.Ingredient.objects.refresh_recipe_counts(), 2)
+        self.tofu.refresh_from_db()
+        self.assertEqual(self.tofu.recipe_count, 1)
+
+
+class RecipeTotalsTests(TestCase):
+
+    def setUp(self):
+        self.user = sample_user()
+        self.tofu = models.Ingredient.objects.create(
+            user=self.user, name='Tofu', unit='g', unit_cost='0.02',
+            calories='1.44', protein='0.15'
+        )
+        self.rice = models.Ingredient.objects.create(
+            user=self.user, name='Arroz', unit='g', unit_cost='0.005',
+            calories='3.6'
+        )
+        self.curry = models.Recipe.objects.create(
+            user=self.user, name='Curry', time_minutes=30, price=5
+        )
+
+    def assertTotals(self, recipe, cost, calories):
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.total_cost, Decimal(cost))
+        self.assertEqual(recipe.total_calories, Decimal(calories))
+
+    def test_totals_follow_quantities(self):
+        models.Recipe.objects.bulk_set_relations('ingredients', {
+            self.curry.pk: {
+                self.tofu.pk: {'quantity': 200},
+                self.rice.pk: {'quantity': 150},
+            },
+        })
+        self.assertTotals(self.curry, '4.75', '828.00')
+
+        models.Recipe.objects.bulk_set_relations('ingredients', {
+            self.curry.pk: {self.tofu.pk: {'quantity': 100}, self.rice.pk: {}},
+        })
+        self.assertTotals(self.curry, '2.75', '684.00')
+        row = models.RecipeIngredient.objects.get(
+            recipe=self.curry, ingredient=self.rice
+        )
+        self.assertEqual(row.quantity, 150)
+
+    def test_ingredient_change_refreshes_its_recipes_only(self):
+        other = models.Recipe.objects.create(
+            user=self.user, name='Arroz blanco', time_minutes=20, price=2
+        )
+        models.Recipe.objects.bulk_set_relations('ingredients', {
+            self.curry.pk: {self.tofu.pk: {'quantity': 200}},
+            other.pk: {self.rice.pk: {'quantity': 100}},
+        })
+
+        self.tofu.unit_cost = Decimal('0.03')
+        refresh_summaries = models.RecipeQuerySet.refresh_summaries
+        with patch.object(models.RecipeQuerySet, 'refresh_summaries',
+                          autospec=True,
+                          side_effect=refresh_summaries) as refresh:
+            self.tofu.save()
+        refresh.assert_called_once()
+        self.assertEqual(refresh.call_args[0][1], [self.curry.pk])
+        self.assertTotals(self.curry, '6.00', '288.00')
+        self.assertTotals(other, '0.50', '360.00')
+
+        # Renames leave the totals alone.
+        self.tofu.name = 'Tofu firme'
+        with patch.object(models.RecipeQuerySet,
+                          'refresh_summaries') as refresh:
+            self.tofu.save()
+        refresh.assert_not_called()
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'search_vector triggers are PostgreSQL only')
+class RecipeSearchVectorTests(TestCase):
+
+    def setUp(self):
+        self.user = sample_user()
+        self.recipe = models.Recipe.objects.create(
+            user=self.user, name='Curry', time_minutes=30, price=10
+        )
+
+    def search(self, text):
+        return list(models.Recipe.objects.search(text))
+
+    def test_vector_follows_relations(self):
+        tag = models.Tag.objects.create(user=self.user, name='Vegano')
+        tofu = models.Ingredient.objects.create(user=self.user, name='Tofu')
+        self.recipe.tags.add(tag)
+        self.recipe.ingredients.add(tofu)
+
+        self.assertEqual(self.search('curry tofu vegano'), [self.recipe])
+
+        tofu.name = 'Seitan'
+        tofu.save()
+        self.assertEqual(self.search('tofu'), [])
+        self.assertEqual(self.search('seitan'), [self.recipe])
+
+        self.recipe.tags.clear()
+        self.assertEqual(self.search('vegano'), [])
+
+    def test_vector_follows_rename(self):
+        self.recipe.name = 'Pad thai'
+        self.recipe.save()
+
+        self.assertEqual(self.search('curry'), [])
+        self.assertEqual(self.search('thai'), [self.recipe])
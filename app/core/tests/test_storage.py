@@ -0,0 +1,83 @@
+import os
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from core.models import Recipe
+from core.storage import ContentAddressedStorage, release_image
+
+
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.storage = ContentAddressedStorage(location=self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def save(self, name, content=b'photo'):
+        return self.storage.save(name, ContentFile(content))
+
+    def test_same_content_stored_once(self):
+        name1 = self.save('uploads/recipe/one.png')
+        name2 = self.save('uploads/recipe/two.PNG')
+
+        self.assertEqual(name1, name2)
+        self.assertRegex(
+            name1, r'^uploads/recipe/([0-9a-f]{2})/\1[0-9a-f]{62}\.png$'
+        )
+        self.assertEqual(
+            os.listdir(os.path.dirname(self.storage.path(name1))),
+            [os.path.basename(name1)]
+        )
+
+    def test_different_content_stored_apart(self):
+        name1 = self.save('uploads/recipe/one.png')
+        name2 = self.save('uploads/recipe/one.png', b'other')
+
+        self.assertNotEqual(name1, name2)
+
+    def test_precomputed_digest_used(self):
+        content = ContentFile(b'photo')
+        content.sha256 = 'ab' * 32
+
+        name = self.storage.save('uploads/recipe/one.png', content)
+
+        self.assertEqual(name, f"uploads/recipe/ab/{'ab' * 32}.png")
+
+    def test_derived_names_kept(self):
+        original = self.save('uploads/recipe/one.png')
+        variant = original.replace('.png', '_thumb.jpg')
+
+        self.assertEqual(self.save(variant, b'thumb'), variant)
+        self.assertEqual(self.save(variant, b'thumb'), variant)
+
+    def test_release_image_when_unreferenced(self):
+        user = get_user_model().objects.create_user('test@site.com', '1234')
+        name = self.save('uploads/recipe/one.png')
+        variant = self.save(name.replace('.png', '.webp'), b'webp')
+        recipe = Recipe.objects.create(
+            user=user, name='Pizza', time_minutes=20, price=10, image=name
+        )
+
+        self.assertFalse(release_image(name, [variant], storage=self.storage))
+        self.assertTrue(self.storage.exists(name))
+
+        Recipe.objects.filter(pk=recipe.pk).update(image='')
+        self.assertTrue(release_image(name, [variant], storage=self.storage))
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(self.storage.exists(variant))
+
+    def test_release_restores_file_referenced_meanwhile(self):
+        name = self.save('uploads/recipe/one.png')
+
+        self.assertFalse(self.storage.release(name, lambda: True))
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(os.listdir(os.path.dirname(self.storage.path(name))),
+                         [os.path.basename(name)])
+
+        self.assertTrue(self.storage.release(name, lambda: False))
+        self.assertFalse(self.storage.exists(name))
@@ -0,0 +1,93 @@
+from array import array
+
+from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
+from django.test import SimpleTestCase, TestCase
+
+from core import units
+from core.models import Ingredient, Recipe, RecipeIngredient
+
+
+class UnitConversionTests(SimpleTestCase):
+
+    def test_factors_follow_the_graph(self):
+        self.assertAlmostEqual(units.factor('lb', 'g'), 453.59237)
+        self.assertAlmostEqual(units.factor('Cups', 'tsp'), 48)
+        self.assertAlmostEqual(units.factor('fl. oz', 'ml'), 29.5735295625)
+        self.assertIsNone(units.factor('g', 'ml'))
+        self.assertIsNone(units.factor('pinch', 'g'))
+
+    def test_convert_to_system(self):
+        quantities, names = units.convert(
+            array('d', [200, 1500, 3, 0.5, 2]),
+            ['g', 'Grams', 'tsp', 'cup', 'eggs'],
+            array('d', [1, 1, 2, 1, 3]),
+            'imperial',
+        )
+
+        self.assertEqual(names, ['oz', 'lb', 'tbsp', 'cup', 'eggs'])
+        self.assertEqual(
+            [units.format_quantity(quantity) for quantity in quantities],
+            ['7.055', '3.307', '2', '0.5', '6'],
+        )
+
+        quantities, names = units.convert(
+            array('d', [8, 3]), ['fl oz', 'dozen'], system='metric'
+        )
+
+        self.assertEqual(names, ['ml', 'pc'])
+        self.assertEqual(
+            [units.format_quantity(quantity) for quantity in quantities],
+            ['236.588', '36']
+        )
+
+
+class ScaleRecipesTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@site.com',
+            '1234'
+        )
+        self.flour = Ingredient.objects.create(
+            user=self.user, name='Harina', unit='g'
+        )
+        self.milk = Ingredient.objects.create(
+            user=self.user, name='Leche', unit='cup'
+        )
+
+    def formatted(self, rows):
+        return [
+            (ingredient, units.format_quantity(quantity), unit)
+            for ingredient, quantity, unit in rows
+        ]
+
+    def test_scale_recipes_together(self):
+        crepes = Recipe.objects.create(
+            user=self.user, name='Crepes', time_minutes=20, price=3, servings=4
+        )
+        bread = Recipe.objects.create(
+            user=self.user, name='Pan', time_minutes=90, price=2, servings=2
+        )
+        Recipe.objects.bulk_set_relations('ingredients', {
+            crepes.id: {
+                self.flour.id: {'quantity': 250},
+                self.milk.id: {'quantity': 2},
+            },
+            bread.id: {self.flour.id: {'quantity': 500}},
+        })
+        rows = RecipeIngredient.objects.select_related('ingredient')
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        recipes = recipes.prefetch_related(Prefetch(
+            'recipe_ingredients', queryset=rows.order_by('id'),
+        ))
+
+        scaled = units.scale_recipes(recipes, servings=8, system='metric')
+
+        self.assertEqual(
+            self.formatted(scaled[crepes.id]),
+            [(self.flour, '500', 'g'), (self.milk, '946.353', 'ml')],
+        )
+        self.assertEqual(
+            self.formatted(scaled[bread.id]), [(self.flour, '2', 'kg')]
+        )
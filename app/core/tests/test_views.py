@@ -0,0 +1,126 @@
+import os
+import tempfile
+
+from django.http import Http404
+from django.test import SimpleTestCase, RequestFactory, override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+
+from core.views import serve_media, parse_range
+
+DIGEST = 'ab' * 32
+CONTENT = b'0123456789' * 10
+
+
+class ServeMediaTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = f'ab/{DIGEST}.png'
+        os.makedirs(os.path.join(self.directory.name, 'ab'))
+        with open(os.path.join(self.directory.name, self.path), 'wb') as image:
+            image.write(CONTENT)
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get(self, **headers):
+        request = self.factory.get(f'/media/{self.path}', **headers)
+        response = serve_media(
+            request, self.path, document_root=self.directory.name
+        )
+        self.addCleanup(response.close)
+        return response
+
+    def test_media_url_routed(self):
+        self.assertEqual(
+            reverse('media', args=[self.path]), f'/media/{self.path}'
+        )
+
+    def test_serve_full_file(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['ETag'], f'"{DIGEST}"')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    def test_missing_file(self):
+        request = self.factory.get('/media/missing.png')
+
+        with self.assertRaises(Http404):
+            serve_media(
+                request, 'missing.png', document_root=self.directory.name
+            )
+
+    def test_if_none_match(self):
+        response = self.get(HTTP_IF_NONE_MATCH=f'"{DIGEST}"')
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], f'"{DIGEST}"')
+
+    def test_if_modified_since(self):
+        response = self.get(HTTP_IF_MODIFIED_SINCE=http_date())
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_range(self):
+        response = self.get(HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[10:20])
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(
+            response['Content-Range'], f'bytes 10-19/{len(CONTENT)}'
+        )
+
+    def test_suffix_range(self):
+        response = self.get(HTTP_RANGE='bytes=-5')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[-5:])
+
+    def test_unsatisfiable_range(self):
+        response = self.get(HTTP_RANGE='bytes=500-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(CONTENT)}')
+
+    def test_if_range_mismatch_serves_full_file(self):
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"other"')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+
+    @override_settings(
+        MEDIA_OFFLOAD='x-accel-redirect', MEDIA_OFFLOAD_PREFIX='/protected/'
+    )
+    def test_x_accel_redirect(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['X-Accel-Redirect'], f'/protected/{self.path}'
+        )
+        self.assertEqual(response.content, b'')
+
+    @override_settings(MEDIA_OFFLOAD='x-sendfile')
+    def test_x_sendfile(self):
+        response = self.get()
+
+        self.assertEqual(
+            response['X-Sendfile'],
+            os.path.join(self.directory.name, self.path)
+        )
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-', 10), (0, 9))
+        self.assertEqual(parse_range('bytes=5-100', 10), (5, 9))
+        self.assertEqual(parse_range('bytes=-100', 10), (0, 9))
+        self.assertIsNone(parse_range('bytes=0-1,3-4', 10))
+        self.assertIsNone(parse_range('items=0-1', 10))
+        self.assertFalse(parse_range('bytes=5-2', 10))
@@ -0,0 +1,200 @@
+"""Scaling of ingredient quantities and conversion between units.
+
+Units are nodes of a graph whose edges are exact conversion factors
+(``CONVERSIONS``). The graph is walked once, when the module is imported,
+so every known unit ends up with its factor to the base unit of its
+dimension (grams, millilitres or pieces): converting between any two
+units is then a table lookup and one multiplication. Quantities can't be
+converted across dimensions, there are no densities.
+
+``convert`` works over compact arrays: the quantities of any number of
+recipes are flattened into one ``array('d')``, with the index of their
+unit and the scale of their recipe alongside, and converted in a single
+pass. ``scale_recipes`` builds those arrays from prefetched recipes, so a
+whole meal plan is scaled with one call.
+"""
+import re
+from array import array
+from collections import deque
+
+# (unit, other unit, how many ``other`` make one ``unit``)
+CONVERSIONS = (
+    ('kg', 'g', 1000),
+    ('g', 'mg', 1000),
+    ('lb', 'oz', 16),
+    ('oz', 'g', 28.349523125),
+    ('l', 'ml', 1000),
+    ('cup', 'tbsp', 16),
+    ('fl oz', 'tbsp', 2),
+    ('tbsp', 'tsp', 3),
+    ('tsp', 'ml', 4.92892159375),
+    ('dozen', 'pc', 12),
+)
+BASE_UNITS = ('g', 'ml', 'pc')
+
+ALIASES = {
+    'gram': 'g', 'grams': 'g', 'gr': 'g',
+    'kilogram': 'kg', 'kilograms': 'kg', 'kilo': 'kg', 'kilos': 'kg',
+    'milligram': 'mg', 'milligrams': 'mg',
+    'pound': 'lb', 'pounds': 'lb', 'lbs': 'lb',
+    'ounce': 'oz', 'ounces': 'oz',
+    'liter': 'l', 'liters': 'l', 'litre': 'l', 'litres': 'l',
+    'milliliter': 'ml', 'milliliters': 'ml',
+    'millilitre': 'ml', 'millilitres': 'ml',
+    'cups': 'cup',
+    'tablespoon': 'tbsp', 'tablespoons': 'tbsp', 'tbs': 'tbsp',
+    'teaspoon': 'tsp', 'teaspoons': 'tsp',
+    'floz': 'fl oz', 'fluid ounce': 'fl oz', 'fluid ounces': 'fl oz',
+    'piece': 'pc', 'pieces': 'pc', 'pcs': 'pc', 'unit': 'pc', 'units': 'pc',
+}
+
+# system -> base unit -> units quantities are shown in, largest first, with
+# the least amount of each before the next one down is used.
+DISPLAY_UNITS = {
+    'metric': {
+        'g': (('kg', 1), ('g', 1), ('mg', 0)),
+        'ml': (('l', 1), ('ml', 0)),
+        'pc': (('pc', 0),),
+    },
+    'imperial': {
+        'g': (('lb', 1), ('oz', 0)),
+        'ml': (('cup', 0.25), ('tbsp', 1), ('tsp', 0)),
+        'pc': (('pc', 0),),
+    },
+}
+SYSTEMS = tuple(DISPLAY_UNITS)
+
+_SPACES = re.compile(r'\s+')
+
+
+def canonical_unit(unit):
+    """Name of ``unit`` in ``CONVERSIONS``, or cleaned up if unknown."""
+    unit = _SPACES.sub(' ', unit.strip().lower().replace('.', ''))
+    return ALIASES.get(unit, unit)
+
+
+def _to_base(conversions, base_units):
+    """Walk the unit graph from each base unit.
+
+    Returns ``{unit: (base unit, factor to it)}``.
+    """
+    edges = {}
+    for unit, other, factor in conversions:
+        edges.setdefault(unit, []).append((other, factor))
+        edges.setdefault(other, []).append((unit, 1 / factor))
+    factors = {}
+    for base in base_units:
+        factors[base] = (base, 1.0)
+        queue = deque([base])
+        while queue:
+            unit = queue.popleft()
+            to_base = factors[unit][1]
+            for other, factor in edges.get(unit, ()):
+                if other not in factors:
+                    # One ``unit`` is ``factor`` ``other``.
+                    factors[other] = (base, to_base / factor)
+                    queue.append(other)
+    return factors
+
+
+_FACTORS = _to_base(CONVERSIONS, BASE_UNITS)
+UNITS = tuple(sorted(_FACTORS))
+UNIT_INDEX = {unit: index for index, unit in enumerate(UNITS)}
+# By unit index: factor to the base unit and index of the base unit.
+TO_BASE = array('d', (_FACTORS[unit][1] for unit in UNITS))
+BASE_INDEX = array('i', (UNIT_INDEX[_FACTORS[unit][0]] for unit in UNITS))
+# system -> base unit index -> ((unit, least amount in base units, factor
+# from base units), ...), largest unit first.
+DISPLAY = {
+    system: {
+        UNIT_INDEX[base]: tuple(
+            (
+                unit,
+                least * TO_BASE[UNIT_INDEX[unit]],
+                1 / TO_BASE[UNIT_INDEX[unit]],
+            )
+            for unit, least in units
+        )
+        for base, units in by_base.items()
+    }
+    for system, by_base in DISPLAY_UNITS.items()
+}
+
+
+def factor(unit, other):
+    """How many ``other`` make one ``unit``.
+
+    None across dimensions or for unknown units.
+    """
+    index = UNIT_INDEX.get(canonical_unit(unit))
+    other_index = UNIT_INDEX.get(canonical_unit(other))
+    if index is None or other_index is None:
+        return None
+    if BASE_INDEX[index] != BASE_INDEX[other_index]:
+        return None
+    return TO_BASE[index] / TO_BASE[other_index]
+
+
+def convert(quantities, units, scales=None, system=None):
+    """Scale ``quantities`` given in ``units`` and show them in ``system``.
+
+    ``quantities`` and ``scales`` are arrays of floats, ``units`` the unit
+    name of each quantity. With a ``system`` known units are converted to
+    the largest of its units the quantity fills, otherwise they're kept.
+    Returns ``(quantities, units)``, the quantities an ``array('d')``.
+    """
+    indexes = {}
+    unit_indexes = array('i', (
+        indexes[unit] if unit in indexes
+        else indexes.setdefault(unit, UNIT_INDEX.get(canonical_unit(unit), -1))
+        for unit in units
+    ))
+    if scales is None:
+        scales = array('d', (1.0,)) * len(quantities)
+    display = DISPLAY[system] if system else None
+
+    converted, converted_units = array('d'), []
+    rows = zip(quantities, scales, unit_indexes, units)
+    for quantity, scale, index, unit in rows:
+        quantity *= scale
+        if display is not None and index >= 0:
+            amount = quantity * TO_BASE[index]
+            for unit, least, from_base in display[BASE_INDEX[index]]:
+                if amount >= least:
+                    break
+            quantity = amount * from_base
+        converted.append(quantity)
+        converted_units.append(unit)
+    return converted, converted_units
+
+
+def format_quantity(quantity):
+    """``quantity`` rounded to three decimals, without trailing zeros."""
+    return f'{quantity:.3f}'.rstrip('0').rstrip('.')
+
+
+def scale_recipes(recipes, servings=None, system=None):
+    """Return ``{recipe id: [(ingredient, quantity, unit), ...]}``.
+
+    ``recipes`` must have their ``recipe_ingredients`` prefetched with the
+    ingredient. Quantities are scaled from each recipe's servings to
+    ``servings`` (kept if None) and shown in ``system``; every recipe is
+    converted in the same ``convert`` call.
+    """
+    owners, ingredients, units = [], [], []
+    quantities, scales = array('d'), array('d')
+    for recipe in recipes:
+        scale = servings / recipe.servings if servings else 1.0
+        for row in recipe.recipe_ingredients.all():
+            owners.append(recipe.pk)
+            ingredients.append(row.ingredient)
+            units.append(row.ingredient.unit)
+            quantities.append(float(row.quantity))
+            scales.append(scale)
+
+    quantities, units = convert(quantities, units, scales, system)
+    scaled = {recipe.pk: [] for recipe in recipes}
+    rows = zip(owners, ingredients, quantities, units)
+    for owner, ingredient, quantity, unit in rows:
+        scaled[owner].append((ingredient, quantity, unit))
+    return scaled
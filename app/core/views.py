@@ -1,3 +1,162 @@
-from django.shortcuts import render
+import mimetypes
+import os
+import posixpath
+import re
 
-# Create your views here.
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import (
+    http_date, parse_etags, parse_http_date_safe, quote_etag
+)
+
+# Media names never change content (see core.storage), cache them for a year.
+MEDIA_MAX_AGE = 365 * 24 * 60 * 60
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}')
+
+
+class RangeFile:
+    """File-like view of ``length`` bytes of ``file`` starting at ``start``.
+
+    It keeps ``fileno()`` so WSGI servers whose ``wsgi.file_wrapper`` uses
+    ``os.sendfile`` (gunicorn, uWSGI) still send the range zero-copy, from
+    the current offset and for ``Content-Length`` bytes.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Return ``(start, end)`` of a single byte range, inclusive.
+
+    ``None`` means the header should be ignored (absent, malformed or
+    multiple ranges) and ``False`` that the range can't be satisfied.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        # Suffix range: the last ``end`` bytes.
+        length = int(end)
+        if not length:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _etag(path, stat):
+    # Content-addressed files carry their digest, which is stable across
+    # servers; anything else falls back to mtime and size.
+    name = os.path.basename(path)
+    if DIGEST_RE.match(name):
+        return quote_etag(os.path.splitext(name)[0])
+    return quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/"')):
+        return etag in parse_etags(if_range)
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def serve_media(request, path, document_root=None):
+    """Serve a media file with conditional requests and byte ranges.
+
+    ``MEDIA_OFFLOAD`` hands the transfer to a front proxy instead:
+    ``'x-accel-redirect'`` (nginx, under ``MEDIA_OFFLOAD_PREFIX``) or
+    ``'x-sendfile'`` (Apache, lighttpd).
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    fullpath = safe_join(document_root, path)
+    if not os.path.isfile(fullpath):
+        raise Http404
+    stat = os.stat(fullpath)
+    etag = _etag(path, stat)
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(fullpath)
+        content_type = content_type or 'application/octet-stream'
+        offload = getattr(settings, 'MEDIA_OFFLOAD', None)
+
+        if offload == 'x-accel-redirect':
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = settings.MEDIA_OFFLOAD_PREFIX + path
+        elif offload == 'x-sendfile':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = fullpath
+        else:
+            use_range = _if_range_matches(request, etag, last_modified)
+            response = _file_response(
+                request, fullpath, stat.st_size, content_type, use_range
+            )
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    if response.status_code in (200, 206, 304):
+        patch_cache_control(
+            response, public=True, max_age=MEDIA_MAX_AGE, immutable=True
+        )
+    return response
+
+
+def _file_response(request, fullpath, size, content_type, use_range):
+    byte_range = None
+    if use_range:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        # Served through wsgi.file_wrapper, i.e. sendfile() where available.
+        return FileResponse(open(fullpath, 'rb'), content_type=content_type)
+
+    start, end = byte_range
+    length = end - start + 1
+    response = FileResponse(
+        RangeFile(open(fullpath, 'rb'), start, length),
+        status=206,
+        content_type=content_type
+    )
+    response['Content-Length'] = length
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
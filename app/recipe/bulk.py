@@ -0,0 +1,204 @@
+"""Bulk create, update and delete of recipes.
+
+Every item is validated on its own and reported back by index, but the
+database work is batched: one query per related model resolves all the
+tag and ingredient ids of the request, and the writes for the valid items
+run as bulk statements inside a single transaction.
+"""
+from django.db import transaction
+from rest_framework import status
+
+from core.models import Tag, Ingredient, Recipe, RecipeIngredient
+from recipe.serializers import RecipeBulkSerializer
+
+MAX_ITEMS = 1000
+
+RELATED_MODELS = {
+    'ingredients': Ingredient,
+    'tags': Tag,
+}
+
+
+def _error(index, errors, status_code=status.HTTP_400_BAD_REQUEST):
+    return {'index': index, 'status': status_code, 'errors': errors}
+
+
+def _owned_ids(user, items):
+    """Ids of each related model, among those submitted, owned by ``user``."""
+    owned = {}
+    for field_name, model in RELATED_MODELS.items():
+        submitted = {
+            related_id
+            for data in items
+            for related_id in data.get(field_name, ())
+        }
+        owned[field_name] = set(
+            model.objects.filter(user=user, id__in=submitted)
+            .values_list('id', flat=True)
+        ) if submitted else set()
+    return owned
+
+
+def _validate(items, partial=False):
+    """Split ``items`` into validated data and per-item errors."""
+    valid, results = {}, {}
+    for index, item in enumerate(items):
+        serializer = RecipeBulkSerializer(data=item, partial=partial)
+        if serializer.is_valid():
+            valid[index] = serializer.validated_data
+        else:
+            results[index] = _error(index, serializer.errors)
+    return valid, results
+
+
+def _check_related(valid, results, owned):
+    for index, data in list(valid.items()):
+        errors = {}
+        for field_name in RELATED_MODELS:
+            # Preserve the submitted order while dropping repeated ids.
+            ids = list(dict.fromkeys(data.get(field_name, ())))
+            missing = [
+                related_id for related_id in ids
+                if related_id not in owned[field_name]
+            ]
+            if missing:
+                errors[field_name] = [
+                    f'Invalid pk {related_id} - object does not exist.'
+                    for related_id in missing
+                ]
+            elif field_name in data:
+                data[field_name] = ids
+        quantities = data.pop('quantities', None)
+        if quantities and 'ingredients' not in errors:
+            ingredient_ids = data.get('ingredients', ())
+            unknown = [
+                pk for pk in quantities if pk not in set(ingredient_ids)
+            ]
+            if unknown:
+                errors['quantities'] = [
+                    f'Ingredient {pk} is not in the recipe.' for pk in unknown
+                ]
+            else:
+                data['ingredients'] = {
+                    pk: {'quantity': quantities[pk]}
+                    if pk in quantities else {}
+                    for pk in ingredient_ids
+                }
+        if errors:
+            results[index] = _error(index, errors)
+            del valid[index]
+
+
+def _keep_ingredients(valid, ids):
+    """Give the items updating quantities alone their current ingredients."""
+    keep = [
+        index for index, data in valid.items()
+        if data.get('quantities') and 'ingredients' not in data
+    ]
+    if not keep:
+        return
+    current = {ids[index]: [] for index in keep}
+    rows = (
+        RecipeIngredient.objects.filter(recipe_id__in=current)
+        .order_by('id').values_list('recipe_id', 'ingredient_id')
+    )
+    for recipe_id, ingredient_id in rows:
+        current[recipe_id].append(ingredient_id)
+    for index in keep:
+        valid[index]['ingredients'] = current[ids[index]]
+
+
+def bulk_create(user, items):
+    valid, results = _validate(items)
+    _check_related(valid, results, _owned_ids(user, valid.values()))
+
+    indexes = sorted(valid)
+    recipes = [
+        Recipe(user=user, **{
+            key: value for key, value in valid[index].items()
+            if key not in RELATED_MODELS
+        })
+        for index in indexes
+    ]
+    with transaction.atomic():
+        Recipe.objects.bulk_create_with_relations(recipes, {
+            field_name: [valid[index].get(field_name, ()) for index in indexes]
+            for field_name in RELATED_MODELS
+        })
+
+    for index, recipe in zip(indexes, recipes):
+        results[index] = {
+            'index': index, 'status': status.HTTP_201_CREATED, 'id': recipe.id
+        }
+    return [results[index] for index in range(len(items))]
+
+
+def bulk_update(user, items):
+    ids = {}
+    results = {}
+    for index, item in enumerate(items):
+        try:
+            ids[index] = int(item['id'])
+        except (KeyError, TypeError, ValueError):
+            results[index] = _error(
+                index, {'id': ['A valid integer is required.']}
+            )
+
+    recipes = Recipe.objects.filter(user=user, id__in=ids.values()).in_bulk()
+    for index, recipe_id in ids.items():
+        if recipe_id not in recipes:
+            results[index] = _error(
+                index, {'id': ['Not found.']}, status.HTTP_404_NOT_FOUND
+            )
+
+    valid, errors = _validate(items, partial=True)
+    for index, error in errors.items():
+        results.setdefault(index, error)
+    valid = {
+        index: data for index, data in valid.items() if index not in results
+    }
+    _keep_ingredients(valid, ids)
+    _check_related(valid, results, _owned_ids(user, valid.values()))
+
+    changed_fields = set()
+    relations = {field_name: {} for field_name in RELATED_MODELS}
+    updated = []
+    for index, data in sorted(valid.items()):
+        recipe = recipes[ids[index]]
+        for key, value in data.items():
+            if key in RELATED_MODELS:
+                relations[key][recipe.id] = value
+            else:
+                setattr(recipe, key, value)
+                changed_fields.add(key)
+        updated.append(recipe)
+        results[index] = {
+            'index': index, 'status': status.HTTP_200_OK, 'id': recipe.id
+        }
+
+    with transaction.atomic():
+        if changed_fields:
+            Recipe.objects.bulk_update(updated, sorted(changed_fields))
+        for field_name, related in relations.items():
+            if related:
+                Recipe.objects.bulk_set_relations(
+                    field_name, related, user_ids=[user.pk]
+                )
+
+    return [results[index] for index in range(len(items))]
+
+
+def bulk_delete(user, ids):
+    existing = set(
+        Recipe.objects.filter(user=user, id__in=ids)
+        .values_list('id', flat=True)
+    )
+    with transaction.atomic():
+        Recipe.objects.filter(id__in=existing).delete()
+
+    return [
+        {'index': index, 'status': status.HTTP_204_NO_CONTENT, 'id': recipe_id}
+        if recipe_id in existing else
+        _error(index, {'id': ['Not found.']}, status.HTTP_404_NOT_FOUND)
+        for index, recipe_id in enumerate(ids)
+    ]
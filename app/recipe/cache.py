@@ -0,0 +1,68 @@
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.cache import LRUCache, get_cache, get_user_version
+
+# (model label, user id, lowercased text, limit)
+#     -> (user data version, results)
+typeahead_cache = LRUCache(
+    maxsize=getattr(settings, 'TYPEAHEAD_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'TYPEAHEAD_CACHE_TTL', 300),
+)
+
+
+class CachedListMixin:
+    """Serve list from a per-user, versioned response cache.
+
+    Cache keys and ETags embed the user's data version, so any write that
+    bumps it (see ``core.cache.bump_user_version``) makes every cached
+    response of that user unreachable at once. A matching ``If-None-Match``
+    is answered with 304 before the database or serializers are touched.
+    """
+
+    def _response_key(self, request):
+        accept = request.META.get('HTTP_ACCEPT', '')
+        version = get_user_version(request.user.pk)
+        raw = f'{version}:{accept}:{request.build_absolute_uri()}'
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        key = self._response_key(request)
+        etag = f'"{key}"'
+
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            cache = get_cache()
+            cache_key = f'response:{request.user.pk}:{key}'
+            data = cache.get(cache_key)
+            if data is None:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(cache_key, response.data, getattr(
+                    settings, 'RESPONSE_CACHE_TIMEOUT', 300
+                ))
+            else:
+                response = Response(data)
+
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+
+class CachedListRetrieveMixin(CachedListMixin):
+    """Serve both list and retrieve from the per-user response cache."""
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
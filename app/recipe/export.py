@@ -0,0 +1,77 @@
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework import renderers
+
+from core.models import Recipe
+
+CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = ('id', 'name', 'time_minutes', 'price', 'link', 'servings')
+
+
+class NDJSONRenderer(renderers.BaseRenderer):
+    """Lets clients ask for ``application/x-ndjson``, errors are one line."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        line = json.dumps(data, cls=DjangoJSONEncoder) + '\n'
+        return line.encode(self.charset)
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+def _related_rows(field_name, recipe_ids, *columns):
+    """Return ``{recipe id: [(name, *columns), ...]}``.
+
+    Related rows come in the order they were added. ``columns`` are extra
+    values of the through rows, read in the same query.
+    """
+    field = Recipe._meta.get_field(field_name)
+    through = field.remote_field.through
+    rows = through.objects.filter(recipe_id__in=recipe_ids).values_list(
+        'recipe_id', f'{field.m2m_reverse_field_name()}__name', *columns
+    ).order_by('id')
+
+    related = {}
+    for recipe_id, *values in rows:
+        related.setdefault(recipe_id, []).append(values)
+    return related
+
+
+def iter_ndjson(queryset, chunk_size=CHUNK_SIZE):
+    """Yield one JSON line per recipe with its ingredient and tag names.
+
+    Ingredient quantities and units are keyed by ingredient name, blank
+    units are left out. Recipes are read
+    through a server-side cursor and the related rows are loaded with one
+    query per relation for every ``chunk_size`` recipes, so memory use
+    doesn't depend on the size of the library.
+    """
+    rows = queryset.values(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    for batch in _batches(rows, chunk_size):
+        recipe_ids = [row['id'] for row in batch]
+        ingredients = _related_rows(
+            'ingredients', recipe_ids, 'quantity', 'ingredient__unit'
+        )
+        tags = _related_rows('tags', recipe_ids)
+        for row in batch:
+            own_ingredients = ingredients.get(row['id'], [])
+            row['ingredients'] = [name for name, _, _ in own_ingredients]
+            row['quantities'] = {
+                name: quantity for name, quantity, _ in own_ingredients
+            }
+            row['units'] = {
+                name: unit for name, _, unit in own_ingredients if unit
+            }
+            row['tags'] = [name for name, in tags.get(row['id'], [])]
+            yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
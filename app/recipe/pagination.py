@@ -0,0 +1,19 @@
+from rest_framework import pagination
+
+
+class CursorPagination(pagination.CursorPagination):
+    """Keyset pagination that follows the ordering declared on the view.
+
+    Each page is fetched with a ``WHERE <ordering field> < <cursor>`` filter
+    over the ``(user, <ordering field>)`` index, so deep pages cost the same
+    as the first one.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'ordering', self.ordering)
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
@@ -1,5 +1,12 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files.storage import default_storage
 from rest_framework import serializers
-from core.models import Tag, Ingredient, Recipe
+from rest_framework.relations import MANY_RELATION_KWARGS
+from core.models import INGREDIENT_TOTALS, Tag, Ingredient, Recipe, RecipeStats
+from core.names import normalize_name
+from core.units import SYSTEMS, format_quantity, scale_recipes
 
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
@@ -11,35 +18,361 @@ class TagSerializer(serializers.ModelSerializer):
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ingredient
-        fields = ('id','name',)
+        fields = ('id', 'name', 'unit', *INGREDIENT_TOTALS.values(),)
         read_only_fields = ('id',)
+        extra_kwargs = {
+            column: {'min_value': 0} for column in INGREDIENT_TOTALS.values()
+        }
+
+    def validate_name(self, name):
+        if self.instance is not None and Ingredient.objects.filter(
+                user_id=self.instance.user_id,
+                normalized_name=normalize_name(name),
+        ).exclude(pk=self.instance.pk).exists():
+            raise serializers.ValidationError(
+                'An ingredient with this name already exists.'
+            )
+        return name
+
+
+class OwnedManyRelatedField(serializers.ManyRelatedField):
+    """Resolves every submitted id with one ``id__in`` query.
+
+    Ids that don't exist or that another user owns are reported together,
+    in the order they were submitted.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        child = self.child_relation
+        ids = []
+        for item in data:
+            try:
+                if isinstance(item, bool):
+                    raise TypeError
+                ids.append(int(item))
+            except (TypeError, ValueError):
+                child.fail('incorrect_type', data_type=type(item).__name__)
+        # Preserve the submitted order while dropping repeated ids.
+        ids = list(dict.fromkeys(ids))
+
+        rows = child.get_queryset().in_bulk(ids)
+        missing = [pk for pk in ids if pk not in rows]
+        if missing:
+            raise serializers.ValidationError([
+                child.error_messages['does_not_exist'].format(pk_value=pk)
+                for pk in missing
+            ])
+        return [rows[pk] for pk in ids]
+
+
+class OwnedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary keys of rows owned by the requesting user.
+
+    With ``many=True`` the ids are resolved together by
+    ``OwnedManyRelatedField`` instead of one query per id.
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return OwnedManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.context['request'].user)
+
+
+class QuantitiesField(serializers.DictField):
+    """Ingredient id -> quantity, in the ingredient's unit."""
+    child = serializers.DecimalField(
+        max_digits=10, decimal_places=3, min_value=0
+    )
+
+    def to_internal_value(self, data):
+        quantities = super().to_internal_value(data)
+        try:
+            return {
+                int(ingredient_id): quantity
+                for ingredient_id, quantity in quantities.items()
+            }
+        except ValueError:
+            raise serializers.ValidationError(
+                'Expected ingredient ids as keys.'
+            )
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """URLs of the resized/WebP variants that are ready so far."""
+
+    def to_representation(self, variants):
+        request = self.context.get('request')
+        urls = {}
+        for variant, name in variants.items():
+            url = default_storage.url(name)
+            urls[variant] = request.build_absolute_uri(url) if request else url
+        return urls
 
 
 class RecipeSerializer(serializers.ModelSerializer):
 
-    ingredients = serializers.PrimaryKeyRelatedField(
+    ingredients = OwnedPrimaryKeyRelatedField(
         many=True,
         queryset=Ingredient.objects.all()
     )
 
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = OwnedPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
 
+    # Ingredients left out keep their quantity, or get 1 when added.
+    quantities = QuantitiesField(required=False, write_only=True)
+
     class Meta:
         model = Recipe
-        fields = ('id','name','ingredients','tags','time_minutes','price','link',)
-        read_only_fields = ('id',)
+        fields = ('id', 'name', 'ingredients', 'tags', 'time_minutes', 'price',
+                  'link', 'servings', 'quantities',
+                  *(f'total_{name}' for name in INGREDIENT_TOTALS),)
+        read_only_fields = (
+            'id', *(f'total_{name}' for name in INGREDIENT_TOTALS),
+        )
+
+    # Many to many fields written by _set_relations rather than ``.set()``.
+    relation_fields = ('ingredients', 'tags')
+
+    def validate(self, attrs):
+        quantities = attrs.get('quantities')
+        if quantities:
+            if 'ingredients' not in attrs and self.instance is not None:
+                # Quantities alone keep the ingredients as they are.
+                attrs['ingredients'] = list(self.instance.ingredients.all())
+            ingredient_ids = {row.pk for row in attrs.get('ingredients', ())}
+            unknown = [pk for pk in quantities if pk not in ingredient_ids]
+            if unknown:
+                raise serializers.ValidationError({'quantities': [
+                    f'Ingredient {pk} is not in the recipe.' for pk in unknown
+                ]})
+        return attrs
+
+    def _set_relations(self, recipe, relations, quantities=None):
+        """Write only the links that changed, see ``bulk_set_relations``."""
+        quantities = quantities or {}
+        for field_name, rows in relations.items():
+            if field_name == 'ingredients':
+                related_ids = {
+                    row.pk: {'quantity': quantities[row.pk]}
+                    if row.pk in quantities else {}
+                    for row in rows
+                }
+            else:
+                related_ids = [row.pk for row in rows]
+            Recipe.objects.bulk_set_relations(
+                field_name, {recipe.pk: related_ids},
+                user_ids=[recipe.user_id],
+            )
+        if 'ingredients' in relations:
+            # Totals were recomputed in the database.
+            recipe.refresh_from_db(
+                fields=[f'total_{name}' for name in INGREDIENT_TOTALS]
+            )
+
+    def _pop_relations(self, validated_data):
+        return {
+            field_name: validated_data.pop(field_name)
+            for field_name in self.relation_fields
+            if field_name in validated_data
+        }
+
+    def create(self, validated_data):
+        relations = self._pop_relations(validated_data)
+        quantities = validated_data.pop('quantities', None)
+        recipe = super().create(validated_data)
+        self._set_relations(recipe, relations, quantities)
+        return recipe
+
+    def update(self, instance, validated_data):
+        relations = self._pop_relations(validated_data)
+        quantities = validated_data.pop('quantities', None)
+        recipe = super().update(instance, validated_data)
+        self._set_relations(recipe, relations, quantities)
+        return recipe
 
 
 class RecipeDetailSerializer(RecipeSerializer):
-    ingredients = IngredientSerializer(many=True, read_only=True)
+    # Both read from the prefetched through rows and their ingredients.
+    ingredients = serializers.SerializerMethodField()
     tags = TagSerializer(many=True, read_only=True)
+    quantities = serializers.SerializerMethodField()
+    # Variants show up once the worker has rendered them.
+    image = serializers.ImageField(read_only=True)
+    image_variants = ImageVariantsField()
+
+    def get_ingredients(self, recipe):
+        return IngredientSerializer(
+            [row.ingredient for row in recipe.recipe_ingredients.all()],
+            many=True
+        ).data
+
+    amounts = serializers.SerializerMethodField()
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + (
+            'amounts', 'image', 'image_variants',
+        )
+
+    def get_quantities(self, recipe):
+        return {
+            str(row.ingredient_id): str(row.quantity)
+            for row in recipe.recipe_ingredients.all()
+        }
+
+    def get_amounts(self, recipe):
+        """Quantities for the context's ``servings`` and unit ``system``."""
+        scaled = scale_recipes(
+            [recipe], self.context.get('servings'), self.context.get('system')
+        )
+        return [
+            {'ingredient': ingredient.id,
+             'quantity': format_quantity(quantity),
+             'unit': unit}
+            for ingredient, quantity, unit in scaled[recipe.pk]
+        ]
+
+
+class RecipeSummarySerializer(serializers.ModelSerializer):
+    """Recipe card fields, read from the denormalized columns only."""
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'name', 'time_minutes', 'price',
+                  'ingredient_count', 'tag_count', 'tag_names',)
+        read_only_fields = fields
+
+
+class RecipeSimilarSerializer(RecipeSummarySerializer):
+    """Recipe card with its similarity to the requested recipe."""
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSummarySerializer.Meta):
+        fields = RecipeSummarySerializer.Meta.fields + ('similarity',)
+        read_only_fields = fields
+
+
+class RecipePantrySerializer(RecipeSummarySerializer):
+    """Recipe card with how many of its ingredients a pantry covers."""
+    covered = serializers.IntegerField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeSummarySerializer.Meta):
+        fields = RecipeSummarySerializer.Meta.fields + ('covered', 'missing',)
+        read_only_fields = fields
+
+
+class RecipeStatsSerializer(serializers.ModelSerializer):
+    """Aggregates of a user's recipes, read from their RecipeStats rollup."""
+    average_time_minutes = serializers.SerializerMethodField()
+    average_price = serializers.SerializerMethodField()
+    price_histogram = serializers.SerializerMethodField()
+    top_tags = serializers.SerializerMethodField()
+    top_ingredients = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RecipeStats
+        fields = ('recipe_count', 'average_time_minutes', 'average_price',
+                  'price_histogram', 'top_tags', 'top_ingredients',)
+        read_only_fields = fields
+
+    def get_average_time_minutes(self, stats):
+        if not stats.recipe_count:
+            return None
+        return round(stats.total_time_minutes / stats.recipe_count, 1)
+
+    def get_average_price(self, stats):
+        if not stats.recipe_count:
+            return None
+        average = stats.total_price / stats.recipe_count
+        return str(average.quantize(Decimal('0.01')))
+
+    def get_price_histogram(self, stats):
+        bounds = [None] + stats.price_buckets + [None]
+        return [
+            {'min': low, 'max': high, 'count': count}
+            for low, high, count
+            in zip(bounds, bounds[1:], stats.price_histogram)
+        ]
+
+    def _top(self, model, stats):
+        # Served by the (user, -recipe_count) index.
+        return list(
+            model.objects.filter(user_id=stats.user_id, recipe_count__gt=0)
+            .order_by('-recipe_count', 'name')
+            .values('id', 'name', 'recipe_count')[:settings.RECIPE_STATS_TOP]
+        )
+
+    def get_top_tags(self, stats):
+        return self._top(Tag, stats)
+
+    def get_top_ingredients(self, stats):
+        return self._top(Ingredient, stats)
+
+
+class MealPlanSerializer(serializers.Serializer):
+    """What a meal plan must fit, see ``core.mealplan.plan_meals``."""
+    days = serializers.IntegerField(min_value=1, max_value=14, default=7)
+    meals_per_day = serializers.IntegerField(
+        min_value=1, max_value=5, default=1
+    )
+    max_time_per_day = serializers.IntegerField(min_value=1, required=False)
+    budget = serializers.DecimalField(
+        max_digits=9, decimal_places=2, min_value=0, required=False
+    )
+    tags = OwnedPrimaryKeyRelatedField(
+        many=True, queryset=Tag.objects.all(), required=False
+    )
+    exclude_tags = OwnedPrimaryKeyRelatedField(
+        many=True, queryset=Tag.objects.all(), required=False
+    )
+    # Servings and unit system of the shopping list.
+    servings = serializers.IntegerField(min_value=1, required=False)
+    units = serializers.ChoiceField(choices=SYSTEMS, required=False)
+
 
 class RecipeImageSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'image')
+        fields = ('id', 'image', 'image_variants')
         read_only_fields = ('id',)
         
+
+class RecipeBulkSerializer(serializers.ModelSerializer):
+    """Validates one item of a bulk request without touching the database.
+
+    Related ids are only checked to be integers here; they are resolved for
+    the whole batch at once by ``recipe.bulk``.
+    """
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False
+    )
+
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False
+    )
+
+    quantities = QuantitiesField(required=False)
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'name', 'ingredients', 'tags', 'time_minutes', 'price',
+                  'link', 'servings', 'quantities',)
+        read_only_fields = ('id',)
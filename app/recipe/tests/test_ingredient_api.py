@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.test import TestCase
 
 # Create your tests here.
@@ -7,10 +8,12 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Ingredient
+from core.models import Ingredient, Recipe
+from recipe.cache import typeahead_cache
 from recipe.serializers import IngredientSerializer
 
 INGREDIENTS_URL = reverse('recipe:ingredient-list')
+TYPEAHEAD_URL = reverse('recipe:ingredient-typeahead')
 
 class PublicTagsAPI(TestCase):
 
@@ -31,6 +34,8 @@ class TestPrivateTagAPI(TestCase):
 
         self.client = APIClient()
         self.client.force_authenticate(self.user)
+        cache.clear()
+        typeahead_cache.clear()
 
     def test_retrieve_tags(self):
         Ingredient.objects.create(user=self.user, name="Curcuma")
@@ -42,7 +47,7 @@ class TestPrivateTagAPI(TestCase):
         serializer = IngredientSerializer(ingredients, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredient_limit_to_user(self):
         anotherUser = get_user_model().objects.create_user("anotherUser@asdmcl.com", "password2")
@@ -52,8 +57,8 @@ class TestPrivateTagAPI(TestCase):
         res = self.client.get(INGREDIENTS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], ingredient.name)
 
     def test_create_ingredient_successfull(self):
         payload = {'name':'Test ingredient'}
@@ -71,3 +76,98 @@ class TestPrivateTagAPI(TestCase):
         res = self.client.post(INGREDIENTS_URL,payload)
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_update_ingredient_refreshes_recipe_totals(self):
+        tofu = Ingredient.objects.create(
+            user=self.user, name='Tofu', unit='g', unit_cost='0.02'
+        )
+        recipe = Recipe.objects.create(
+            user=self.user, name='Curry', time_minutes=30, price=5
+        )
+        Recipe.objects.bulk_set_relations('ingredients', {
+            recipe.id: {tofu.id: {'quantity': 200}},
+        })
+
+        res = self.client.patch(
+            reverse('recipe:ingredient-detail', args=[tofu.id]),
+            {'unit_cost': '0.03'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        self.assertEqual(str(recipe.total_cost), '6.00')
+
+    def test_update_ingredient_name_clash(self):
+        Ingredient.objects.create(user=self.user, name='Sal')
+        pepper = Ingredient.objects.create(user=self.user, name='Pimienta')
+
+        res = self.client.patch(
+            reverse('recipe:ingredient-detail', args=[pepper.id]),
+            {'name': ' SAL '}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_ingredients_assigned_to_recipes(self):
+        ingredient1 = Ingredient.objects.create(user=self.user, name='Harina')
+        ingredient2 = Ingredient.objects.create(user=self.user, name='Azafran')
+        recipe = Recipe.objects.create(
+            user=self.user, name='Pan', time_minutes=60, price=2
+        )
+        recipe.ingredients.add(ingredient1)
+
+        res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = [ingredient['name'] for ingredient in res.data['results']]
+        self.assertIn(ingredient1.name, names)
+        self.assertNotIn(ingredient2.name, names)
+
+    def test_assigned_only_invalid(self):
+        res = self.client.get(INGREDIENTS_URL, {'assigned_only': 'yes'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_typeahead(self):
+        for name in ('Tomate', 'Tomillo', 'Papa', 'tofu'):
+            Ingredient.objects.create(user=self.user, name=name)
+        other_user = get_user_model().objects.create_user(
+            'other@site.com',
+            '1234'
+        )
+        Ingredient.objects.create(user=other_user, name='Tomate cherry')
+
+        res = self.client.get(TYPEAHEAD_URL, {'q': 'TO'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [ingredient['name'] for ingredient in res.data],
+            ['tofu', 'Tomate', 'Tomillo']
+        )
+
+    def test_typeahead_limit(self):
+        for i in range(5):
+            Ingredient.objects.create(user=self.user, name=f'Sal {i}')
+
+        res = self.client.get(TYPEAHEAD_URL, {'q': 'sal', 'limit': 2})
+        self.assertEqual(len(res.data), 2)
+
+        res = self.client.get(TYPEAHEAD_URL, {'q': 'sal', 'limit': 1000})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_typeahead_cached_until_write(self):
+        Ingredient.objects.create(user=self.user, name='Arroz')
+        self.client.get(TYPEAHEAD_URL, {'q': 'arr'})
+
+        with self.assertNumQueries(0):
+            res = self.client.get(TYPEAHEAD_URL, {'q': 'ARR'})
+        self.assertEqual(
+            [ingredient['name'] for ingredient in res.data], ['Arroz']
+        )
+
+        self.client.post(INGREDIENTS_URL, {'name': 'Arroz integral'})
+        res = self.client.get(TYPEAHEAD_URL, {'q': 'arr'})
+        self.assertEqual(
+            [ingredient['name'] for ingredient in res.data],
+            ['Arroz', 'Arroz integral']
+        )
@@ -3,7 +3,11 @@ import os
 
 from PIL import Image
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 # Create your tests here.
 from django.contrib.auth import get_user_model
@@ -12,10 +16,16 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core.images import generate_variants
 from core.models import Recipe, Tag, Ingredient
+from core.signals import recipe_relations_changed
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 RECIPES_URL = reverse('recipe:recipe-list')
+SUMMARY_URL = reverse('recipe:recipe-summary')
+PANTRY_URL = reverse('recipe:recipe-pantry')
+STATS_URL = reverse('recipe:recipe-stats')
+MEAL_PLAN_URL = reverse('recipe:recipe-meal-plan')
 
 def image_upload_url(recipe_id):
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
@@ -23,6 +33,10 @@ def image_upload_url(recipe_id):
 def detail_url(recipe_id):
     return reverse('recipe:recipe-detail', args=[recipe_id])
 
+
+def similar_url(recipe_id):
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
 class PublicRecipeAPI(TestCase):
 
     def setUp(self):
@@ -69,6 +83,7 @@ class TestPrivateRecipeAPI(TestCase):
 
         self.client = APIClient()
         self.client.force_authenticate(self.user)
+        cache.clear()
 
     def test_retrieve_recipes(self):
         recipe1 = self.sample_recipe()
@@ -80,7 +95,40 @@ class TestPrivateRecipeAPI(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+    def test_list_recipes_query_budget(self):
+        for i in range(5):
+            recipe = self.sample_recipe(name=f'Recipe {i}')
+            recipe.tags.add(self.sample_tag(name=f'Tag {i}'))
+            ingredient = self.sample_ingredient(name=f'Ingredient {i}')
+            recipe.ingredients.add(ingredient)
+
+        # recipes + ingredients prefetch + tags prefetch
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 5)
+
+    def test_recipes_paginated_by_cursor(self):
+        recipes = [self.sample_recipe(name=f'Recipe {i}') for i in range(5)]
+
+        res = self.client.get(RECIPES_URL, {'page_size': 3})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [recipe.id for recipe in reversed(recipes[2:])]
+        )
+
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [recipe.id for recipe in reversed(recipes[:2])]
+        )
+        self.assertIsNone(res.data['next'])
 
     def test_recipe_limit_to_user(self):
         anotherUser = get_user_model().objects.create_user("anotherUser@asdmcl.com", "password2")
@@ -90,16 +138,16 @@ class TestPrivateRecipeAPI(TestCase):
         res = self.client.get(RECIPES_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data),  1)
-        self.assertEqual(res.data[0]['name'], recipe2.name)
+        self.assertEqual(len(res.data['results']),  1)
+        self.assertEqual(res.data['results'][0]['name'], recipe2.name)
 
     def test_view_recipe_detail(self):
         recipe = self.sample_recipe()
-        recipe.tags.add(self.sample_tag())
-        recipe.tags.add(self.sample_tag())
-        recipe.ingredients.add(self.sample_ingredient())
-        recipe.ingredients.add(self.sample_ingredient())
-        recipe.ingredients.add(self.sample_ingredient())
+        recipe.tags.add(self.sample_tag(name='Tag 1'))
+        recipe.tags.add(self.sample_tag(name='Tag 2'))
+        recipe.ingredients.add(self.sample_ingredient(name='Ingredient 1'))
+        recipe.ingredients.add(self.sample_ingredient(name='Ingredient 2'))
+        recipe.ingredients.add(self.sample_ingredient(name='Ingredient 3'))
 
         res = self.client.get(detail_url(recipe.id))
 
@@ -107,6 +155,20 @@ class TestPrivateRecipeAPI(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
+    def test_view_recipe_detail_query_budget(self):
+        recipe = self.sample_recipe()
+        for i in range(3):
+            recipe.tags.add(self.sample_tag(name=f'Tag {i}'))
+            ingredient = self.sample_ingredient(name=f'Ingredient {i}')
+            recipe.ingredients.add(ingredient)
+
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['ingredients']), 3)
+        self.assertEqual(len(res.data['tags']), 3)
+
 
 
     def test_create_recipe_successfull(self):
@@ -132,8 +194,8 @@ class TestPrivateRecipeAPI(TestCase):
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
     def test_create_recipe_with_tags(self):
-        tag1 = self.sample_tag()
-        tag2 = self.sample_tag()
+        tag1 = self.sample_tag(name='Tag 1')
+        tag2 = self.sample_tag(name='Tag 2')
         payload = {
             'name':'Asado al asador',
             'time_minutes':39,
@@ -151,9 +213,9 @@ class TestPrivateRecipeAPI(TestCase):
         self.assertIn(tag2, tags)
 
     def test_create_recipe_with_ingredients(self):
-        ingredient1 = self.sample_ingredient()
-        ingredient2 = self.sample_ingredient()
-        ingredient3 = self.sample_ingredient()
+        ingredient1 = self.sample_ingredient(name='Ingredient 1')
+        ingredient2 = self.sample_ingredient(name='Ingredient 2')
+        ingredient3 = self.sample_ingredient(name='Ingredient 3')
         payload = {
             'name':'Asado al asador',
             'time_minutes':39,
@@ -171,6 +233,534 @@ class TestPrivateRecipeAPI(TestCase):
         self.assertIn(ingredient2, ingredients)
         self.assertNotIn(ingredient3, ingredients)
 
+    def test_create_recipe_resolves_ingredients_together(self):
+        ingredients = [
+            self.sample_ingredient(name=f'Ingredient {i}') for i in range(60)
+        ]
+        payload = {
+            'name': 'Guiso',
+            'time_minutes': 60,
+            'price': 20.00,
+            'ingredients': [ingredient.id for ingredient in ingredients],
+        }
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            Recipe.objects.get(id=res.data['id']).ingredients.count(), 60
+        )
+        lookups = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT')
+            and 'FROM "core_ingredient" WHERE' in query['sql']
+        ]
+        self.assertEqual(len(lookups), 1)
+
+    def test_create_recipe_rejects_foreign_and_missing_ids(self):
+        other_user = get_user_model().objects.create_user(
+            'other@site.com',
+            '1234'
+        )
+        own = self.sample_tag(name='Propio')
+        foreign = self.sample_tag(user=other_user, name='Ajeno')
+        payload = {
+            'name': 'Asado',
+            'time_minutes': 39,
+            'price': 300.00,
+            'tags': [foreign.id, own.id, 9999],
+        }
+
+        res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['tags'], [
+            f'Invalid pk "{foreign.id}" - object does not exist.',
+            'Invalid pk "9999" - object does not exist.',
+        ])
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def through_writes(self, queries):
+        return [
+            query['sql'].split()[0] for query in queries.captured_queries
+            if query['sql'].startswith(('INSERT', 'DELETE'))
+            and '"core_recipe_tags"' in query['sql'].split('(')[0]
+        ]
+
+    def test_partial_update_writes_tag_diff(self):
+        recipe = self.sample_recipe()
+        kept = self.sample_tag(name='Kept')
+        dropped = self.sample_tag(name='Dropped')
+        new1 = self.sample_tag(name='New 1')
+        new2 = self.sample_tag(name='New 2')
+        recipe.tags.add(kept, dropped)
+        changes = []
+
+        def record(sender, related_ids=None, **kwargs):
+            changes.append(related_ids)
+        recipe_relations_changed.connect(record, sender=Recipe)
+        self.addCleanup(
+            recipe_relations_changed.disconnect, record, sender=Recipe
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(detail_url(recipe.id), {
+                'tags': [kept.id, new1.id, new2.id]
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.through_writes(queries), ['DELETE', 'INSERT'])
+        # One change for the whole diff, the kept tag isn't part of it.
+        self.assertEqual(changes, [{'tags': {dropped.id, new1.id, new2.id}}])
+        self.assertEqual(
+            set(recipe.tags.values_list('id', flat=True)),
+            {kept.id, new1.id, new2.id}
+        )
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.tag_names, ['Kept', 'New 1', 'New 2'])
+
+    def test_full_update_unchanged_tags_not_written(self):
+        recipe = self.sample_recipe()
+        tag = self.sample_tag(name='Vegan')
+        recipe.tags.add(tag)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.put(detail_url(recipe.id), {
+                'name': 'Guiso',
+                'time_minutes': 30,
+                'price': 5.00,
+                'tags': [tag.id],
+                'ingredients': [],
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.through_writes(queries), [])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Guiso')
+        self.assertEqual(list(recipe.tags.all()), [tag])
+
+    def test_filter_recipes_by_tags(self):
+        recipe1 = self.sample_recipe(name='Empanadas')
+        recipe2 = self.sample_recipe(name='Locro')
+        recipe3 = self.sample_recipe(name='Flan')
+        tag1 = self.sample_tag(name='Salado')
+        tag2 = self.sample_tag(name='Invierno')
+        recipe1.tags.add(tag1)
+        recipe2.tags.add(tag1, tag2)
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(ids, [recipe2.id, recipe1.id])
+        self.assertNotIn(recipe3.id, ids)
+
+    def test_filter_recipes_by_all_ingredients(self):
+        recipe1 = self.sample_recipe(name='Tortilla')
+        recipe2 = self.sample_recipe(name='Pure')
+        egg = self.sample_ingredient(name='Huevo')
+        potato = self.sample_ingredient(name='Papa')
+        recipe1.ingredients.add(egg, potato)
+        recipe2.ingredients.add(potato)
+
+        params = {'ingredients': f'{egg.id},{potato.id}'}
+        res = self.client.get(RECIPES_URL, params)
+        self.assertEqual(len(res.data['results']), 2)
+
+        params['ingredients_match'] = 'all'
+        res = self.client.get(RECIPES_URL, params)
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [recipe1.id]
+        )
+
+    def test_filter_recipes_by_time_and_price(self):
+        quick = self.sample_recipe(time_minutes=10, price=5)
+        self.sample_recipe(time_minutes=10, price=50)
+        self.sample_recipe(time_minutes=90, price=5)
+
+        res = self.client.get(
+            RECIPES_URL,
+            {'max_time': 15, 'min_price': '1.00', 'max_price': '10.00'}
+        )
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [quick.id]
+        )
+
+    def test_filter_recipes_non_finite_price(self):
+        self.sample_recipe(price=5)
+
+        for value in ('NaN', 'Infinity', '-Infinity', 'abc'):
+            res = self.client.get(RECIPES_URL, {'max_price': value})
+            self.assertEqual(
+                res.status_code, status.HTTP_400_BAD_REQUEST, value
+            )
+
+    def test_create_recipe_with_quantities(self):
+        tofu = self.sample_ingredient(
+            name='Tofu', unit='g', unit_cost='0.02', calories='1.44'
+        )
+        rice = self.sample_ingredient(
+            name='Arroz', unit='g', unit_cost='0.005', calories='3.6'
+        )
+
+        res = self.client.post(RECIPES_URL, {
+            'name': 'Curry',
+            'ingredients': [tofu.id, rice.id],
+            'tags': [],
+            'time_minutes': 30,
+            'price': '5.00',
+            'quantities': {str(tofu.id): '200', str(rice.id): '150'},
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['total_cost'], '4.75')
+        self.assertEqual(res.data['total_calories'], '828.00')
+
+        res = self.client.patch(detail_url(res.data['id']), {
+            'quantities': {str(tofu.id): '100'},
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['total_cost'], '2.75')
+        self.assertEqual(
+            sorted(res.data['ingredients']), sorted([tofu.id, rice.id])
+        )
+        res = self.client.get(detail_url(res.data['id']))
+        self.assertEqual(
+            res.data['quantities'],
+            {str(tofu.id): '100.000', str(rice.id): '150.000'}
+        )
+
+    def test_quantities_must_be_recipe_ingredients(self):
+        tofu = self.sample_ingredient(name='Tofu')
+        recipe = self.sample_recipe()
+
+        res = self.client.patch(detail_url(recipe.id), {
+            'quantities': {str(tofu.id): '100'},
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('quantities', res.data)
+
+    def test_recipe_detail_scaled_and_converted(self):
+        flour = self.sample_ingredient(name='Harina', unit='g')
+        recipe = self.sample_recipe(servings=4)
+        Recipe.objects.bulk_set_relations('ingredients', {
+            recipe.id: {flour.id: {'quantity': 250}},
+        })
+
+        res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(res.data['servings'], 4)
+        self.assertEqual(res.data['amounts'], [
+            {'ingredient': flour.id, 'quantity': '250', 'unit': 'g'},
+        ])
+
+        res = self.client.get(
+            detail_url(recipe.id), {'servings': 10, 'units': 'imperial'}
+        )
+        self.assertEqual(res.data['amounts'], [
+            {'ingredient': flour.id, 'quantity': '1.378', 'unit': 'lb'},
+        ])
+
+        res = self.client.get(detail_url(recipe.id), {'servings': 0})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.get(detail_url(recipe.id), {'units': 'nautical'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_order_and_filter_recipes_by_totals(self):
+        tofu = self.sample_ingredient(
+            name='Tofu', unit_cost='0.02', calories='1.44'
+        )
+        cheap = self.sample_recipe(name='Cheap')
+        dear = self.sample_recipe(name='Dear')
+        empty = self.sample_recipe(name='Empty')
+        Recipe.objects.bulk_set_relations('ingredients', {
+            cheap.id: {tofu.id: {'quantity': 100}},
+            dear.id: {tofu.id: {'quantity': 500}},
+        })
+
+        res = self.client.get(RECIPES_URL, {'ordering': '-total_cost'})
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [dear.id, cheap.id, empty.id]
+        )
+
+        res = self.client.get(
+            RECIPES_URL, {'ordering': 'total_cost', 'page_size': 2}
+        )
+        res = self.client.get(res.data['next'])
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']], [dear.id]
+        )
+
+        res = self.client.get(
+            RECIPES_URL, {'min_calories': '100', 'max_calories': '500'}
+        )
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']], [cheap.id]
+        )
+
+        res = self.client.get(RECIPES_URL, {'ordering': 'name'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_recipes_invalid_ids(self):
+        res = self.client.get(RECIPES_URL, {'tags': '1,abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tags', res.data)
+
+    def test_search_recipes(self):
+        curry = self.sample_recipe(name='Curry de garbanzos')
+        soup = self.sample_recipe(name='Sopa')
+        soup.ingredients.add(self.sample_ingredient(name='Garbanzos'))
+        salad = self.sample_recipe(name='Ensalada')
+        salad.tags.add(self.sample_tag(name='Garbanzos fritos'))
+        self.sample_recipe(name='Tortilla')
+
+        res = self.client.get(RECIPES_URL, {'search': 'garbanzos'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [recipe['id'] for recipe in res.data['results']]
+        # The recipe named after the word ranks first.
+        self.assertEqual(ids[0], curry.id)
+        self.assertCountEqual(ids, [curry.id, soup.id, salad.id])
+
+    def test_search_matches_every_word(self):
+        curry = self.sample_recipe(name='Curry')
+        curry.ingredients.add(self.sample_ingredient(name='Tofu'))
+        self.sample_recipe(name='Curry rojo')
+
+        res = self.client.get(SUMMARY_URL, {'search': 'curry tofu'})
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [curry.id]
+        )
+
+    def test_search_pagination(self):
+        recipes = [self.sample_recipe(name=f'Pan {i}') for i in range(5)]
+
+        res = self.client.get(RECIPES_URL, {'search': 'pan', 'page_size': 2})
+        ids = [recipe['id'] for recipe in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            ids += [recipe['id'] for recipe in res.data['results']]
+
+        self.assertEqual(ids, [recipe.id for recipe in reversed(recipes)])
+
+    def test_search_keeps_ordering_within_rank(self):
+        crumbs = self.sample_ingredient(name='Pan rallado', unit_cost='1')
+        soup = self.sample_recipe(name='Sopa')
+        cheap, dear, middle = [
+            self.sample_recipe(name=f'Pan {i}') for i in range(3)
+        ]
+        Recipe.objects.bulk_set_relations('ingredients', {
+            soup.id: {crumbs.id: {'quantity': 9}},
+            cheap.id: {crumbs.id: {'quantity': 1}},
+            dear.id: {crumbs.id: {'quantity': 3}},
+            middle.id: {crumbs.id: {'quantity': 2}},
+        })
+
+        res = self.client.get(RECIPES_URL, {
+            'search': 'pan', 'ordering': 'total_cost', 'page_size': 2,
+        })
+        ids = [recipe['id'] for recipe in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            ids += [recipe['id'] for recipe in res.data['results']]
+
+        # Recipes named after the word first, each group by cost.
+        self.assertEqual(ids, [cheap.id, middle.id, dear.id, soup.id])
+
+    def test_similar_recipes(self):
+        rice = self.sample_ingredient(name='Arroz')
+        tofu = self.sample_ingredient(name='Tofu')
+        milk = self.sample_ingredient(name='Leche')
+        recipe = self.sample_recipe(name='Curry')
+        recipe.ingredients.add(rice, tofu)
+        close = self.sample_recipe(name='Arroz con tofu')
+        close.ingredients.add(rice, tofu)
+        far = self.sample_recipe(name='Arroz con leche')
+        far.ingredients.add(rice, milk)
+        self.sample_recipe(name='Sin ingredientes')
+
+        res = self.client.get(similar_url(recipe.id), {'limit': 5})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data], [close.id, far.id])
+        self.assertEqual(res.data[0]['similarity'], 1.0)
+        self.assertAlmostEqual(res.data[1]['similarity'], 1 / 3, places=5)
+
+    def test_similar_recipes_invalid(self):
+        recipe = self.sample_recipe()
+        other_user = get_user_model().objects.create_user(
+            'other@site.com',
+            '1234'
+        )
+        other_recipe = self.sample_recipe(user=other_user)
+
+        res = self.client.get(similar_url(recipe.id), {'metric': 'euclidean'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(similar_url(other_recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_pantry_recipes(self):
+        rice = self.sample_ingredient(name='Arroz')
+        tofu = self.sample_ingredient(name='Tofu')
+        milk = self.sample_ingredient(name='Leche')
+        fried = self.sample_recipe(name='Arroz con tofu')
+        fried.ingredients.add(rice, tofu)
+        pudding = self.sample_recipe(name='Arroz con leche')
+        pudding.ingredients.add(rice, milk)
+        soup = self.sample_recipe(name='Sopa')
+        soup.ingredients.add(milk)
+
+        res = self.client.get(
+            PANTRY_URL, {'ingredients': f'{rice.id},{tofu.id}'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['id'], item['covered'], item['missing'])
+             for item in res.data],
+            [(fried.id, 2, 0), (pudding.id, 1, 1)]
+        )
+
+        res = self.client.get(PANTRY_URL, {
+            'ingredients': f'{rice.id},{tofu.id}', 'max_missing': 0
+        })
+        self.assertEqual([item['id'] for item in res.data], [fried.id])
+
+    def test_pantry_recipes_invalid(self):
+        res = self.client.get(PANTRY_URL)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(
+            PANTRY_URL, {'ingredients': '1', 'max_missing': -1}
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_recipe_stats(self):
+        rice = self.sample_ingredient(name='Arroz')
+        tofu = self.sample_ingredient(name='Tofu')
+        vegan = self.sample_tag(name='Vegan')
+        curry = self.sample_recipe(name='Curry', time_minutes=10, price='4.00')
+        curry.ingredients.add(rice, tofu)
+        curry.tags.add(vegan)
+        plain = self.sample_recipe(
+            name='Arroz', time_minutes=20, price='30.00'
+        )
+        plain.ingredients.add(rice)
+        other_user = get_user_model().objects.create_user(
+            'other@site.com',
+            '1234'
+        )
+        self.sample_recipe(user=other_user)
+
+        with self.settings(RECIPE_STATS_PRICE_BUCKETS=('5', '20')):
+            res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 2)
+        self.assertEqual(res.data['average_time_minutes'], 15.0)
+        self.assertEqual(res.data['average_price'], '17.00')
+        self.assertEqual(res.data['price_histogram'], [
+            {'min': None, 'max': '5', 'count': 1},
+            {'min': '5', 'max': '20', 'count': 0},
+            {'min': '20', 'max': None, 'count': 1},
+        ])
+        self.assertEqual(res.data['top_ingredients'], [
+            {'id': rice.id, 'name': 'Arroz', 'recipe_count': 2},
+            {'id': tofu.id, 'name': 'Tofu', 'recipe_count': 1},
+        ])
+        self.assertEqual(res.data['top_tags'], [
+            {'id': vegan.id, 'name': 'Vegan', 'recipe_count': 1},
+        ])
+
+        # Served from the rollup once built.
+        self.sample_recipe(name='Sopa', time_minutes=30, price='2.00')
+        with self.settings(RECIPE_STATS_PRICE_BUCKETS=('5', '20')):
+            with self.assertNumQueries(3):
+                res = self.client.get(STATS_URL)
+        self.assertEqual(res.data['recipe_count'], 3)
+        self.assertEqual(res.data['price_histogram'][0]['count'], 2)
+
+    def test_meal_plan(self):
+        rice = self.sample_ingredient(name='Arroz', unit='g')
+        vegan = self.sample_tag(name='Vegan')
+        curry = self.sample_recipe(name='Curry', time_minutes=30, price='6.00')
+        fried_rice = self.sample_recipe(
+            name='Arroz frito', time_minutes=20, price='4.00'
+        )
+        slow = self.sample_recipe(
+            name='Paella', time_minutes=120, price='9.00'
+        )
+        for recipe in (curry, fried_rice, slow):
+            recipe.tags.add(vegan)
+        Recipe.objects.bulk_set_relations('ingredients', {
+            curry.id: {rice.id: {'quantity': 300}},
+            fried_rice.id: {rice.id: {'quantity': 200}},
+            slow.id: {rice.id: {'quantity': 400}},
+        })
+
+        res = self.client.post(MEAL_PLAN_URL, {
+            'days': 3, 'max_time_per_day': 60, 'tags': [vegan.id],
+            'units': 'metric',
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        planned = [meals[0]['id'] for meals in res.data['days'] if meals[0]]
+        self.assertEqual(sorted(planned), sorted([curry.id, fried_rice.id]))
+        self.assertIn([None], res.data['days'])
+        self.assertEqual(res.data['total_time_minutes'], 50)
+        self.assertEqual(res.data['total_price'], '10.00')
+        self.assertEqual(res.data['shopping_list'], [
+            {'ingredient': rice.id, 'name': 'Arroz', 'quantity': '500',
+             'unit': 'g', 'recipes': 2},
+        ])
+
+    def test_meal_plan_invalid(self):
+        other = get_user_model().objects.create_user(
+            'other@site.com',
+            'password123'
+        )
+        foreign = Tag.objects.create(user=other, name='Vegan')
+
+        res = self.client.post(MEAL_PLAN_URL, {'days': 0}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.post(
+            MEAL_PLAN_URL, {'tags': [foreign.id]}, format='json'
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_recipe_summary(self):
+        recipe = self.sample_recipe(name='Curry', time_minutes=10)
+        recipe.tags.add(
+            self.sample_tag(name='Vegan'), self.sample_tag(name='Rapido')
+        )
+        recipe.ingredients.add(self.sample_ingredient())
+        self.sample_recipe(time_minutes=90)
+
+        # recipes only, the relations come from the summary columns
+        with self.assertNumQueries(1):
+            res = self.client.get(SUMMARY_URL, {'max_time': 15})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [{
+            'id': recipe.id,
+            'name': 'Curry',
+            'time_minutes': 10,
+            'price': '300.00',
+            'ingredient_count': 1,
+            'tag_count': 2,
+            'tag_names': ['Rapido', 'Vegan'],
+        }])
+
 class TestRecipeImageUploadAPI(TestCase):
     def sample_recipe(self, **params):
         defaults = {
@@ -190,6 +780,7 @@ class TestRecipeImageUploadAPI(TestCase):
             '1234'
         )
         self.client.force_authenticate(self.user)
+        cache.clear()
         self.recipe = self.sample_recipe()
 
     def tearDown(self):
@@ -198,17 +789,172 @@ class TestRecipeImageUploadAPI(TestCase):
     def test_upload_image_to_recipe(self):
         url = image_upload_url(self.recipe.id)
         with tempfile.NamedTemporaryFile(suffix=".png") as ntf:
-            img = Image.new('RGB',(10,10))
+            img = Image.new('RGB', (10, 10))
             img.save(ntf, format='PNG')
             ntf.seek(0)
-            res = self.client.post(url, {'image':ntf}, format='multipart')
+            res = self.client.post(url, {'image': ntf}, format='multipart')
 
         self.recipe.refresh_from_db()
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    @override_settings(IMAGE_PROCESSING_BACKEND='sync')
+    def test_upload_image_generates_variants(self):
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".png") as ntf:
+            img = Image.new('RGB', (1000, 500))
+            img.save(ntf, format='PNG')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('thumbnail', res.data['image_variants'])
+        self.assertIn('thumbnail', self.recipe.image_variants)
+        for name in self.recipe.image_variants.values():
+            self.assertTrue(default_storage.exists(name))
+            self.addCleanup(default_storage.delete, name)
+
+        thumbnail_name = self.recipe.image_variants['thumbnail']
+        with default_storage.open(thumbnail_name) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).size, (320, 160))
+
+    def test_upload_image_variants_pending(self):
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".png") as ntf:
+            img = Image.new('RGB', (10, 10))
+            img.save(ntf, format='PNG')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['image_variants'], {})
+
+    def test_variants_shown_on_detail_once_rendered(self):
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".png") as ntf:
+            img = Image.new('RGB', (10, 10))
+            img.save(ntf, format='PNG')
+            ntf.seek(0)
+            self.client.post(url, {'image': ntf}, format='multipart')
+        self.recipe.refresh_from_db()
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertTrue(res.data['image'].endswith(self.recipe.image.name))
+        self.assertEqual(res.data['image_variants'], {})
+
+        # What the worker does once the upload is committed.
+        variants = generate_variants(
+            self.recipe.id, self.recipe.image.name, self.user.pk
+        )
+        for name in variants.values():
+            self.addCleanup(default_storage.delete, name)
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(
+            res.data['image_variants']['thumbnail'],
+            'http://testserver' + default_storage.url(variants['thumbnail'])
+        )
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=50 * 50)
+    def test_upload_image_too_many_pixels(self):
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".png") as ntf:
+            img = Image.new('RGB', (100, 100))
+            img.save(ntf, format='PNG')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pixels', res.data['detail'])
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=64 * 1024)
+    def test_upload_image_too_many_bytes(self):
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".bmp") as ntf:
+            img = Image.new('RGB', (300, 300))
+            img.save(ntf, format='BMP')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('bytes', res.data['detail'])
+        self.assertFalse(self.recipe.image)
+
     def test_upload_image_bad_request(self):
         url = image_upload_url(self.recipe.id)
         res = self.client.post(url, {'image':'notImage'}, format='multipart')
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+# on_commit really runs here: render inline rather than leave worker threads
+# writing to the database and MEDIA_ROOT after the test.
+@override_settings(IMAGE_PROCESSING_BACKEND='sync')
+class TestRecipeImageRelease(TransactionTestCase):
+    """Images are released on commit, so no test transaction here."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@site.com',
+            '1234'
+        )
+        self.client.force_authenticate(self.user)
+        cache.clear()
+        self.recipe = self.sample_recipe()
+
+    sample_recipe = TestRecipeImageUploadAPI.sample_recipe
+
+    def upload(self, *recipes):
+        with tempfile.NamedTemporaryFile(suffix=".png") as ntf:
+            img = Image.new('RGB', (10, 10))
+            img.save(ntf, format='PNG')
+            for recipe in recipes:
+                ntf.seek(0)
+                self.client.post(
+                    image_upload_url(recipe.id), {'image': ntf},
+                    format='multipart'
+                )
+        for recipe in recipes:
+            recipe.refresh_from_db()
+
+    def test_upload_same_image_stored_once(self):
+        other = self.sample_recipe(name='Other')
+        self.upload(self.recipe, other)
+        self.assertEqual(self.recipe.image.name, other.image.name)
+
+        path = other.image.path
+        other.delete()
+        self.assertTrue(os.path.exists(path))
+        self.client.delete(detail_url(self.recipe.id))
+        self.assertFalse(os.path.exists(path))
+
+    def test_queryset_delete_releases_image(self):
+        other = self.sample_recipe(name='Other')
+        self.upload(self.recipe, other)
+        path = self.recipe.image.path
+        variants = list(self.recipe.image_variants.values())
+
+        Recipe.objects.filter(id__in=[self.recipe.id, other.id]).delete()
+
+        self.assertFalse(os.path.exists(path))
+        for name in variants:
+            self.assertFalse(default_storage.exists(name))
+
+    def test_image_kept_when_delete_rolls_back(self):
+        self.upload(self.recipe)
+        path = self.recipe.image.path
+
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                Recipe.objects.filter(id=self.recipe.id).delete()
+                raise DatabaseError('rolled back')
+
+        self.assertTrue(Recipe.objects.filter(id=self.recipe.id).exists())
+        self.assertTrue(os.path.exists(path))
+        self.recipe.delete()
+        self.assertFalse(os.path.exists(path))
@@ -0,0 +1,212 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, RecipeStats, Tag, Ingredient
+
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+class TestRecipeBulkAPI(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@site.com',
+            'password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+
+    def sample_recipe(self, **params):
+        defaults = {
+            'user': self.user,
+            'name': 'Recipe test',
+            'price': 300.00,
+            'time_minutes': 50
+        }
+        defaults.update(params)
+        return Recipe.objects.create(**defaults)
+
+    def test_bulk_create_recipes(self):
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Tofu', 'Arroz')
+        ]
+        payload = [
+            {
+                'name': f'Recipe {i}',
+                'time_minutes': 10 + i,
+                'price': '5.00',
+                'tags': [tag.id],
+                'ingredients': [ingredient.id for ingredient in ingredients],
+            }
+            for i in range(20)
+        ]
+
+        if connection.features.can_return_rows_from_bulk_insert:
+            recipe_inserts = 1
+        else:
+            recipe_inserts = len(payload)
+
+        # ingredient ids, tag ids, savepoint, recipes and their stats rollup
+        # (savepoint, locking read, release), two through tables, summary
+        # counts, tag names and update, ingredient and tag recipe counts and
+        # updates, savepoint release
+        with self.assertNumQueries(recipe_inserts * 4 + 13):
+            res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 20)
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 20)
+        for recipe in recipes:
+            self.assertEqual(list(recipe.tags.all()), [tag])
+            self.assertEqual(recipe.ingredients.count(), 2)
+            self.assertEqual(recipe.ingredient_count, 2)
+            self.assertEqual(recipe.tag_names, ['Vegan'])
+
+    def test_bulk_create_reports_per_item_errors(self):
+        other_user = get_user_model().objects.create_user(
+            'other@site.com',
+            'password123'
+        )
+        foreign_tag = Tag.objects.create(user=other_user, name='Ajeno')
+        payload = [
+            {'name': 'Valid', 'time_minutes': 10, 'price': '5.00'},
+            {'name': '', 'time_minutes': 10, 'price': '5.00'},
+            {'name': 'Foreign tag', 'time_minutes': 10, 'price': '5.00',
+             'tags': [foreign_tag.id]},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(res.data[0]['status'], status.HTTP_201_CREATED)
+        self.assertIn('name', res.data[1]['errors'])
+        self.assertIn('tags', res.data[2]['errors'])
+        self.assertEqual(
+            list(Recipe.objects.values_list('name', flat=True)),
+            ['Valid']
+        )
+
+    def test_bulk_update_recipes(self):
+        recipe1 = self.sample_recipe(name='Guiso')
+        recipe2 = self.sample_recipe(name='Sopa')
+        old_tag = Tag.objects.create(user=self.user, name='Viejo')
+        new_tag = Tag.objects.create(user=self.user, name='Nuevo')
+        recipe1.tags.add(old_tag)
+        payload = [
+            {'id': recipe1.id, 'tags': [new_tag.id]},
+            {'id': recipe2.id, 'time_minutes': 5},
+            {'id': 0, 'name': 'Missing'},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(res.data[2]['status'], status.HTTP_404_NOT_FOUND)
+        recipe1.refresh_from_db()
+        recipe2.refresh_from_db()
+        self.assertEqual(list(recipe1.tags.all()), [new_tag])
+        self.assertEqual(recipe1.name, 'Guiso')
+        self.assertEqual(recipe2.time_minutes, 5)
+
+    def test_bulk_quantities(self):
+        flour = Ingredient.objects.create(
+            user=self.user, name='Harina', unit_cost='0.002'
+        )
+        milk = Ingredient.objects.create(
+            user=self.user, name='Leche', unit_cost='1.2'
+        )
+        payload = [
+            {'name': 'Crepes', 'time_minutes': 20, 'price': '3.00',
+             'ingredients': [flour.id, milk.id],
+             'quantities': {flour.id: '250'}},
+            {'name': 'Pan', 'time_minutes': 90, 'price': '2.00',
+             'ingredients': [flour.id], 'quantities': {milk.id: '1'}},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertIn('quantities', res.data[1]['errors'])
+        recipe = Recipe.objects.get(id=res.data[0]['id'])
+        rows = recipe.recipe_ingredients.all()
+        self.assertEqual(
+            {row.ingredient_id: row.quantity for row in rows},
+            {flour.id: Decimal('250'), milk.id: Decimal('1')},
+        )
+        self.assertEqual(recipe.total_cost, Decimal('1.7'))
+
+        res = self.client.patch(BULK_URL, [
+            {'id': recipe.id, 'quantities': {milk.id: '0.5'}},
+        ], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {row.ingredient_id: row.quantity for row in rows.all()},
+            {flour.id: Decimal('250'), milk.id: Decimal('0.5')},
+        )
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.total_cost, Decimal('1.1'))
+
+    def test_bulk_delete_recipes(self):
+        recipe1 = self.sample_recipe()
+        recipe2 = self.sample_recipe()
+        other_user = get_user_model().objects.create_user(
+            'other@site.com',
+            'password123'
+        )
+        foreign = self.sample_recipe(user=other_user)
+
+        res = self.client.delete(
+            BULK_URL,
+            {'ids': [recipe1.id, recipe2.id, foreign.id]},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(res.data[2]['status'], status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+        self.assertTrue(Recipe.objects.filter(id=foreign.id).exists())
+
+    def test_bulk_delete_query_budget(self):
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        rice = Ingredient.objects.create(user=self.user, name='Arroz')
+        RecipeStats.objects.get_current(self.user.pk)
+        recipes = [self.sample_recipe(price=i) for i in range(20)]
+        for recipe in recipes:
+            recipe.tags.add(tag)
+            recipe.ingredients.add(rice)
+        kept = recipes.pop()
+
+        # Whatever the number of recipes: their ids, the lock, two count
+        # decrements, the collector's select, three deletes, the stats
+        # rollup's lock and update, and two pairs of savepoint queries.
+        with self.assertNumQueries(14):
+            res = self.client.delete(
+                BULK_URL, {'ids': [recipe.id for recipe in recipes]},
+                format='json'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(Recipe.objects.all()), [kept])
+        tag.refresh_from_db()
+        rice.refresh_from_db()
+        self.assertEqual((tag.recipe_count, rice.recipe_count), (1, 1))
+        stats = RecipeStats.objects.get(user=self.user)
+        self.assertEqual((stats.recipe_count, stats.total_price), (1, 19))
+
+    def test_bulk_requires_list(self):
+        res = self.client.post(BULK_URL, {'name': 'Single'}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,92 @@
+import json
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import export
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+class TestRecipeExportAPI(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@site.com',
+            'password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sample_recipe(self, **params):
+        defaults = {
+            'user': self.user,
+            'name': 'Recipe test',
+            'price': 300.00,
+            'time_minutes': 50
+        }
+        defaults.update(params)
+        return Recipe.objects.create(**defaults)
+
+    def read_lines(self, res):
+        content = b''.join(res.streaming_content).decode()
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_export_recipes_as_ndjson(self):
+        recipe = self.sample_recipe(name='Milanesa', price='12.50', servings=2)
+        meat = Ingredient.objects.create(
+            user=self.user, name='Carne', unit='kg'
+        )
+        crumbs = Ingredient.objects.create(user=self.user, name='Pan rallado')
+        Recipe.objects.bulk_set_relations('ingredients', {
+            recipe.id: {meat.id: {'quantity': '0.75'}, crumbs.id: {}},
+        })
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Clasico'))
+        self.sample_recipe(name='Ensalada')
+
+        res = self.client.get(EXPORT_URL, HTTP_ACCEPT='application/x-ndjson')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = self.read_lines(res)
+        self.assertEqual(
+            [line['name'] for line in lines], ['Milanesa', 'Ensalada']
+        )
+        self.assertEqual(lines[0]['price'], '12.50')
+        self.assertEqual(lines[0]['ingredients'], ['Carne', 'Pan rallado'])
+        self.assertEqual(
+            lines[0]['quantities'], {'Carne': '0.750', 'Pan rallado': '1.000'}
+        )
+        self.assertEqual(lines[0]['units'], {'Carne': 'kg'})
+        self.assertEqual(lines[0]['servings'], 2)
+        self.assertEqual(lines[0]['tags'], ['Clasico'])
+        self.assertEqual(lines[1]['ingredients'], [])
+
+    def test_export_limited_to_user(self):
+        other_user = get_user_model().objects.create_user(
+            'other@site.com',
+            'password123'
+        )
+        self.sample_recipe(user=other_user)
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(self.read_lines(res), [])
+
+    def test_export_batches_related_queries(self):
+        for i in range(5):
+            recipe = self.sample_recipe(name=f'Recipe {i}')
+            tag = Tag.objects.create(user=self.user, name=f'Tag {i}')
+            recipe.tags.add(tag)
+        queryset = Recipe.objects.filter(user=self.user).order_by('id')
+
+        # recipes, then ingredients and tags for each batch of two recipes
+        with self.assertNumQueries(1 + 3 * 2):
+            lines = list(export.iter_ndjson(queryset, chunk_size=2))
+
+        self.assertEqual(len(lines), 5)
@@ -0,0 +1,136 @@
+from django.core.cache import cache, caches
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.cache import bump_user_version, get_user_version
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class TestResponseCache(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@site.com',
+            'password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+
+    def sample_recipe(self, **params):
+        defaults = {
+            'user': self.user,
+            'name': 'Recipe test',
+            'price': 300.00,
+            'time_minutes': 50
+        }
+        defaults.update(params)
+        return Recipe.objects.create(**defaults)
+
+    def test_bump_user_version(self):
+        version = get_user_version(self.user.pk)
+
+        self.assertGreater(bump_user_version(self.user.pk), version)
+        self.assertEqual(get_user_version(self.user.pk), version + 1)
+
+    @override_settings(
+        CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'responses',
+            },
+            'versions': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'versions',
+            },
+        },
+        VERSION_CACHE_ALIAS='versions',
+    )
+    def test_versions_kept_in_shared_cache(self):
+        recipe = self.sample_recipe()
+        self.client.get(detail_url(recipe.id))
+        key = f'user-data-version:{self.user.pk}'
+        self.assertIsNone(caches['default'].get(key))
+
+        # Another process writes and bumps the shared version.
+        Recipe.objects.filter(pk=recipe.pk).update(name='Locro')
+        caches['versions'].incr(key)
+
+        res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(res.data['name'], 'Locro')
+
+    def test_list_served_from_cache(self):
+        self.sample_recipe()
+        first = self.client.get(RECIPES_URL)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(RECIPES_URL)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_create_invalidates_cache(self):
+        self.client.get(TAGS_URL)
+
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(
+            [tag['name'] for tag in res.data['results']],
+            ['Vegan']
+        )
+
+    def test_update_invalidates_detail(self):
+        recipe = self.sample_recipe()
+        self.client.get(detail_url(recipe.id))
+
+        self.client.patch(detail_url(recipe.id), {'name': 'Locro'})
+        res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.data['name'], 'Locro')
+
+    def test_if_none_match_returns_not_modified(self):
+        Tag.objects.create(user=self.user, name='Vegan')
+        etag = self.client.get(TAGS_URL)['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_etag_changes_after_write(self):
+        etag = self.client.get(RECIPES_URL)['ETag']
+        recipe = self.sample_recipe()
+
+        self.client.delete(detail_url(recipe.id))
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_cache_limited_to_user(self):
+        self.sample_recipe()
+        self.client.get(RECIPES_URL)
+
+        another_user = get_user_model().objects.create_user(
+            'another@site.com',
+            'password123'
+        )
+        self.client.force_authenticate(another_user)
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data['results'], [])
@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.test import TestCase
 
 # Create your tests here.
@@ -7,10 +8,12 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Tag
+from core.models import Tag, Recipe
+from recipe.cache import typeahead_cache
 from recipe.serializers import TagSerializer
 
 TAGS_URL = reverse('recipe:tag-list')
+TYPEAHEAD_URL = reverse('recipe:tag-typeahead')
 
 class PublicTagsAPI(TestCase):
 
@@ -32,6 +35,8 @@ class TestPrivateTagAPI(TestCase):
 
         self.client = APIClient()
         self.client.force_authenticate(self.user)
+        cache.clear()
+        typeahead_cache.clear()
 
     def test_retrieve_tags(self):
         Tag.objects.create(user=self.user, name="Vegan")
@@ -43,7 +48,7 @@ class TestPrivateTagAPI(TestCase):
         serializer = TagSerializer(tags, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_limited_to_user(self):
         anotherUser = get_user_model().objects.create_user(
@@ -56,8 +61,8 @@ class TestPrivateTagAPI(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]["name"], tag.name)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]["name"], tag.name)
 
 
     def test_create_tag_successfull(self):
@@ -71,8 +76,66 @@ class TestPrivateTagAPI(TestCase):
 
         self.assertTrue(exists)
 
+    def test_create_tag_returns_existing_normalized(self):
+        res1 = self.client.post(TAGS_URL, {'name': 'Vegan'})
+        res2 = self.client.post(TAGS_URL, {'name': ' VEGAN '})
+
+        self.assertEqual(res1.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res2.status_code, status.HTTP_200_OK)
+        self.assertEqual(res2.data, res1.data)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
     def test_create_tag_invalid(self):
         payload = {'name':''}
         res = self.client.post(TAGS_URL,payload)
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tags_paginated_by_cursor(self):
+        for name in ('Asado', 'Budin', 'Cena', 'Dulce', 'Entrada'):
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = [tag['name'] for tag in res.data['results']]
+        self.assertEqual(names, ['Entrada', 'Dulce'])
+        self.assertIsNone(res.data['previous'])
+
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            names += [tag['name'] for tag in res.data['results']]
+
+        self.assertEqual(names, ['Entrada', 'Dulce', 'Cena', 'Budin', 'Asado'])
+
+    def test_retrieve_tags_assigned_to_recipes(self):
+        tag1 = Tag.objects.create(user=self.user, name='Desayuno')
+        tag2 = Tag.objects.create(user=self.user, name='Almuerzo')
+        for name in ('Tostadas', 'Medialunas'):
+            recipe = Recipe.objects.create(
+                user=self.user, name=name, time_minutes=10, price=5
+            )
+            recipe.tags.add(tag1)
+
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [TagSerializer(tag1).data])
+        self.assertNotIn(TagSerializer(tag2).data, res.data['results'])
+
+    def test_typeahead(self):
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Dessert')
+
+        res = self.client.get(TYPEAHEAD_URL, {'q': 've'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [TagSerializer(vegan).data])
+
+    def test_typeahead_empty_text(self):
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(TYPEAHEAD_URL, {'q': ' '})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [])
@@ -0,0 +1,91 @@
+import hashlib
+import io
+
+from PIL import Image
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from rest_framework.parsers import MultiPartParser
+
+# Enough for the header of every format Pillow reads, EXIF blocks included.
+HEADER_LIMIT = 256 * 1024
+
+
+class BoundedImageUploadHandler(TemporaryFileUploadHandler):
+    """Spool image uploads to disk in fixed chunks, enforcing size limits.
+
+    The bytes are hashed as they stream in, so content-addressed storage
+    doesn't need a second pass over the file.
+
+    The byte limit is checked against ``Content-Length`` and again on every
+    chunk, the pixel limit as soon as the image header has arrived. Pillow
+    only parses the header for that, nothing is decoded, so oversized or
+    decompression-bomb uploads are dropped before they are fully received.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_bytes = settings.RECIPE_IMAGE_MAX_BYTES
+        self.max_pixels = settings.RECIPE_IMAGE_MAX_PIXELS
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        # Leave room for the multipart boundaries and part headers.
+        if content_length > self.max_bytes + self.chunk_size:
+            raise MultiPartParserError(
+                f'Upload exceeds the {self.max_bytes} bytes limit.'
+            )
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = io.BytesIO()
+        self.sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            self.reject(f'Image exceeds the {self.max_bytes} bytes limit.')
+        if self.header is not None:
+            self.check_header(raw_data)
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        # Picked up by ContentAddressedStorage instead of reading it again.
+        file.sha256 = self.sha256.hexdigest()
+        return file
+
+    def check_header(self, raw_data):
+        self.header.seek(0, io.SEEK_END)
+        self.header.write(raw_data[:HEADER_LIMIT - self.header.tell()])
+        complete = self.header.tell() >= HEADER_LIMIT
+        self.header.seek(0)
+        try:
+            width, height = Image.open(self.header).size
+        except Image.DecompressionBombError:
+            self.reject(f'Image exceeds the {self.max_pixels} pixels limit.')
+        except Exception:
+            # Pillow raises all sorts of errors on a partial header, wait for
+            # more data unless the header limit has been reached.
+            if complete:
+                self.reject('Upload a valid image.')
+            return
+        if width * height > self.max_pixels:
+            self.reject(f'Image exceeds the {self.max_pixels} pixels limit.')
+        self.header = None
+
+    def reject(self, message):
+        self.file.close()
+        raise MultiPartParserError(message)
+
+
+class BoundedImageMultiPartParser(MultiPartParser):
+    """Multipart parser routing files through ``BoundedImageUploadHandler``."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        request.upload_handlers = [BoundedImageUploadHandler(request)]
+        return super().parse(stream, media_type, parser_context)
@@ -1,53 +1,575 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Count, Prefetch
+from django.http import StreamingHttpResponse
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
-from core.models import Tag, Ingredient, Recipe
-from recipe import serializers
+from core.cache import bump_user_version, get_user_version
+from core.images import schedule_variants
+from core.index import SIMILARITY_METRICS, get_recipe_index
+from core.models import Tag, Ingredient, Recipe, RecipeIngredient, RecipeStats
+from core.names import normalize_name
+from core.storage import ensure_image, release_image
+from core.mealplan import plan_meals, shopping_list
+from core.units import SYSTEMS, format_quantity
+from recipe import bulk, export, serializers
+from recipe.cache import (
+    CachedListMixin, CachedListRetrieveMixin, typeahead_cache
+)
+from recipe.pagination import CursorPagination
+from recipe.uploads import BoundedImageMultiPartParser
+from user.authentication import CachedTokenAuthentication
+
 
-class BaseGenericViewSet(viewsets.GenericViewSet,
-                          mixins.ListModelMixin,
-                          mixins.CreateModelMixin):
+class BaseGenericViewSet(CachedListMixin,
+                         viewsets.GenericViewSet,
+                         mixins.ListModelMixin,
+                         mixins.CreateModelMixin):
 
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = CursorPagination
+    ordering = '-name'
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user).order_by('-name')
+        queryset = self.queryset.filter(user=self.request.user)
+        try:
+            assigned_only = bool(int(
+                self.request.query_params.get('assigned_only', 0)
+            ))
+        except ValueError:
+            raise ValidationError({'assigned_only': 'Expected 0 or 1.'})
+        if assigned_only:
+            queryset = queryset.assigned()
+        return queryset.order_by(self.ordering)
+
+    def create(self, request, *args, **kwargs):
+        """Create a row, or return the one with the same normalized name."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        created = self.perform_create(serializer)
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+            headers=self.get_success_headers(serializer.data),
+        )
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        name = serializer.validated_data['name']
+        model = self.queryset.model
+        serializer.instance, created = model.objects.get_or_create(
+            user=self.request.user,
+            normalized_name=normalize_name(name),
+            defaults=dict(serializer.validated_data),
+        )
+        if created:
+            bump_user_version(self.request.user.pk)
+        return created
+
+    def _typeahead_limit(self):
+        maximum = settings.TYPEAHEAD_MAX_LIMIT
+        try:
+            limit = int(self.request.query_params.get(
+                'limit', settings.TYPEAHEAD_LIMIT
+            ))
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= maximum:
+            raise ValidationError(
+                {'limit': f'Expected a number from 1 to {maximum}.'}
+            )
+        return limit
+
+    @action(methods=['GET'], detail=False)
+    def typeahead(self, request):
+        """Names starting with or close to ``?q=``, at most ``?limit=``.
+
+        Results are kept in process per user and text, stamped with the
+        user's data version so any write makes them stale.
+        """
+        text = request.query_params.get('q', '').strip()
+        limit = self._typeahead_limit()
+        if not text:
+            return Response([])
+
+        version = get_user_version(request.user.pk)
+        key = (
+            self.queryset.model._meta.label, request.user.pk, text.lower(),
+            limit,
+        )
+        cached = typeahead_cache.get(key)
+        if cached is not None and cached[0] == version:
+            return Response(cached[1])
+
+        queryset = self.queryset.filter(user=request.user)
+        queryset = queryset.typeahead(text, limit)
+        data = self.get_serializer(queryset, many=True).data
+        typeahead_cache.set(key, (version, data))
+        return Response(data)
+
 
 class TagViewSet(BaseGenericViewSet):
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
 
-class IngredientViewSet(BaseGenericViewSet):
+
+class IngredientViewSet(BaseGenericViewSet, mixins.UpdateModelMixin):
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def perform_update(self, serializer):
+        """Save the ingredient, ``ingredient_saved`` updates recipe totals."""
+        serializer.save()
+        bump_user_version(self.request.user.pk)
+
+
+class RecipeViewSet(CachedListRetrieveMixin, viewsets.ModelViewSet):
     serializer_class = serializers.RecipeSerializer
-    queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    # The search vector is only read by the database.
+    queryset = Recipe.objects.defer('search_vector')
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = CursorPagination
+    ordering = '-id'
+
+    # ``?ordering=`` values, each served by a (user, column) index. id
+    # breaks ties so the cursor always moves forward.
+    orderings = {
+        'total_cost': ('total_cost', '-id'),
+        '-total_cost': ('-total_cost', '-id'),
+        'total_calories': ('total_calories', '-id'),
+        '-total_calories': ('-total_calories', '-id'),
+    }
+
+    # Related rows loaded up front for each action, so the serializer never
+    # has to go back to the database once per recipe.
+    prefetch_for_action = {
+        'list': (
+            Prefetch('ingredients', queryset=Ingredient.objects.only('id')),
+            Prefetch('tags', queryset=Tag.objects.only('id')),
+        ),
+        'retrieve': (
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient'),
+            ),
+            'tags',
+        ),
+        'meal_plan': (
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient'),
+            ),
+        ),
+    }
+
+    def _params_to_ints(self, name):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            return {int(str_id) for str_id in value.split(',')}
+        except ValueError:
+            raise ValidationError(
+                {name: 'Expected a comma separated list of ids.'}
+            )
+
+    def _param_to_decimal(self, name):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            number = Decimal(value)
+        except InvalidOperation:
+            number = None
+        # NaN and infinities would reach the database as numeric values.
+        if number is None or not number.is_finite():
+            raise ValidationError({name: 'Expected a number.'})
+        return number
+
+    def _filter_related(self, queryset, field_name):
+        """Filter by ids of a many to many relation using its through table.
+
+        ``?<field>=1,2`` keeps recipes linked to any of the ids and
+        ``?<field>_match=all`` to every one of them. Both shapes are a
+        single ``recipe_id IN (subquery)`` over the ``(<field>_id,
+        recipe_id)`` index, so no join or DISTINCT is needed.
+        """
+        ids = self._params_to_ints(field_name)
+        if ids is None:
+            return queryset
+
+        field = Recipe._meta.get_field(field_name)
+        matches = field.remote_field.through.objects.filter(
+            **{f'{field.m2m_reverse_name()}__in': ids}
+        ).values('recipe_id')
+
+        match = self.request.query_params.get(f'{field_name}_match', 'any')
+        if match == 'all':
+            matches = matches.annotate(
+                matched=Count('id')
+            ).filter(matched=len(ids)).values('recipe_id')
+        elif match != 'any':
+            raise ValidationError(
+                {f'{field_name}_match': 'Expected "any" or "all".'}
+            )
+
+        return queryset.filter(id__in=matches)
+
+    def _filter_recipes(self, queryset):
+        queryset = self._filter_related(queryset, 'tags')
+        queryset = self._filter_related(queryset, 'ingredients')
+
+        max_time = self.request.query_params.get('max_time')
+        if max_time:
+            try:
+                queryset = queryset.filter(time_minutes__lte=int(max_time))
+            except ValueError:
+                raise ValidationError(
+                    {'max_time': 'Expected a number of minutes.'}
+                )
+
+        min_price = self._param_to_decimal('min_price')
+        if min_price is not None:
+            queryset = queryset.filter(price__gte=min_price)
+        max_price = self._param_to_decimal('max_price')
+        if max_price is not None:
+            queryset = queryset.filter(price__lte=max_price)
+
+        min_calories = self._param_to_decimal('min_calories')
+        if min_calories is not None:
+            queryset = queryset.filter(total_calories__gte=min_calories)
+        max_calories = self._param_to_decimal('max_calories')
+        if max_calories is not None:
+            queryset = queryset.filter(total_calories__lte=max_calories)
+
+        return queryset
+
+    def _order_recipes(self):
+        """Apply ``?ordering=``, one of ``orderings``, else newest first."""
+        ordering = self.request.query_params.get('ordering')
+        if not ordering:
+            return
+        if ordering not in self.orderings:
+            choices = ', '.join(sorted(self.orderings))
+            raise ValidationError(
+                {'ordering': f'Expected one of: {choices}.'}
+            )
+        # Read by the cursor pagination.
+        self.ordering = self.orderings[ordering]
+
+    def _search_recipes(self, queryset):
+        """Apply ``?search=`` and order the results by relevance.
+
+        Recipes of equal rank keep the ``?ordering=`` asked for, else the
+        newest come first.
+        """
+        text = self.request.query_params.get('search', '').strip()
+        if not text:
+            return queryset
+        ordering = self.ordering
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        # Read by the cursor pagination.
+        self.ordering = ('-search_rank', *ordering)
+        return queryset.search(text)
+
+    def _limit_param(self, default=10, maximum=100):
+        try:
+            limit = int(self.request.query_params.get('limit', default))
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= maximum:
+            raise ValidationError(
+                {'limit': f'Expected a number from 1 to {maximum}.'}
+            )
+        return limit
+
+    def _ranked_recipes(self, ranked, *names):
+        """Load the recipes of ``(recipe_id, *values)`` rows in order.
+
+        The values are set on each recipe as the attributes ``names``.
+        """
+        recipes = self.get_queryset().in_bulk([row[0] for row in ranked])
+        loaded = []
+        for recipe_id, *values in ranked:
+            # Skip recipes deleted since the index was read.
+            if recipe_id in recipes:
+                for name, value in zip(names, values):
+                    setattr(recipes[recipe_id], name, value)
+                loaded.append(recipes[recipe_id])
+        return loaded
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user).order_by('-id')
+        queryset = self.queryset.filter(user=self.request.user)
+        if self.action in ('list', 'summary'):
+            self._order_recipes()
+            queryset = self._search_recipes(self._filter_recipes(queryset))
+        if isinstance(self.ordering, str):
+            queryset = queryset.order_by(self.ordering)
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if self.action in ('summary', 'similar', 'pantry'):
+            queryset = queryset.only(
+                *serializers.RecipeSummarySerializer.Meta.fields
+            )
+        prefetch = self.prefetch_for_action.get(self.action)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    def _scaling_params(self):
+        """``?servings=`` and ``?units=`` the recipe detail is shown for."""
+        servings = self.request.query_params.get('servings')
+        if servings is not None:
+            try:
+                servings = int(servings)
+            except ValueError:
+                servings = 0
+            if servings < 1:
+                raise ValidationError(
+                    {'servings': 'Expected a number of servings.'}
+                )
+        system = self.request.query_params.get('units')
+        if system is not None and system not in SYSTEMS:
+            raise ValidationError(
+                {'units': 'Expected one of: ' + ', '.join(SYSTEMS) + '.'}
+            )
+        return {'servings': servings, 'system': system}
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'retrieve':
+            context.update(self._scaling_params())
+        return context
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return serializers.RecipeDetailSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'summary':
+            return serializers.RecipeSummarySerializer
+        elif self.action == 'similar':
+            return serializers.RecipeSimilarSerializer
+        elif self.action == 'pantry':
+            return serializers.RecipePantrySerializer
+        elif self.action == 'stats':
+            return serializers.RecipeStatsSerializer
+        elif self.action == 'meal_plan':
+            return serializers.MealPlanSerializer
         return self.serializer_class
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+        bump_user_version(self.request.user.pk)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        bump_user_version(self.request.user.pk)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        bump_user_version(self.request.user.pk)
+
+    @action(methods=['GET'], detail=False)
+    def summary(self, request):
+        """List recipe cards without touching the tag/ingredient tables."""
+        return self.list(request)
+
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        """Recipes sharing the most ingredients and tags with this one.
+
+        ``?metric=jaccard|cosine`` picks how overlaps are scored and
+        ``?limit=`` (at most 100) how many recipes are returned.
+        """
+        recipe = self.get_object()
+        metric = request.query_params.get('metric', 'jaccard')
+        if metric not in SIMILARITY_METRICS:
+            raise ValidationError(
+                {'metric': 'Expected "jaccard" or "cosine".'}
+            )
+        limit = self._limit_param()
+
+        index = get_recipe_index(request.user.pk)
+        ranked = index.similar(recipe.id, limit, metric)
+        similar = self._ranked_recipes(
+            [(recipe_id, round(score, 6)) for recipe_id, score in ranked],
+            'similarity'
+        )
+        return Response(self.get_serializer(similar, many=True).data)
+
+    @action(methods=['GET'], detail=False)
+    def pantry(self, request):
+        """Recipes that can be cooked with the ``?ingredients=`` ids at hand.
+
+        Ranked by how many of their ingredients are covered, then by how few
+        are missing. ``?max_missing=`` leaves out recipes needing more than
+        that many other ingredients and ``?limit=`` (at most 100) caps the
+        number of recipes returned.
+        """
+        ingredient_ids = self._params_to_ints('ingredients')
+        if not ingredient_ids:
+            raise ValidationError(
+                {'ingredients': 'Expected a comma separated list of ids.'}
+            )
+        max_missing = request.query_params.get('max_missing')
+        if max_missing is not None:
+            try:
+                max_missing = int(max_missing)
+            except ValueError:
+                max_missing = -1
+            if max_missing < 0:
+                raise ValidationError(
+                    {'max_missing': 'Expected a number of ingredients.'}
+                )
+        limit = self._limit_param()
+
+        index = get_recipe_index(request.user.pk)
+        ranked = index.pantry(ingredient_ids, limit, max_missing)
+        recipes = self._ranked_recipes(ranked, 'covered', 'missing')
+        return Response(self.get_serializer(recipes, many=True).data)
+
+    @action(methods=['GET'], detail=False)
+    def stats(self, request):
+        """Recipe count, averages, price histogram and most used tags and
+        ingredients.
+
+        Read from the user's rollup and the per tag/ingredient recipe
+        counts, kept current on writes, instead of aggregating every recipe.
+        """
+        stats = RecipeStats.objects.get_current(request.user.pk)
+        return Response(self.get_serializer(stats).data)
+
+    @action(methods=['POST'], detail=False, url_path='meal-plan')
+    def meal_plan(self, request):
+        """Pick recipes for ``days`` × ``meals_per_day`` meals and list what
+        to buy.
+
+        No day takes longer than ``max_time_per_day`` minutes, the plan
+        costs at most ``budget``, every recipe has all of ``tags`` and none
+        of ``exclude_tags``, and as few ingredients as possible are needed.
+        Slots nothing fits in are null. The shopping list is for
+        ``servings`` per meal, in the ``units`` system.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        plan = plan_meals(
+            request.user.pk,
+            days=params['days'],
+            meals_per_day=params['meals_per_day'],
+            max_time_per_day=params.get('max_time_per_day'),
+            budget=params.get('budget'),
+            tags=[tag.pk for tag in params.get('tags', ())],
+            exclude_tags=[tag.pk for tag in params.get('exclude_tags', ())],
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for meals in plan for recipe_id in meals if recipe_id]
+        )
+        plan = [
+            [recipes.get(recipe_id) for recipe_id in meals] for meals in plan
+        ]
+        planned = [recipe for meals in plan for recipe in meals if recipe]
+
+        summary = serializers.RecipeSummarySerializer
+        return Response({
+            'days': [
+                [summary(recipe).data if recipe else None for recipe in meals]
+                for meals in plan
+            ],
+            'total_time_minutes': sum(
+                recipe.time_minutes for recipe in planned
+            ),
+            'total_price': str(sum(
+                (recipe.price for recipe in planned), Decimal('0.00')
+            )),
+            'shopping_list': [
+                {'ingredient': ingredient.id, 'name': ingredient.name,
+                 'quantity': format_quantity(quantity), 'unit': unit,
+                 'recipes': count}
+                for ingredient, quantity, unit, count in shopping_list(
+                    planned, params.get('servings'), params.get('units')
+                )
+            ],
+        })
+
+    @action(methods=['POST', 'PATCH', 'DELETE'], detail=False)
+    def bulk(self, request):
+        """Create (POST), update (PATCH) or delete (DELETE) many recipes.
+
+        POST and PATCH take a list of recipes, PATCH items must carry their
+        ``id``. DELETE takes ``{"ids": [...]}``. The response reports the
+        outcome of every item by its index in the request.
+        """
+        if request.method == 'DELETE':
+            items = (
+                request.data.get('ids')
+                if isinstance(request.data, dict) else None
+            )
+        else:
+            items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {'detail': 'Expected a list of items.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > bulk.MAX_ITEMS:
+            return Response(
+                {'detail': f'At most {bulk.MAX_ITEMS} items per request.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if request.method == 'POST':
+            results = bulk.bulk_create(request.user, items)
+            success = status.HTTP_201_CREATED
+        elif request.method == 'PATCH':
+            results = bulk.bulk_update(request.user, items)
+            success = status.HTTP_200_OK
+        else:
+            try:
+                ids = [int(recipe_id) for recipe_id in items]
+            except (TypeError, ValueError):
+                return Response(
+                    {'ids': 'Expected a list of ids.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            results = bulk.bulk_delete(request.user, ids)
+            success = status.HTTP_200_OK
+
+        failed = sum(1 for result in results if 'errors' in result)
+        if failed < len(results):
+            bump_user_version(request.user.pk)
+        if not failed:
+            return Response(results, status=success)
+        if failed == len(results):
+            return Response(results, status=status.HTTP_400_BAD_REQUEST)
+        return Response(results, status=status.HTTP_207_MULTI_STATUS)
+
+    @action(methods=['GET'], detail=False,
+            renderer_classes=(JSONRenderer, export.NDJSONRenderer))
+    def export(self, request):
+        """Stream the user's whole library as newline delimited JSON."""
+        queryset = Recipe.objects.filter(user=request.user).order_by('id')
+        response = StreamingHttpResponse(
+            export.iter_ndjson(queryset),
+            content_type='application/x-ndjson'
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.ndjson"'
+        )
+        return response
 
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    @action(methods=['POST'], detail=True, url_path='upload-image',
+            parser_classes=(BoundedImageMultiPartParser,))
     def upload_image(self, request, pk=None):
         recipe = self.get_object()
         serializer = self.get_serializer(
@@ -56,7 +578,15 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
 
         if serializer.is_valid():
-            serializer.save()
+            previous = recipe.image.name
+            variants = list(recipe.image_variants.values())
+            recipe = serializer.save(image_variants={})
+            # A release of the same bytes may have raced with this upload.
+            ensure_image(recipe.image.name, serializer.validated_data['image'])
+            schedule_variants(recipe)
+            if previous != recipe.image.name:
+                release_image(previous, variants)
+            bump_user_version(request.user.pk)
             return Response(
                 serializer.data,
                 status=status.HTTP_200_OK
@@ -0,0 +1,44 @@
+import copy
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from core.cache import LRUCache
+
+token_cache = LRUCache(
+    maxsize=getattr(settings, 'TOKEN_AUTH_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'TOKEN_AUTH_CACHE_TTL', 60),
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that remembers token -> user lookups.
+
+    Only successful lookups are cached, so unknown keys and inactive users
+    keep going to the database. Entries are dropped when the token is
+    deleted or the user is saved (e.g. deactivated) in this process, and
+    expire after ``TOKEN_AUTH_CACHE_TTL`` seconds everywhere else.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached)
+        user, token = cached
+        # Every request gets its own instances, the cached ones are shared.
+        return copy.copy(user), copy.copy(token)
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, **kwargs):
+    token_cache.pop(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def evict_saved_user(sender, instance, **kwargs):
+    token_cache.discard_where(lambda cached: cached[0].pk == instance.pk)
@@ -0,0 +1,67 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import token_cache
+
+ME_URL = reverse('user:me')
+
+
+class TestCachedTokenAuthentication(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@site.com',
+            'password123',
+            name='Test'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_cached(self):
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_invalid_token_not_cached(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(len(token_cache), 0)
+
+    def test_deleted_token_evicted(self):
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_evicted(self):
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_updated_user_not_stale(self):
+        self.client.patch(ME_URL, {'name': 'Updated'})
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'Updated')